@@ -4,15 +4,27 @@ from tqdm import tqdm
 from collections import defaultdict
 import numpy as np
 
+from .batch_autotune import get_batch_autotuner
 from .model_init import AtomModelSingleton
-from ...utils.config_reader import get_formula_enable, get_table_enable
+from ...utils.config_reader import get_device, get_formula_enable, get_formula_prefilter_enable, get_table_enable
+from ...utils.enum_class import CategoryId
 from ...utils.model_utils import crop_img, get_res_list_from_layout_res
 from ...utils.ocr_utils import get_adjusted_mfdetrec_res, get_ocr_result_list, OcrConfidence
+from ...utils.pdf_formula_hint import FORMULA_HINT_KEY, PAGE_ID_KEY
+from ...utils.stage_timing import timed_stage
+from ...utils.yolo_utils import iter_prepared_chunks
 
 YOLO_LAYOUT_BASE_BATCH_SIZE = 8
 MFD_BASE_BATCH_SIZE = 1
 MFR_BASE_BATCH_SIZE = 16
 OCR_DET_BASE_BATCH_SIZE = 16
+# layout与MFD共用页面预处理时每块的页数
+PAGE_PREPROCESS_CHUNK_SIZE = 32
+# 没有可用的pdf文本层时，版面中出现这些类别的页面才做公式检测
+FORMULA_CANDIDATE_CATEGORIES = {
+    CategoryId.Title, CategoryId.Text, CategoryId.ImageCaption, CategoryId.TableCaption, CategoryId.TableFootnote,
+    CategoryId.InterlineEquation_Layout, CategoryId.InterlineEquationNumber_Layout,
+}
 
 
 class BatchAnalyze:
@@ -20,8 +32,66 @@ class BatchAnalyze:
         self.batch_ratio = batch_ratio
         self.formula_enable = get_formula_enable(formula_enable)
         self.table_enable = get_table_enable(table_enable)
+        self.formula_prefilter_enable = get_formula_prefilter_enable()
         self.model_manager = model_manager
         self.enable_ocr_det_batch = enable_ocr_det_batch
+        self.autotuner = get_batch_autotuner(get_device())
+
+    def _run_stage(self, stage: str, default_batch_size: int, stage_fn, item_num: int):
+        """执行stage_fn(batch_size)并统计阶段耗时，启用自动调节时batch_size由autotuner决定"""
+        with timed_stage(stage, item_num):
+            if self.autotuner is None:
+                return stage_fn(default_batch_size)
+            return self.autotuner.run(stage, default_batch_size, stage_fn, item_num)
+
+    def _get_formula_hints(self, images_with_extra_info: list) -> list:
+        """
+        每页是否需要公式检测：True/False为由pdf文本层(数学字体和数学符号)得到的结论，None表示没有可用的文本层，
+        需要根据版面结果判断。未启用MINERU_FORMULA_PREFILTER_ENABLE时所有页面都做公式检测；
+        需要OCR的文档文本层不可靠，同样按版面结果判断
+        """
+        if not self.formula_prefilter_enable:
+            return [True] * len(images_with_extra_info)
+        return [
+            None if ocr_enable else getattr(image, 'info', {}).get(FORMULA_HINT_KEY)
+            for image, ocr_enable, _ in images_with_extra_info
+        ]
+
+    @staticmethod
+    def _get_page_ids(images_with_extra_info: list) -> list:
+        """每页在本次解析中的(文档下标, 页码)，由pipeline_analyze写入页面图像的info，没有时为None"""
+        return [getattr(image, 'info', {}).get(PAGE_ID_KEY) for image, _, _ in images_with_extra_info]
+
+    @staticmethod
+    def _get_formula_page_indices(layout_res_list: list, formula_hints: list, start: int, page_ids: list) -> list:
+        """
+        返回需要做公式检测的页面在layout_res_list中的下标。文本层中没有数学内容的页面跳过公式检测与识别，
+        除非版面中检测到了行间公式(公式可能以图片或路径绘制)；没有文本层的页面只在版面中有可能包含公式的区域时检测。
+        跳过的页面按(文档下标, 页码)逐页记录日志以便评估对结果的影响
+        """
+        indices = []
+        for index, layout_res in enumerate(layout_res_list):
+            formula_hint = formula_hints[start + index]
+            if formula_hint:
+                indices.append(index)
+                continue
+            categories = {int(res['category_id']) for res in layout_res}
+            if formula_hint is None:
+                candidate_categories = FORMULA_CANDIDATE_CATEGORIES
+                reason = f'no text layer and no formula candidate region in layout categories {sorted(categories)}'
+            else:
+                candidate_categories = {CategoryId.InterlineEquation_Layout}
+                reason = 'no math font or symbol in the text layer'
+            if categories & candidate_categories:
+                indices.append(index)
+            else:
+                page_id = page_ids[start + index]
+                if page_id is not None:
+                    page_desc = f'page {page_id[1]} of document {page_id[0]}'
+                else:
+                    page_desc = f'page {start + index} of the batch'
+                logger.info(f'skip formula detection for {page_desc}, {reason}')
+        return indices
 
     def __call__(self, images_with_extra_info: list) -> list:
         if len(images_with_extra_info) == 0:
@@ -38,32 +108,71 @@ class BatchAnalyze:
 
         images = [image for image, _, _ in images_with_extra_info]
 
-        # doclayout_yolo
-        layout_images = []
-        for image_index, image in enumerate(images):
-            layout_images.append(image)
-
-
-        images_layout_res += self.model.layout_model.batch_predict(
-            layout_images, YOLO_LAYOUT_BASE_BATCH_SIZE
-        )
-
-        if self.formula_enable:
-            # 公式检测
-            images_mfd_res = self.model.mfd_model.batch_predict(
-                images, MFD_BASE_BATCH_SIZE
+        layout_model = self.model.layout_model
+        mfd_model = self.model.mfd_model if self.formula_enable else None
+        detectors = [layout_model] + ([mfd_model] if mfd_model is not None else [])
+
+        formula_hints = self._get_formula_hints(images_with_extra_info) if mfd_model is not None else []
+        page_ids = self._get_page_ids(images_with_extra_info)
+        # 页面下标 -> MFD结果，跳过公式检测的页面不在其中
+        images_mfd_res = {}
+        if all(hasattr(model, 'batch_predict_prepared') for model in detectors):
+            # layout与MFD共用页面预处理：每页只解码一次，两个模型的letterbox缩放在后台线程中提前一块计算，
+            # 两个模型按块交替推理，预处理结果用完即释放。文本层中没有数学内容的页面不做MFD的缩放
+            page_filters = {}
+            if mfd_model is not None:
+                page_filters[mfd_model.imgsz] = [formula_hint is not False for formula_hint in formula_hints]
+            for chunk in iter_prepared_chunks(
+                    images, [model.imgsz for model in detectors], PAGE_PREPROCESS_CHUNK_SIZE, page_filters
+            ):
+                chunk_start = len(images_layout_res)
+                chunk_layout_res = self._run_stage(
+                    'layout', YOLO_LAYOUT_BASE_BATCH_SIZE,
+                    lambda batch_size: layout_model.batch_predict_prepared(chunk, batch_size),
+                    len(chunk),
+                )
+                images_layout_res += chunk_layout_res
+                if mfd_model is not None:
+                    mfd_indices = self._get_formula_page_indices(chunk_layout_res, formula_hints, chunk_start, page_ids)
+                    if mfd_indices:
+                        chunk_mfd_res = self._run_stage(
+                            'mfd', self.batch_ratio * MFD_BASE_BATCH_SIZE,
+                            lambda batch_size: mfd_model.batch_predict_prepared(chunk, batch_size, mfd_indices),
+                            len(mfd_indices),
+                        )
+                        for index, mfd_res in zip(mfd_indices, chunk_mfd_res):
+                            images_mfd_res[chunk_start + index] = mfd_res
+        else:
+            images_layout_res += self._run_stage(
+                'layout', YOLO_LAYOUT_BASE_BATCH_SIZE,
+                lambda batch_size: layout_model.batch_predict(images, batch_size),
+                len(images),
             )
+            if mfd_model is not None:
+                mfd_indices = self._get_formula_page_indices(images_layout_res, formula_hints, 0, page_ids)
+                if mfd_indices:
+                    mfd_res_list = self._run_stage(
+                        'mfd', self.batch_ratio * MFD_BASE_BATCH_SIZE,
+                        lambda batch_size: mfd_model.batch_predict([images[i] for i in mfd_indices], batch_size),
+                        len(mfd_indices),
+                    )
+                    images_mfd_res = dict(zip(mfd_indices, mfd_res_list))
 
+        if images_mfd_res:
             # 公式识别
-            images_formula_list = self.model.mfr_model.batch_predict(
-                images_mfd_res,
-                images,
-                batch_size=self.batch_ratio * MFR_BASE_BATCH_SIZE,
+            mfd_page_indices = sorted(images_mfd_res)
+            mfr_item_num = sum(len(images_mfd_res[index].boxes) for index in mfd_page_indices)
+            images_formula_list = self._run_stage(
+                'mfr', self.batch_ratio * MFR_BASE_BATCH_SIZE,
+                lambda batch_size: self.model.mfr_model.batch_predict(
+                    [images_mfd_res[index] for index in mfd_page_indices],
+                    [images[index] for index in mfd_page_indices],
+                    batch_size=batch_size
+                ),
+                mfr_item_num,
             )
-            mfr_count = 0
-            for image_index in range(len(images)):
-                images_layout_res[image_index] += images_formula_list[image_index]
-                mfr_count += len(images_formula_list[image_index])
+            for image_index, formula_list in zip(mfd_page_indices, images_formula_list):
+                images_layout_res[image_index] += formula_list
 
         # 清理显存
         # clean_vram(self.model.device, vram_threshold=8)
@@ -100,23 +209,25 @@ class BatchAnalyze:
             # 收集所有需要OCR检测的裁剪图像
             all_cropped_images_info = []
 
-            for ocr_res_list_dict in ocr_res_list_all_page:
-                _lang = ocr_res_list_dict['lang']
+            with timed_stage('ocr_crop') as crop_items:
+                for ocr_res_list_dict in ocr_res_list_all_page:
+                    _lang = ocr_res_list_dict['lang']
 
-                for res in ocr_res_list_dict['ocr_res_list']:
-                    new_image, useful_list = crop_img(
-                        res, ocr_res_list_dict['pil_img'], crop_paste_x=50, crop_paste_y=50
-                    )
-                    adjusted_mfdetrec_res = get_adjusted_mfdetrec_res(
-                        ocr_res_list_dict['single_page_mfdetrec_res'], useful_list
-                    )
+                    for res in ocr_res_list_dict['ocr_res_list']:
+                        new_image, useful_list = crop_img(
+                            res, ocr_res_list_dict['pil_img'], crop_paste_x=50, crop_paste_y=50
+                        )
+                        adjusted_mfdetrec_res = get_adjusted_mfdetrec_res(
+                            ocr_res_list_dict['single_page_mfdetrec_res'], useful_list
+                        )
 
-                    # BGR转换
-                    new_image = cv2.cvtColor(np.asarray(new_image), cv2.COLOR_RGB2BGR)
+                        # BGR转换
+                        new_image = cv2.cvtColor(np.asarray(new_image), cv2.COLOR_RGB2BGR)
 
-                    all_cropped_images_info.append((
-                        new_image, useful_list, ocr_res_list_dict, res, adjusted_mfdetrec_res, _lang
-                    ))
+                        all_cropped_images_info.append((
+                            new_image, useful_list, ocr_res_list_dict, res, adjusted_mfdetrec_res, _lang
+                        ))
+                crop_items.item_num = len(all_cropped_images_info)
 
             # 按语言分组
             lang_groups = defaultdict(list)
@@ -171,9 +282,14 @@ class BatchAnalyze:
                         batch_images.append(padded_img)
 
                     # 批处理检测
-                    det_batch_size = min(len(batch_images), self.batch_ratio * OCR_DET_BASE_BATCH_SIZE)  # 增加批处理大小
-                    # logger.debug(f"OCR-det batch: {det_batch_size} images, target size: {target_h}x{target_w}")
-                    batch_results = ocr_model.text_detector.batch_predict(batch_images, det_batch_size)
+                    # logger.debug(f"OCR-det batch: {len(batch_images)} images, target size: {target_h}x{target_w}")
+                    batch_results = self._run_stage(
+                        'ocr_det', self.batch_ratio * OCR_DET_BASE_BATCH_SIZE,
+                        lambda batch_size: ocr_model.text_detector.batch_predict(
+                            batch_images, min(len(batch_images), batch_size)
+                        ),
+                        len(batch_images),
+                    )
 
                     # 处理批处理结果
                     for i, (crop_info, (dt_boxes, elapse)) in enumerate(zip(group_crops, batch_results)):
@@ -233,9 +349,10 @@ class BatchAnalyze:
                     )
                     # OCR-det
                     new_image = cv2.cvtColor(np.asarray(new_image), cv2.COLOR_RGB2BGR)
-                    ocr_res = ocr_model.ocr(
-                        new_image, mfd_res=adjusted_mfdetrec_res, rec=False
-                    )[0]
+                    with timed_stage('ocr_det', 1):
+                        ocr_res = ocr_model.ocr(
+                            new_image, mfd_res=adjusted_mfdetrec_res, rec=False
+                        )[0]
 
                     # Integration results
                     if ocr_res:
@@ -253,7 +370,8 @@ class BatchAnalyze:
                     atom_model_name='table',
                     lang=_lang,
                 )
-                html_code, table_cell_bboxes, logic_points, elapse = table_model.predict(table_res_dict['table_img'])
+                with timed_stage('table', 1):
+                    html_code, table_cell_bboxes, logic_points, elapse = table_model.predict(table_res_dict['table_img'])
                 # 判断是否返回正常
                 if html_code:
                     # 检查html_code是否包含'<table>'和'</table>'
@@ -309,7 +427,8 @@ class BatchAnalyze:
                         det_db_box_thresh=0.3,
                         lang=lang
                     )
-                    ocr_res_list = ocr_model.ocr(img_crop_list, det=False, tqdm_enable=True)[0]
+                    with timed_stage('ocr_rec', len(img_crop_list)):
+                        ocr_res_list = ocr_model.ocr(img_crop_list, det=False, tqdm_enable=True)[0]
 
                     # Verify we have matching counts
                     assert len(ocr_res_list) == len(
@@ -0,0 +1,230 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import json
+import os
+import platform
+import threading
+import time
+
+from loguru import logger
+
+from ...utils.config_reader import get_model_profile
+from ...utils.enum_class import ModelPath
+from ...utils.hash_utils import str_md5
+from ...utils.memory_profile import get_peak_rss_bytes, get_rss_bytes, reset_peak_rss
+from ...utils.model_utils import clean_memory, get_vram
+
+try:
+    import torch
+    import torch_npu
+except ImportError:
+    pass
+
+# 单个阶段允许的最大batch_size
+MAX_STAGE_BATCH_SIZE = 256
+# 吞吐提升低于该比例时认为已经到达平台期
+THROUGHPUT_GAIN_THRESHOLD = 1.05
+# 峰值显存超过总显存的该比例时不再增大batch_size
+DEVICE_MEMORY_HIGH_WATERMARK = 0.9
+
+
+def get_batch_autotune_enable() -> bool:
+    return os.getenv('MINERU_BATCH_AUTOTUNE_ENABLE', 'false').lower() == 'true'
+
+
+def get_batch_profile_path() -> str:
+    default_path = os.path.join(os.path.expanduser('~'), '.cache', 'mineru', 'batch_size_profile.json')
+    return os.getenv('MINERU_BATCH_PROFILE_PATH', default_path)
+
+
+def is_oom_error(e: Exception) -> bool:
+    if isinstance(e, MemoryError):
+        return True
+    try:
+        if isinstance(e, torch.cuda.OutOfMemoryError):
+            return True
+    except (NameError, AttributeError):
+        pass
+    return isinstance(e, RuntimeError) and 'out of memory' in str(e).lower()
+
+
+def _get_device_key(device: str) -> str:
+    device = str(device)
+    if device.startswith('cuda') and torch.cuda.is_available():
+        return f'{torch.cuda.get_device_name(device)}_{round(get_vram(device))}GB'
+    elif device.startswith('npu'):
+        vram = get_vram(device)
+        return f'npu_{round(vram) if vram else 0}GB'
+    return f'{device}_{platform.machine()}_{os.cpu_count()}cores'
+
+
+def _get_models_key() -> str:
+    return str_md5('|'.join([
+        get_model_profile(),
+        ModelPath.doclayout_yolo, ModelPath.yolo_v8_mfd, ModelPath.unimernet_small, ModelPath.pytorch_paddle
+    ]))
+
+
+class BatchSizeAutotuner:
+    """
+    按阶段自动调节batch_size：从静态默认值开始，累计足够多的样本后测量吞吐，吞吐仍有明显提升时batch_size翻倍，
+    到达平台期、显存接近上限、超过单次调用的最大样本数或遇到OOM时收敛；OOM时减半并重试当前阶段。
+    收敛结果按(设备, 模型组合)持久化到本地文件，下次启动直接复用。
+    """
+
+    def __init__(self, device: str):
+        self.device = str(device)
+        self.profile_key = f'{_get_device_key(self.device)}|{_get_models_key()}'
+        self.profile_path = get_batch_profile_path()
+        self.stages = {}
+        self._lock = threading.Lock()
+        for stage, batch_size in self._load_profile().items():
+            self.stages[stage] = self._new_stage_state(batch_size, converged=True)
+        if self.stages:
+            logger.info(f'batch size profile loaded: {self._converged_batch_sizes()}')
+
+    @staticmethod
+    def _new_stage_state(batch_size, converged=False):
+        return {
+            'batch_size': batch_size,
+            'best_batch_size': batch_size,
+            'best_throughput': 0.0,
+            'max_batch_size': MAX_STAGE_BATCH_SIZE,
+            'max_item_num': 0,
+            'converged': converged,
+            'acc_items': 0,
+            'acc_time': 0.0,
+            'peak_memory': 0,
+        }
+
+    def _load_profile(self) -> dict:
+        if not os.path.exists(self.profile_path):
+            return {}
+        try:
+            with open(self.profile_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get(self.profile_key, {})
+        except Exception as e:
+            logger.warning(f'failed to load batch size profile {self.profile_path}: {e}')
+            return {}
+
+    def _converged_batch_sizes(self) -> dict:
+        return {stage: state['batch_size'] for stage, state in self.stages.items() if state['converged']}
+
+    def _save_profile(self):
+        try:
+            profile = {}
+            if os.path.exists(self.profile_path):
+                with open(self.profile_path, 'r', encoding='utf-8') as f:
+                    profile = json.load(f)
+            profile[self.profile_key] = self._converged_batch_sizes()
+            os.makedirs(os.path.dirname(self.profile_path), exist_ok=True)
+            with open(self.profile_path, 'w', encoding='utf-8') as f:
+                json.dump(profile, f, ensure_ascii=False, indent=4)
+        except Exception as e:
+            logger.warning(f'failed to save batch size profile {self.profile_path}: {e}')
+
+    def _reset_peak_memory(self) -> int:
+        """重置峰值统计，cpu上返回阶段开始时的RSS作为基线"""
+        if self.device.startswith('cuda') and torch.cuda.is_available():
+            torch.cuda.reset_peak_memory_stats(self.device)
+            return 0
+        elif self.device.startswith('npu'):
+            torch_npu.npu.reset_peak_memory_stats(self.device)
+            return 0
+        reset_peak_rss()
+        return get_rss_bytes()
+
+    def _get_peak_memory(self, rss_base: int) -> int:
+        """返回阶段内的峰值内存(字节)，加速卡使用分配器统计，cpu使用本次执行期间峰值RSS相对基线的增量"""
+        if self.device.startswith('cuda') and torch.cuda.is_available():
+            return torch.cuda.max_memory_allocated(self.device)
+        elif self.device.startswith('npu'):
+            return torch_npu.npu.max_memory_allocated(self.device)
+        # 无法重置峰值RSS的平台上退化为执行前后的RSS增量
+        return max(0, get_peak_rss_bytes() - rss_base)
+
+    def _memory_exhausted(self, peak_memory: int) -> bool:
+        vram = get_vram(self.device)
+        if vram is None:
+            return False
+        return peak_memory > vram * (1024 ** 3) * DEVICE_MEMORY_HIGH_WATERMARK
+
+    def get_batch_size(self, stage: str, default_batch_size: int) -> int:
+        with self._lock:
+            if stage not in self.stages:
+                self.stages[stage] = self._new_stage_state(default_batch_size)
+            return self.stages[stage]['batch_size']
+
+    def _converge(self, stage: str, state: dict):
+        state['batch_size'] = state['best_batch_size']
+        state['converged'] = True
+        logger.info(f'batch size autotune converged: {stage}={state["batch_size"]}')
+        self._save_profile()
+
+    def record(self, stage: str, batch_size: int, item_num: int, elapsed: float, peak_memory: int):
+        with self._lock:
+            state = self.stages[stage]
+            if state['converged'] or batch_size != state['batch_size']:
+                return
+            # 不足一个batch的调用也计入吞吐，batch_size不会超过单次调用的最大样本数(如页面预处理的分块大小)
+            state['max_item_num'] = max(state['max_item_num'], item_num)
+            state['acc_items'] += item_num
+            state['acc_time'] += elapsed
+            state['peak_memory'] = max(state['peak_memory'], peak_memory)
+            if state['acc_items'] < max(2 * batch_size, 32) or state['acc_time'] <= 0:
+                return
+
+            throughput = state['acc_items'] / state['acc_time']
+            logger.debug(
+                f'batch size autotune {stage}: batch_size={batch_size}, '
+                f'throughput={throughput:.2f} items/s, peak_memory={state["peak_memory"] / (1024 ** 2):.0f}MB'
+            )
+            improved = throughput > state['best_throughput'] * THROUGHPUT_GAIN_THRESHOLD
+            if improved:
+                state['best_throughput'] = throughput
+                state['best_batch_size'] = batch_size
+            next_batch_size = min(batch_size * 2, state['max_batch_size'], state['max_item_num'])
+            if not improved or next_batch_size <= batch_size or self._memory_exhausted(state['peak_memory']):
+                self._converge(stage, state)
+                return
+            state['batch_size'] = next_batch_size
+            state['acc_items'] = 0
+            state['acc_time'] = 0.0
+            state['peak_memory'] = 0
+
+    def on_oom(self, stage: str, batch_size: int):
+        with self._lock:
+            state = self.stages[stage]
+            new_batch_size = max(1, batch_size // 2)
+            logger.warning(f'OOM in stage {stage} with batch_size={batch_size}, backing off to {new_batch_size}')
+            state['max_batch_size'] = new_batch_size
+            state['best_batch_size'] = min(state['best_batch_size'], new_batch_size)
+            self._converge(stage, state)
+
+    def run(self, stage: str, default_batch_size: int, stage_fn, item_num: int):
+        """以调节后的batch_size执行stage_fn(batch_size)，OOM时减小batch_size后重试"""
+        while True:
+            batch_size = self.get_batch_size(stage, default_batch_size)
+            rss_base = self._reset_peak_memory()
+            start_time = time.time()
+            try:
+                result = stage_fn(batch_size)
+            except Exception as e:
+                if not is_oom_error(e) or batch_size <= 1:
+                    raise
+                self.on_oom(stage, batch_size)
+                clean_memory(self.device)
+                continue
+            self.record(stage, batch_size, item_num, time.time() - start_time, self._get_peak_memory(rss_base))
+            return result
+
+
+_autotuners = {}
+
+
+def get_batch_autotuner(device: str):
+    if not get_batch_autotune_enable():
+        return None
+    device = str(device)
+    if device not in _autotuners:
+        _autotuners[device] = BatchSizeAutotuner(device)
+    return _autotuners[device]
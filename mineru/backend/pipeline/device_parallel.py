@@ -0,0 +1,210 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import atexit
+import math
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+from loguru import logger
+
+# 每个副本平均分到的分片数，分片越多负载越均衡，但每个分片内可组成的推理批次越小
+SHARDS_PER_REPLICA = 4
+# 分片的最小页数
+MIN_SHARD_PAGES = 16
+# 工作进程崩溃(被OOM killer杀掉、段错误等)时，同一分片最多重新放回队列的次数
+MAX_SHARD_RETRIES = 2
+
+
+def get_pipeline_devices() -> list[str]:
+    """
+    数据并行使用的设备列表，可通过环境变量MINERU_PIPELINE_DEVICES设置，以逗号分隔，例如
+    "cuda:0,cuda:1"；同一设备可重复出现以启动多个副本，例如"cpu,cpu,cpu,cpu"表示4个cpu工作进程。
+    未设置或只有一个设备时不启用数据并行。
+    """
+    devices_env = os.getenv('MINERU_PIPELINE_DEVICES', '')
+    return [device.strip() for device in devices_env.split(',') if device.strip()]
+
+
+def _init_worker(device: str, cpu_threads: int):
+    """在工作进程中绑定设备，必须在初始化cuda之前执行"""
+    # 工作进程内部不再启用数据并行
+    os.environ['MINERU_PIPELINE_DEVICES'] = ''
+    if device.startswith('cuda'):
+        device_index = device.split(':')[1] if ':' in device else '0'
+        visible_devices = os.getenv('CUDA_VISIBLE_DEVICES')
+        if visible_devices:
+            device_index = visible_devices.split(',')[int(device_index)].strip()
+        os.environ['CUDA_VISIBLE_DEVICES'] = device_index
+        os.environ['MINERU_DEVICE_MODE'] = 'cuda'
+    else:
+        os.environ['MINERU_DEVICE_MODE'] = device
+    if device.startswith('cpu'):
+        try:
+            import torch
+            torch.set_num_threads(cpu_threads)
+        except ImportError:
+            pass
+
+
+def _analyze_in_worker(shared_pages, formula_enable, table_enable):
+    # 页面结果缓存在主进程中处理，工作进程只负责推理
+    from .pipeline_analyze import _batch_image_analyze
+    return _batch_image_analyze(_load_shared_pages(shared_pages), formula_enable, table_enable)
+
+
+def _share_pages(images_with_extra_info) -> tuple:
+    """
+    把页面像素写入共享内存，返回(共享内存列表, 可pickle的页面描述)。
+    传给工作进程的只有共享内存名、尺寸和模式，避免整页图像经过进程间管道序列化
+    """
+    shms = []
+    shared_pages = []
+    try:
+        for pil_img, ocr_enable, lang in images_with_extra_info:
+            data = pil_img.tobytes()
+            shm = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+            shms.append(shm)
+            shm.buf[:len(data)] = data
+            # info中带有公式预筛选的文本层结论
+            shared_pages.append((shm.name, len(data), pil_img.mode, pil_img.size, dict(pil_img.info), ocr_enable, lang))
+    except Exception:
+        _release_shared_memory(shms)
+        raise
+    return shms, shared_pages
+
+
+def _load_shared_pages(shared_pages) -> list:
+    """在工作进程中从共享内存复制出页面图像，复制后立即断开，共享内存由主进程释放"""
+    from PIL import Image
+    images_with_extra_info = []
+    for shm_name, nbytes, mode, size, info, ocr_enable, lang in shared_pages:
+        shm = shared_memory.SharedMemory(name=shm_name)
+        try:
+            pil_img = Image.frombytes(mode, size, bytes(shm.buf[:nbytes]))
+        finally:
+            shm.close()
+        pil_img.info.update(info)
+        images_with_extra_info.append((pil_img, ocr_enable, lang))
+    return images_with_extra_info
+
+
+def _release_shared_memory(shms):
+    for shm in shms:
+        shm.close()
+        shm.unlink()
+
+
+class DeviceParallelExecutor:
+    """
+    每个设备(或cpu工作进程)持有一份模型副本。批次被切分为若干分片放入共享队列，
+    每个副本由一个派发线程在上一个分片完成后才从队列中取下一个分片，处理得快的副本取得多，
+    派发按实际负载进行；多个并发请求的分片共用同一个队列。结果按页面顺序重组
+    """
+
+    def __init__(self, devices: list[str]):
+        self.devices = devices
+        cpu_worker_num = sum(1 for device in devices if device.startswith('cpu'))
+        self.cpu_threads = max(1, (os.cpu_count() or 1) // max(1, cpu_worker_num))
+        self.mp_context = multiprocessing.get_context('spawn')
+        self.replicas = [self._create_replica(device) for device in devices]
+        self.shard_queue = queue.Queue()
+        self.dispatchers = [
+            threading.Thread(
+                target=self._dispatch, args=(idx,), name=f'mineru-device-dispatch-{idx}', daemon=True
+            )
+            for idx in range(len(self.replicas))
+        ]
+        for dispatcher in self.dispatchers:
+            dispatcher.start()
+        logger.info(f'pipeline data parallel enabled on devices: {devices}')
+
+    def _create_replica(self, device: str) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=1, mp_context=self.mp_context, initializer=_init_worker, initargs=(device, self.cpu_threads)
+        )
+
+    def _dispatch(self, idx: int):
+        while True:
+            item = self.shard_queue.get()
+            if item is None:
+                return
+            shard, formula_enable, table_enable, future, retries = item
+            if retries == 0 and not future.set_running_or_notify_cancel():
+                continue
+            shms, shared_pages = None, None
+            try:
+                shms, shared_pages = _share_pages(shard)
+                future.set_result(
+                    self.replicas[idx].submit(_analyze_in_worker, shared_pages, formula_enable, table_enable).result()
+                )
+            except BrokenProcessPool as e:
+                # 工作进程崩溃后该副本的进程池不再可用，重建进程池，分片放回队列由空闲的副本重新处理
+                device = self.devices[idx]
+                self.replicas[idx].shutdown(wait=False, cancel_futures=True)
+                self.replicas[idx] = self._create_replica(device)
+                if retries < MAX_SHARD_RETRIES:
+                    logger.warning(f'pipeline worker on {device} crashed, restarted it and requeued the shard: {e}')
+                    self.shard_queue.put((shard, formula_enable, table_enable, future, retries + 1))
+                else:
+                    logger.error(f'pipeline worker on {device} crashed, shard failed after {retries} retries: {e}')
+                    future.set_exception(e)
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                if shms is not None:
+                    _release_shared_memory(shms)
+
+    def submit(self, images_with_extra_info, formula_enable=True, table_enable=True) -> Future:
+        """把一个分片放入共享队列，由最先空闲的副本处理"""
+        future = Future()
+        self.shard_queue.put((images_with_extra_info, formula_enable, table_enable, future, 0))
+        return future
+
+    def analyze(self, images_with_extra_info, formula_enable=True, table_enable=True) -> list:
+        if len(images_with_extra_info) == 0:
+            return []
+        shard_size = max(
+            MIN_SHARD_PAGES, math.ceil(len(images_with_extra_info) / (len(self.replicas) * SHARDS_PER_REPLICA))
+        )
+        futures = [
+            self.submit(images_with_extra_info[i:i + shard_size], formula_enable, table_enable)
+            for i in range(0, len(images_with_extra_info), shard_size)
+        ]
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        return results
+
+    def shutdown(self):
+        for _ in self.dispatchers:
+            self.shard_queue.put(None)
+        for replica in self.replicas:
+            replica.shutdown(wait=False, cancel_futures=True)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+@atexit.register
+def _shutdown_executor():
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+
+
+def get_device_parallel_executor():
+    global _executor
+    devices = get_pipeline_devices()
+    if len(devices) <= 1:
+        return None
+    with _executor_lock:
+        if _executor is None or _executor.devices != devices:
+            if _executor is not None:
+                _executor.shutdown()
+            _executor = DeviceParallelExecutor(devices)
+    return _executor
@@ -0,0 +1,100 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import json
+import os
+
+from loguru import logger
+
+from ...utils.hash_utils import bytes_md5, dict_md5
+from ...version import __version__
+
+
+def get_checkpoint_enable() -> bool:
+    """是否启用断点续跑，通过环境变量MINERU_CHECKPOINT_ENABLE设置，默认为false"""
+    return os.getenv('MINERU_CHECKPOINT_ENABLE', 'false').lower() == 'true'
+
+
+def get_doc_journal_key(pdf_file_name: str, pdf_bytes: bytes, lang, parse_method, formula_enable, table_enable,
+                        start_page_id=0, end_page_id=None) -> str:
+    return dict_md5({
+        # 输出按文件名写入各自的目录，内容相同但文件名不同的文档各自记录
+        'pdf_file_name': pdf_file_name,
+        'pdf_md5': bytes_md5(pdf_bytes),
+        'start_page_id': start_page_id,
+        'end_page_id': end_page_id,
+        'lang': lang,
+        'parse_method': parse_method,
+        'formula_enable': formula_enable,
+        'table_enable': table_enable,
+        'version': __version__,
+    })
+
+
+class DocInferJournal:
+    """
+    单个文档的推理日志：每推理完一批页面就把这些页面的模型结果追加写入jsonl，
+    文档输出全部写完后写入done标记，重启后已推理的页面和已完成的文档都可以跳过。
+    """
+
+    def __init__(self, journal_dir: str, doc_key: str):
+        os.makedirs(journal_dir, exist_ok=True)
+        self.pages_path = os.path.join(journal_dir, f'{doc_key}.pages.jsonl')
+        self.done_path = os.path.join(journal_dir, f'{doc_key}.done')
+
+    def is_done(self) -> bool:
+        return os.path.exists(self.done_path)
+
+    def mark_done(self):
+        with open(self.done_path, 'w', encoding='utf-8') as f:
+            f.write('')
+
+    def load_pages(self) -> dict:
+        """
+        返回 {page_no: page_dict}。进程中断时可能留下不完整的最后一行，
+        把文件截断到最后一个换行符，之后追加的页面从新的一行开始
+        """
+        pages = {}
+        if not os.path.exists(self.pages_path):
+            return pages
+        with open(self.pages_path, 'rb+') as f:
+            data = f.read()
+            complete_size = data.rfind(b'\n') + 1
+            if complete_size < len(data):
+                logger.warning(
+                    f'drop {len(data) - complete_size} bytes of an incomplete record at the end of {self.pages_path}'
+                )
+                f.truncate(complete_size)
+        for line in data[:complete_size].splitlines():
+            try:
+                page_dict = json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+            pages[page_dict['page_info']['page_no']] = page_dict
+        if pages:
+            logger.info(f'resume {len(pages)} inferred pages from {self.pages_path}')
+        return pages
+
+    def append_pages(self, page_dicts: list):
+        if not page_dicts:
+            return
+        with open(self.pages_path, 'ab+') as f:
+            lines = [json.dumps(page_dict, ensure_ascii=False) + '\n' for page_dict in page_dicts]
+            # 文件以不完整的记录结尾时(未经过load_pages)，新记录从新的一行开始，不会与残留内容拼在一起
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    lines.insert(0, '\n')
+            f.write(''.join(lines).encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def get_doc_journals(output_dir, pdf_file_names, pdf_bytes_list, lang_list, parse_method, formula_enable,
+                     table_enable, start_page_id=0, end_page_id=None):
+    """为每个文档创建journal，使用文件名、原始文件字节和页码范围作为key，journal存放在输出目录的.mineru_journal下"""
+    journal_dir = os.path.join(output_dir, '.mineru_journal')
+    return [
+        DocInferJournal(journal_dir, get_doc_journal_key(
+            pdf_file_name, pdf_bytes, lang, parse_method, formula_enable, table_enable, start_page_id, end_page_id
+        ))
+        for pdf_file_name, pdf_bytes, lang in zip(pdf_file_names, pdf_bytes_list, lang_list)
+    ]
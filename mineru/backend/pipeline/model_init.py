@@ -4,13 +4,25 @@ import torch
 from loguru import logger
 
 from .model_list import AtomicModel
-from ...model.layout.doclayout_yolo import DocLayoutYOLOModel
-from ...model.mfd.yolo_v8 import YOLOv8MFDModel
+from ...model.layout.doclayout_yolo import DocLayoutYOLOModel, LAYOUT_IMGSZ
+from ...model.mfd.yolo_v8 import YOLOv8MFDModel, MFD_IMGSZ
 from ...model.mfr.unimernet.Unimernet import UnimernetModel
 from ...model.ocr.paddleocr2pytorch.pytorch_paddle import PytorchPaddleOCR
 from ...model.table.rapid_table import RapidTableModel
+from ...model.synthetic.synthetic_models import (SyntheticLayoutModel, SyntheticMFDModel, SyntheticMFRModel,
+                                                 SyntheticOCRModel, SyntheticTableModel)
+from ...utils.config_reader import get_model_profile
 from ...utils.enum_class import ModelPath
 from ...utils.models_download_utils import auto_download_and_get_model_root_path
+from ...utils.stage_timing import timed_stage
+from ...utils.yolo_onnx import resolve_yolo_weight
+
+
+def get_model_weight_path(relative_path):
+    """下载并返回模型权重路径，合成模型不需要权重，返回None"""
+    if get_model_profile() == 'synthetic':
+        return None
+    return str(os.path.join(auto_download_and_get_model_root_path(relative_path), relative_path))
 
 
 def table_model_init(lang=None):
@@ -28,6 +40,7 @@ def table_model_init(lang=None):
 def mfd_model_init(weight, device='cpu'):
     if str(device).startswith('npu'):
         device = torch.device(device)
+    weight = resolve_yolo_weight(YOLOv8MFDModel.yolo_class, weight, MFD_IMGSZ, device)
     mfd_model = YOLOv8MFDModel(weight, device)
     return mfd_model
 
@@ -40,6 +53,7 @@ def mfr_model_init(weight_dir, device='cpu'):
 def doclayout_yolo_model_init(weight, device='cpu'):
     if str(device).startswith('npu'):
         device = torch.device(device)
+    weight = resolve_yolo_weight(DocLayoutYOLOModel.yolo_class, weight, LAYOUT_IMGSZ, device)
     model = DocLayoutYOLOModel(weight, device)
     return model
 
@@ -86,12 +100,30 @@ class AtomModelSingleton:
             key = atom_model_name
 
         if key not in self._models:
-            self._models[key] = atom_model_init(model_name=atom_model_name, **kwargs)
+            with timed_stage('model_init', 1):
+                self._models[key] = atom_model_init(model_name=atom_model_name, **kwargs)
         return self._models[key]
 
+def synthetic_model_init(model_name: str, **kwargs):
+    if model_name == AtomicModel.Layout:
+        return SyntheticLayoutModel()
+    elif model_name == AtomicModel.MFD:
+        return SyntheticMFDModel()
+    elif model_name == AtomicModel.MFR:
+        return SyntheticMFRModel()
+    elif model_name == AtomicModel.OCR:
+        return SyntheticOCRModel(lang=kwargs.get('lang'))
+    elif model_name == AtomicModel.Table:
+        ocr_engine = AtomModelSingleton().get_atom_model(atom_model_name=AtomicModel.OCR, lang=kwargs.get('lang'))
+        return SyntheticTableModel(ocr_engine)
+    return None
+
+
 def atom_model_init(model_name: str, **kwargs):
     atom_model = None
-    if model_name == AtomicModel.Layout:
+    if get_model_profile() == 'synthetic':
+        atom_model = synthetic_model_init(model_name, **kwargs)
+    elif model_name == AtomicModel.Layout:
         atom_model = doclayout_yolo_model_init(
             kwargs.get('doclayout_yolo_weights'),
             kwargs.get('device')
@@ -143,14 +175,12 @@ class MineruPipelineModel:
             # 初始化公式检测模型
             self.mfd_model = atom_model_manager.get_atom_model(
                 atom_model_name=AtomicModel.MFD,
-                mfd_weights=str(
-                    os.path.join(auto_download_and_get_model_root_path(ModelPath.yolo_v8_mfd), ModelPath.yolo_v8_mfd)
-                ),
+                mfd_weights=get_model_weight_path(ModelPath.yolo_v8_mfd),
                 device=self.device,
             )
 
             # 初始化公式解析模型
-            mfr_weight_dir = os.path.join(auto_download_and_get_model_root_path(ModelPath.unimernet_small), ModelPath.unimernet_small)
+            mfr_weight_dir = get_model_weight_path(ModelPath.unimernet_small)
 
             self.mfr_model = atom_model_manager.get_atom_model(
                 atom_model_name=AtomicModel.MFR,
@@ -161,9 +191,7 @@ class MineruPipelineModel:
         # 初始化layout模型
         self.layout_model = atom_model_manager.get_atom_model(
             atom_model_name=AtomicModel.Layout,
-            doclayout_yolo_weights=str(
-                os.path.join(auto_download_and_get_model_root_path(ModelPath.doclayout_yolo), ModelPath.doclayout_yolo)
-            ),
+            doclayout_yolo_weights=get_model_weight_path(ModelPath.doclayout_yolo),
             device=self.device,
         )
         # 初始化ocr
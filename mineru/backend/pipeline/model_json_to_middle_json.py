@@ -21,36 +21,40 @@ from mineru.utils.span_block_fix import fill_spans_in_blocks, fix_discarded_bloc
 from mineru.utils.span_pre_proc import remove_outside_spans, remove_overlaps_low_confidence_spans, \
     remove_overlaps_min_spans, txt_spans_extract
 from mineru.version import __version__
-from mineru.utils.hash_utils import str_md5
+from mineru.utils.pdf_image_tools import get_page_img_md5
+from mineru.utils.pdf_reader import pdfium_lock
+from mineru.utils.stage_timing import timed_stage
 
 
 def page_model_info_to_page_info(page_model_info, image_dict, page, image_writer, page_index, ocr_enable=False, formula_enabled=True):
     scale = image_dict["scale"]
     page_pil_img = image_dict["img_pil"]
-    page_img_md5 = str_md5(image_dict["img_base64"])
-    page_w, page_h = map(int, page.get_size())
-    magic_model = MagicModel(page_model_info, scale)
-
-    """从magic_model对象中获取后面会用到的区块信息"""
-    discarded_blocks = magic_model.get_discarded()
-    text_blocks = magic_model.get_text_blocks()
-    title_blocks = magic_model.get_title_blocks()
-    inline_equations, interline_equations, interline_equation_blocks = magic_model.get_equations()
-
-    img_groups = magic_model.get_imgs()
-    table_groups = magic_model.get_tables()
-
-    """对image和table的区块分组"""
-    img_body_blocks, img_caption_blocks, img_footnote_blocks, maybe_text_image_blocks = process_groups(
-        img_groups, 'image_body', 'image_caption_list', 'image_footnote_list'
-    )
+    page_img_md5 = get_page_img_md5(image_dict)
+    with pdfium_lock:
+        page_w, page_h = map(int, page.get_size())
+    with timed_stage('magic_model', len(page_model_info['layout_dets'])):
+        magic_model = MagicModel(page_model_info, scale)
+
+        """从magic_model对象中获取后面会用到的区块信息"""
+        discarded_blocks = magic_model.get_discarded()
+        text_blocks = magic_model.get_text_blocks()
+        title_blocks = magic_model.get_title_blocks()
+        inline_equations, interline_equations, interline_equation_blocks = magic_model.get_equations()
+
+        img_groups = magic_model.get_imgs()
+        table_groups = magic_model.get_tables()
+
+        """对image和table的区块分组"""
+        img_body_blocks, img_caption_blocks, img_footnote_blocks, maybe_text_image_blocks = process_groups(
+            img_groups, 'image_body', 'image_caption_list', 'image_footnote_list'
+        )
 
-    table_body_blocks, table_caption_blocks, table_footnote_blocks, _ = process_groups(
-        table_groups, 'table_body', 'table_caption_list', 'table_footnote_list'
-    )
+        table_body_blocks, table_caption_blocks, table_footnote_blocks, _ = process_groups(
+            table_groups, 'table_body', 'table_caption_list', 'table_footnote_list'
+        )
 
-    """获取所有的spans信息"""
-    spans = magic_model.get_all_spans()
+        """获取所有的spans信息"""
+        spans = magic_model.get_all_spans()
 
     """某些图可能是文本块，通过简单的规则判断一下"""
     if len(maybe_text_image_blocks) > 0:
@@ -123,21 +127,23 @@ def page_model_info_to_page_info(page_model_info, image_dict, page, image_writer
             page_h,
         )
 
-    """在删除重复span之前，应该通过image_body和table_body的block过滤一下image和table的span"""
-    """顺便删除大水印并保留abandon的span"""
-    spans = remove_outside_spans(spans, all_bboxes, all_discarded_blocks)
+    with timed_stage('span_preproc', len(spans)):
+        """在删除重复span之前，应该通过image_body和table_body的block过滤一下image和table的span"""
+        """顺便删除大水印并保留abandon的span"""
+        spans = remove_outside_spans(spans, all_bboxes, all_discarded_blocks)
 
-    """删除重叠spans中置信度较低的那些"""
-    spans, dropped_spans_by_confidence = remove_overlaps_low_confidence_spans(spans)
-    """删除重叠spans中较小的那些"""
-    spans, dropped_spans_by_span_overlap = remove_overlaps_min_spans(spans)
+        """删除重叠spans中置信度较低的那些"""
+        spans, dropped_spans_by_confidence = remove_overlaps_low_confidence_spans(spans)
+        """删除重叠spans中较小的那些"""
+        spans, dropped_spans_by_span_overlap = remove_overlaps_min_spans(spans)
 
     """根据parse_mode，构造spans，主要是文本类的字符填充"""
     if ocr_enable:
         pass
     else:
         """使用新版本的混合ocr方案."""
-        spans = txt_spans_extract(page, spans, page_pil_img, scale, all_bboxes, all_discarded_blocks)
+        with timed_stage('txt_extract', len(spans)):
+            spans = txt_spans_extract(page, spans, page_pil_img, scale, all_bboxes, all_discarded_blocks)
 
     """先处理不需要排版的discarded_blocks"""
     discarded_block_with_spans, spans = fill_spans_in_blocks(
@@ -150,20 +156,24 @@ def page_model_info_to_page_info(page_model_info, image_dict, page, image_writer
         return None
 
     """对image/table/interline_equation截图"""
-    for span in spans:
-        if span['type'] in [ContentType.IMAGE, ContentType.TABLE, ContentType.INTERLINE_EQUATION]:
-            span = cut_image_and_table(
-                span, page_pil_img, page_img_md5, page_index, image_writer, scale=scale
-            )
+    with timed_stage('cut_image') as cut_items:
+        for span in spans:
+            if span['type'] in [ContentType.IMAGE, ContentType.TABLE, ContentType.INTERLINE_EQUATION]:
+                span = cut_image_and_table(
+                    span, page_pil_img, page_img_md5, page_index, image_writer, scale=scale
+                )
+                cut_items.item_num += 1
 
-    """span填充进block"""
-    block_with_spans, spans = fill_spans_in_blocks(all_bboxes, spans, 0.5)
+    with timed_stage('span_fill', len(spans)):
+        """span填充进block"""
+        block_with_spans, spans = fill_spans_in_blocks(all_bboxes, spans, 0.5)
 
-    """对block进行fix操作"""
-    fix_blocks = fix_block_spans(block_with_spans)
+        """对block进行fix操作"""
+        fix_blocks = fix_block_spans(block_with_spans)
 
     """对block进行排序"""
-    sorted_blocks = sort_blocks_by_bbox(fix_blocks, page_w, page_h, footnote_blocks)
+    with timed_stage('layout_sort', len(fix_blocks)):
+        sorted_blocks = sort_blocks_by_bbox(fix_blocks, page_w, page_h, footnote_blocks)
 
     """构造page_info"""
     page_info = make_page_info_dict(sorted_blocks, page_index, page_w, page_h, fix_discarded_blocks)
@@ -172,18 +182,46 @@ def page_model_info_to_page_info(page_model_info, image_dict, page, image_writer
 
 
 def result_to_middle_json(model_list, images_list, pdf_doc, image_writer, lang=None, ocr_enable=False, formula_enabled=True):
-    middle_json = {"pdf_info": [], "_backend":"pipeline", "_version_name": __version__}
+    middle_json = init_middle_json()
     formula_enabled = get_formula_enable(formula_enabled)
     for page_index, page_model_info in tqdm(enumerate(model_list), total=len(model_list), desc="Processing pages"):
+        append_page_to_middle_json(
+            middle_json, page_model_info, images_list[page_index], pdf_doc, image_writer, page_index,
+            ocr_enable=ocr_enable, formula_enabled=formula_enabled
+        )
+
+    return finalize_middle_json(middle_json, pdf_doc, lang)
+
+
+def init_middle_json():
+    return {"pdf_info": [], "_backend":"pipeline", "_version_name": __version__}
+
+
+def append_page_to_middle_json(middle_json, page_model_info, image_dict, pdf_doc, image_writer, page_index, ocr_enable=False, formula_enabled=True):
+    """
+    处理单页的模型结果并追加到middle_json中，调用方可在返回后释放该页的图像。
+    只有对pdfium的调用持有pdfium_lock，模型结果的整理、截图和排序可以与其他线程的渲染并行
+    """
+    with pdfium_lock:
         page = pdf_doc[page_index]
-        image_dict = images_list[page_index]
+    try:
         page_info = page_model_info_to_page_info(
             page_model_info, image_dict, page, image_writer, page_index, ocr_enable=ocr_enable, formula_enabled=formula_enabled
         )
         if page_info is None:
-            page_w, page_h = map(int, page.get_size())
+            with pdfium_lock:
+                page_w, page_h = map(int, page.get_size())
             page_info = make_page_info_dict([], page_index, page_w, page_h, [])
-        middle_json["pdf_info"].append(page_info)
+    finally:
+        # 显式关闭，避免页面对象在其他线程中被垃圾回收时不持锁调用pdfium
+        with pdfium_lock:
+            page.close()
+    middle_json["pdf_info"].append(page_info)
+
+
+def finalize_middle_json(middle_json, pdf_doc, lang=None):
+    """所有页面追加完成后的文档级处理：后置ocr、分段、llm优化，并关闭pdf_doc"""
+    page_count = len(middle_json["pdf_info"])
 
     """后置ocr处理"""
     need_ocr_list = []
@@ -214,7 +252,8 @@ def result_to_middle_json(model_list, images_list, pdf_doc, image_writer, lang=N
             det_db_box_thresh=0.3,
             lang=lang
         )
-        ocr_res_list = ocr_model.ocr(img_crop_list, det=False, tqdm_enable=True)[0]
+        with timed_stage('ocr_rec', len(img_crop_list)):
+            ocr_res_list = ocr_model.ocr(img_crop_list, det=False, tqdm_enable=True)[0]
         assert len(ocr_res_list) == len(
             need_ocr_list), f'ocr_res_list: {len(ocr_res_list)}, need_ocr_list: {len(need_ocr_list)}'
         for index, span in enumerate(need_ocr_list):
@@ -227,7 +266,8 @@ def result_to_middle_json(model_list, images_list, pdf_doc, image_writer, lang=N
                 span['score'] = 0.0
 
     """分段"""
-    para_split(middle_json["pdf_info"])
+    with timed_stage('para_split', page_count):
+        para_split(middle_json["pdf_info"])
 
     """llm优化"""
     llm_aided_config = get_llm_aided_config()
@@ -242,8 +282,9 @@ def result_to_middle_json(model_list, images_list, pdf_doc, image_writer, lang=N
                 logger.info(f'llm aided title time: {round(time.time() - llm_aided_title_start_time, 2)}')
 
     """清理内存"""
-    pdf_doc.close()
-    if os.getenv('MINERU_DONOT_CLEAN_MEM') is None and len(model_list) >= 10:
+    with pdfium_lock:
+        pdf_doc.close()
+    if os.getenv('MINERU_DONOT_CLEAN_MEM') is None and page_count >= 10:
         clean_memory(get_device())
 
     return middle_json
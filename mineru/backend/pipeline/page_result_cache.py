@@ -0,0 +1,208 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from loguru import logger
+
+from ...utils.config_reader import (
+    get_formula_enable,
+    get_formula_prefilter_enable,
+    get_model_profile,
+    get_ocr_backend,
+    get_table_enable,
+    get_yolo_backend,
+)
+from ...utils.enum_class import ModelPath
+from ...utils.hash_utils import bytes_md5, str_md5
+from ...utils.pdf_formula_hint import FORMULA_HINT_KEY
+from ...version import __version__
+
+
+def get_page_cache_dir():
+    """页面推理结果缓存目录，通过环境变量MINERU_PAGE_CACHE_DIR设置，未设置时不启用缓存"""
+    return os.getenv('MINERU_PAGE_CACHE_DIR', '') or None
+
+
+def get_page_cache_max_bytes() -> int:
+    """缓存容量上限，通过环境变量MINERU_PAGE_CACHE_SIZE_MB设置，默认为1024MB"""
+    return int(os.getenv('MINERU_PAGE_CACHE_SIZE_MB', 1024)) * 1024 * 1024
+
+
+def _get_models_version() -> str:
+    """模型版本以及会改变推理结果的执行方式(ONNX/int8后端、公式预筛选)"""
+    return str_md5('|'.join([
+        __version__, get_model_profile(),
+        ModelPath.doclayout_yolo, ModelPath.yolo_v8_mfd, ModelPath.unimernet_small,
+        ModelPath.pytorch_paddle, ModelPath.slanet_plus,
+        f'yolo_backend={get_yolo_backend()}', f'ocr_backend={get_ocr_backend()}',
+        f'formula_prefilter={get_formula_prefilter_enable()}',
+    ]))
+
+
+def get_page_cache_key(pil_img, ocr_enable, lang, formula_enable, table_enable, models_version=None) -> str:
+    """由页面位图内容、文本层的公式预筛选结论、模型版本以及影响推理结果的选项共同决定缓存key"""
+    if models_version is None:
+        models_version = _get_models_version()
+    bitmap_md5 = bytes_md5(pil_img.tobytes())
+    return str_md5(
+        f'{bitmap_md5}|{pil_img.mode}|{pil_img.width}x{pil_img.height}|{pil_img.info.get(FORMULA_HINT_KEY)}|'
+        f'{models_version}|'
+        f'{ocr_enable}|{lang}|{get_formula_enable(formula_enable)}|{get_table_enable(table_enable)}'
+    )
+
+
+def _dumps(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _loads(blob: bytes):
+    return json.loads(blob.decode('utf-8'))
+
+
+class PageResultCache:
+    """
+    基于sqlite的页面级推理结果缓存，按字节数限制容量并以LRU方式淘汰。
+    结果以JSON保存，缓存目录被其他用户共享时也不会因读取缓存而执行任意代码；
+    命中时的访问时间先记在内存中，在下次写入或批次结束时一次性提交
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, 'page_result_cache.sqlite')
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._pending_access = {}
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS page_result '
+            '(key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_page_result_last_access ON page_result(last_access)')
+        self.conn.commit()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self.conn.execute('SELECT value FROM page_result WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                try:
+                    value = _loads(row[0])
+                except ValueError:
+                    # 无法解析的条目(如旧版本写入的数据)视为未命中，之后由put覆盖
+                    row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._pending_access[key] = time.time()
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value):
+        try:
+            blob = _dumps(value)
+        except (TypeError, ValueError) as e:
+            logger.warning(f'page result is not json serializable, skip caching: {e}')
+            return
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            self._flush_access()
+            self.conn.execute(
+                'INSERT OR REPLACE INTO page_result (key, value, size, last_access) VALUES (?, ?, ?, ?)',
+                (key, blob, len(blob), time.time())
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _flush_access(self):
+        """把内存中记录的命中时间写入数据库，调用方负责持有锁和提交"""
+        if not self._pending_access:
+            return
+        self.conn.executemany(
+            'UPDATE page_result SET last_access = ? WHERE key = ?',
+            [(last_access, key) for key, last_access in self._pending_access.items()]
+        )
+        self._pending_access.clear()
+
+    def flush(self):
+        with self._lock:
+            if self._pending_access:
+                self._flush_access()
+                self.conn.commit()
+
+    def _evict(self):
+        total_bytes = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM page_result').fetchone()[0]
+        if total_bytes <= self.max_bytes:
+            return
+        evict_keys = []
+        for key, size in self.conn.execute('SELECT key, size FROM page_result ORDER BY last_access ASC'):
+            if total_bytes <= self.max_bytes:
+                break
+            evict_keys.append((key,))
+            total_bytes -= size
+        self.conn.executemany('DELETE FROM page_result WHERE key = ?', evict_keys)
+        self.evictions += len(evict_keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, total_bytes = self.conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM page_result'
+            ).fetchone()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': entries,
+            'bytes': total_bytes,
+        }
+
+    def analyze(self, images_with_extra_info, formula_enable, table_enable, analyze_fn) -> list:
+        """命中缓存的页面直接返回结果，未命中的页面(相同内容只推理一次)交给analyze_fn推理后写入缓存"""
+        results = [None] * len(images_with_extra_info)
+        miss_indices_by_key = {}
+        models_version = _get_models_version()
+        for index, (pil_img, ocr_enable, lang) in enumerate(images_with_extra_info):
+            key = get_page_cache_key(pil_img, ocr_enable, lang, formula_enable, table_enable, models_version)
+            if key in miss_indices_by_key:
+                miss_indices_by_key[key].append(index)
+                continue
+            cached_result = self.get(key)
+            if cached_result is not None:
+                results[index] = cached_result
+            else:
+                miss_indices_by_key[key] = [index]
+
+        if miss_indices_by_key:
+            miss_keys = list(miss_indices_by_key.keys())
+            miss_images = [images_with_extra_info[miss_indices_by_key[key][0]] for key in miss_keys]
+            miss_results = analyze_fn(miss_images, formula_enable, table_enable)
+            for key, result in zip(miss_keys, miss_results):
+                self.put(key, result)
+                indices = miss_indices_by_key[key]
+                results[indices[0]] = result
+                # 同一批次中内容相同的页面各自持有一份结果，避免后处理时互相影响
+                for index in indices[1:]:
+                    results[index] = _loads(_dumps(result))
+        self.flush()
+
+        logger.info(f'page result cache: {len(images_with_extra_info) - len(miss_indices_by_key)} pages reused, stats: {self.stats()}')
+        return results
+
+
+_page_result_cache = None
+
+
+def get_page_result_cache():
+    global _page_result_cache
+    cache_dir = get_page_cache_dir()
+    if cache_dir is None:
+        return None
+    if _page_result_cache is None or _page_result_cache.db_path != os.path.join(cache_dir, 'page_result_cache.sqlite'):
+        _page_result_cache = PageResultCache(cache_dir, get_page_cache_max_bytes())
+    return _page_result_cache
@@ -1,14 +1,26 @@
+import contextvars
+import copy
 import os
 import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple
 import PIL.Image
+import pypdfium2 as pdfium
 from loguru import logger
 
+from .device_parallel import get_device_parallel_executor
 from .model_init import MineruPipelineModel
-from mineru.utils.config_reader import get_device
+from .page_result_cache import get_page_result_cache
+from .model_json_to_middle_json import init_middle_json, append_page_to_middle_json, finalize_middle_json
+from mineru.utils.config_reader import get_device, get_formula_enable
 from ...utils.pdf_classify import classify
-from ...utils.pdf_image_tools import load_images_from_pdf
+from ...utils.pdf_formula_hint import PAGE_ID_KEY
+from ...utils.pdf_image_tools import load_images_from_pdf, pdf_page_to_image
+from ...utils.pdf_reader import pdfium_lock
 from ...utils.model_utils import get_vram, clean_memory
+from ...utils.stage_timing import stage_timing_scope, timed_stage
+from ...utils.trace_export import trace_span
 
 
 os.environ['PYTORCH_ENABLE_MPS_FALLBACK'] = '1'  # 让mps可以fallback
@@ -72,10 +84,15 @@ def doc_analyze(
         parse_method: str = 'auto',
         formula_enable=True,
         table_enable=True,
+        journal_list=None,
+        timing_report=None,
 ):
     """
     适当调大MIN_BATCH_INFERENCE_SIZE可以提高性能，更大的 MIN_BATCH_INFERENCE_SIZE会消耗更多内存，
     可通过环境变量MINERU_MIN_BATCH_INFERENCE_SIZE设置，默认值为384。
+    传入journal_list(每个文档一个DocInferJournal)时，已记录在journal中的页面跳过推理，
+    新推理的页面在每个批次完成后写入journal。
+    传入timing_report(PipelineTimingReport)时，按文档记录分类、渲染耗时，按批次记录各模型阶段耗时。
     """
     min_batch_inference_size = int(os.environ.get('MINERU_MIN_BATCH_INFERENCE_SIZE', 384))
 
@@ -85,48 +102,79 @@ def doc_analyze(
     all_image_lists = []
     all_pdf_docs = []
     ocr_enabled_list = []
+    journal_pages_list = []
     for pdf_idx, pdf_bytes in enumerate(pdf_bytes_list):
-        # 确定OCR设置
-        _ocr_enable = False
-        if parse_method == 'auto':
-            if classify(pdf_bytes) == 'ocr':
-                _ocr_enable = True
-        elif parse_method == 'ocr':
-            _ocr_enable = True
+        with stage_timing_scope(timing_report.doc(pdf_idx) if timing_report is not None else None), \
+                trace_span('document_load', 'document', pdf_idx=pdf_idx) as doc_span:
+            # 确定OCR设置
+            _ocr_enable = get_ocr_enable(pdf_bytes, parse_method)
+
+            # 收集每个数据集中的页面
+            with timed_stage('render') as render_items:
+                images_list, pdf_doc = load_images_from_pdf(pdf_bytes)
+                render_items.item_num = len(images_list)
+            doc_span.set_attribute('page_num', len(images_list))
+            doc_span.set_attribute('ocr_enable', _ocr_enable)
 
         ocr_enabled_list.append(_ocr_enable)
         _lang = lang_list[pdf_idx]
+        journal_pages_list.append(journal_list[pdf_idx].load_pages() if journal_list is not None else {})
 
-        # 收集每个数据集中的页面
-        images_list, pdf_doc = load_images_from_pdf(pdf_bytes)
         all_image_lists.append(images_list)
         all_pdf_docs.append(pdf_doc)
         for page_idx in range(len(images_list)):
             img_dict = images_list[page_idx]
+            img_dict['img_pil'].info[PAGE_ID_KEY] = (pdf_idx, page_idx)
             all_pages_info.append((
                 pdf_idx, page_idx,
                 img_dict['img_pil'], _ocr_enable, _lang,
             ))
 
-    # 准备批处理
-    images_with_extra_info = [(info[2], info[3], info[4]) for info in all_pages_info]
+    # 准备批处理，journal中已有的页面直接复用结果
+    results = [None] * len(all_pages_info)
+    infer_page_indices = []
+    for i, (pdf_idx, page_idx, _, _, _) in enumerate(all_pages_info):
+        if page_idx in journal_pages_list[pdf_idx]:
+            results[i] = journal_pages_list[pdf_idx][page_idx]['layout_dets']
+        else:
+            infer_page_indices.append(i)
+    del journal_pages_list
+
     batch_size = min_batch_inference_size
-    batch_images = [
-        images_with_extra_info[i:i + batch_size]
-        for i in range(0, len(images_with_extra_info), batch_size)
+    batch_page_indices = [
+        infer_page_indices[i:i + batch_size]
+        for i in range(0, len(infer_page_indices), batch_size)
     ]
 
     # 执行批处理
-    results = []
     processed_images_count = 0
-    for index, batch_image in enumerate(batch_images):
+    for index, page_indices in enumerate(batch_page_indices):
+        batch_image = [
+            (all_pages_info[i][2], all_pages_info[i][3], all_pages_info[i][4]) for i in page_indices
+        ]
         processed_images_count += len(batch_image)
         logger.info(
-            f'Batch {index + 1}/{len(batch_images)}: '
-            f'{processed_images_count} pages/{len(images_with_extra_info)} pages'
+            f'Batch {index + 1}/{len(batch_page_indices)}: '
+            f'{processed_images_count} pages/{len(infer_page_indices)} pages'
         )
-        batch_results = batch_image_analyze(batch_image, formula_enable, table_enable)
-        results.extend(batch_results)
+        batch_times = None
+        if timing_report is not None:
+            batch_times = timing_report.new_batch([all_pages_info[i][0] for i in page_indices])
+        with stage_timing_scope(batch_times), trace_span(
+                'batch', 'batch', batch_idx=index, page_num=len(page_indices),
+                doc_num=len({all_pages_info[i][0] for i in page_indices}),
+        ):
+            batch_results = batch_image_analyze(batch_image, formula_enable, table_enable)
+        for i, result in zip(page_indices, batch_results):
+            results[i] = result
+
+        if journal_list is not None:
+            journal_page_dicts = defaultdict(list)
+            for i in page_indices:
+                pdf_idx, page_idx, pil_img, _, _ = all_pages_info[i]
+                journal_page_dicts[pdf_idx].append(_make_page_dict(page_idx, pil_img, results[i]))
+            for pdf_idx, page_dicts in journal_page_dicts.items():
+                journal_list[pdf_idx].append_pages(page_dicts)
 
     # 构建返回结果
     infer_results = []
@@ -136,22 +184,231 @@ def doc_analyze(
 
     for i, page_info in enumerate(all_pages_info):
         pdf_idx, page_idx, pil_img, _, _ = page_info
-        result = results[i]
+        infer_results[pdf_idx].append(_make_page_dict(page_idx, pil_img, results[i]))
 
-        page_info_dict = {'page_no': page_idx, 'width': pil_img.width, 'height': pil_img.height}
-        page_dict = {'layout_dets': result, 'page_info': page_info_dict}
+    return infer_results, all_image_lists, all_pdf_docs, lang_list, ocr_enabled_list
 
-        infer_results[pdf_idx].append(page_dict)
 
-    return infer_results, all_image_lists, all_pdf_docs, lang_list, ocr_enabled_list
+def _make_page_dict(page_idx, pil_img, layout_dets):
+    page_info_dict = {'page_no': page_idx, 'width': pil_img.width, 'height': pil_img.height}
+    return {'layout_dets': layout_dets, 'page_info': page_info_dict}
+
+
+def get_ocr_enable(pdf_bytes, parse_method: str = 'auto') -> bool:
+    if parse_method == 'auto':
+        with timed_stage('classify', 1):
+            return classify(pdf_bytes) == 'ocr'
+    return parse_method == 'ocr'
+
+
+def get_pipeline_streaming_enable() -> bool:
+    """是否使用doc_analyze_streaming流式处理，通过环境变量MINERU_PIPELINE_STREAMING_ENABLE设置，默认为false"""
+    return os.getenv('MINERU_PIPELINE_STREAMING_ENABLE', 'false').lower() == 'true'
+
+
+def _iter_pdf_pages(pdf_bytes_list, lang_list, parse_method, doc_states, journal_list=None, timing_report=None):
+    """按需逐页渲染，打开每个文档时在doc_states中登记该文档的状态"""
+    for pdf_idx, pdf_bytes in enumerate(pdf_bytes_list):
+        # 生成器会在yield处挂起，计时范围不能跨越yield
+        doc_times = timing_report.doc(pdf_idx) if timing_report is not None else None
+        with stage_timing_scope(doc_times), pdfium_lock:
+            pdf_doc = pdfium.PdfDocument(pdf_bytes)
+            ocr_enable = get_ocr_enable(pdf_bytes, parse_method)
+        doc_states[pdf_idx] = {
+            'pdf_doc': pdf_doc,
+            'page_count': len(pdf_doc),
+            'done_count': 0,
+            'lang': lang_list[pdf_idx],
+            'ocr_enable': ocr_enable,
+            'model_list': [],
+            'middle_json': init_middle_json(),
+            'journal_pages': journal_list[pdf_idx].load_pages() if journal_list is not None else {},
+            'timing': doc_times,
+        }
+        for page_idx in range(len(pdf_doc)):
+            with stage_timing_scope(doc_times), pdfium_lock, timed_stage('render', 1):
+                page = pdf_doc[page_idx]
+                image_dict = pdf_page_to_image(page)
+                page.close()
+            image_dict['img_pil'].info[PAGE_ID_KEY] = (pdf_idx, page_idx)
+            yield pdf_idx, page_idx, image_dict
+
+
+def _take_batch_doc_states(page_buffer, doc_states) -> dict:
+    """
+    在主线程中取出一个批次涉及的文档状态交给后处理线程，后处理线程不访问doc_states。
+    最后一页在本批次中的文档和没有页面的文档在本批次后处理完成后结束，从doc_states中移除
+    """
+    batch_pdf_idx_set = {pdf_idx for pdf_idx, _, _ in page_buffer}
+    batch_doc_states = {}
+    for pdf_idx in sorted(doc_states):
+        doc_state = doc_states[pdf_idx]
+        if pdf_idx in batch_pdf_idx_set or doc_state['page_count'] == 0:
+            batch_doc_states[pdf_idx] = doc_state
+    last_page_pdf_idx_set = {
+        pdf_idx for pdf_idx, page_idx, _ in page_buffer if page_idx == doc_states[pdf_idx]['page_count'] - 1
+    }
+    for pdf_idx, doc_state in batch_doc_states.items():
+        if pdf_idx in last_page_pdf_idx_set or doc_state['page_count'] == 0:
+            doc_states.pop(pdf_idx)
+    return batch_doc_states
+
+
+def _postprocess_batch(page_buffer, batch_results, batch_doc_states, image_writer_list, formula_enabled):
+    """
+    在后处理线程中把一个批次的推理结果转换为middle_json页面，
+    并对所有页面已处理完毕的文档做文档级处理，返回这些文档的 [(pdf_idx, model_list, middle_json)]。
+    pdfium_lock只在对pdfium的调用内部持有，后处理与主线程的渲染可以并行
+    """
+    for (pdf_idx, page_idx, image_dict), result in zip(page_buffer, batch_results):
+        doc_state = batch_doc_states[pdf_idx]
+        page_dict = _make_page_dict(page_idx, image_dict['img_pil'], result)
+        with stage_timing_scope(doc_state['timing']), \
+                trace_span('page', 'document', pdf_idx=pdf_idx, page_idx=page_idx):
+            with timed_stage('model_json_copy', 1):
+                doc_state['model_list'].append(copy.deepcopy(page_dict))
+            append_page_to_middle_json(
+                doc_state['middle_json'], page_dict, image_dict, doc_state['pdf_doc'],
+                image_writer_list[pdf_idx], page_idx,
+                ocr_enable=doc_state['ocr_enable'], formula_enabled=formula_enabled
+            )
+        doc_state['done_count'] += 1
+    # 当前批次的页面图像在此释放
+    page_buffer.clear()
+
+    finished_docs = []
+    for pdf_idx, doc_state in batch_doc_states.items():
+        if doc_state['done_count'] == doc_state['page_count']:
+            with stage_timing_scope(doc_state['timing']), \
+                    trace_span('document_finalize', 'document', pdf_idx=pdf_idx, page_num=doc_state['page_count']):
+                middle_json = finalize_middle_json(doc_state['middle_json'], doc_state['pdf_doc'], doc_state['lang'])
+            finished_docs.append((pdf_idx, doc_state['model_list'], middle_json))
+    return finished_docs
+
+
+def doc_analyze_streaming(
+        pdf_bytes_list,
+        lang_list,
+        image_writer_list,
+        parse_method: str = 'auto',
+        formula_enable=True,
+        table_enable=True,
+        journal_list=None,
+        timing_report=None,
+):
+    """
+    doc_analyze的流式版本，页面按需渲染进一个容量为MINERU_MIN_BATCH_INFERENCE_SIZE的有界缓冲区。
+    第N个批次的推理结果交给后处理线程生成middle_json，同时主线程继续渲染并推理第N+1个批次，
+    使GPU推理与CPU后处理并行，页面图像在后处理完成后立即释放，同一时刻最多保留两个批次的页面图像。
+    pdfium不是线程安全的，渲染与后处理中对pdfium的调用通过pdfium_lock串行化，锁只覆盖pdfium调用本身。
+    每个文档的全部页面处理完成后按输入顺序 yield (pdf_idx, model_list, middle_json)，
+    model_list为未经后处理修改的模型输出。
+    传入journal_list、timing_report时行为与doc_analyze相同。
+    """
+    min_batch_inference_size = int(os.environ.get('MINERU_MIN_BATCH_INFERENCE_SIZE', 384))
+    formula_enabled = get_formula_enable(formula_enable)
+
+    doc_states = {}
+    finished_docs = {}
+    pending_futures = deque()
+    next_emit_idx = 0
+    processed_images_count = 0
+    page_iter = _iter_pdf_pages(pdf_bytes_list, lang_list, parse_method, doc_states, journal_list, timing_report)
+
+    postprocess_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mineru-postprocess')
+    try:
+        page_iter_exhausted = False
+        while not page_iter_exhausted or pending_futures:
+            if not page_iter_exhausted:
+                page_buffer = []
+                for page in page_iter:
+                    page_buffer.append(page)
+                    if len(page_buffer) >= min_batch_inference_size:
+                        break
+                page_iter_exhausted = len(page_buffer) < min_batch_inference_size
+
+                # journal中已有的页面直接复用结果
+                batch_results = [
+                    doc_states[pdf_idx]['journal_pages'].pop(page_idx, {}).get('layout_dets')
+                    for pdf_idx, page_idx, _ in page_buffer
+                ]
+                infer_indices = [i for i, result in enumerate(batch_results) if result is None]
+                if infer_indices:
+                    processed_images_count += len(infer_indices)
+                    logger.info(f'Streaming batch: {processed_images_count} pages inferred')
+                    batch_image = []
+                    for i in infer_indices:
+                        pdf_idx, _, image_dict = page_buffer[i]
+                        batch_image.append(
+                            (image_dict['img_pil'], doc_states[pdf_idx]['ocr_enable'], doc_states[pdf_idx]['lang'])
+                        )
+                    batch_times = None
+                    if timing_report is not None:
+                        batch_times = timing_report.new_batch([page_buffer[i][0] for i in infer_indices])
+                    with stage_timing_scope(batch_times), trace_span(
+                            'batch', 'batch', page_num=len(infer_indices),
+                            doc_num=len({page_buffer[i][0] for i in infer_indices}),
+                    ):
+                        infer_results = batch_image_analyze(batch_image, formula_enable, table_enable)
+                    for i, result in zip(infer_indices, infer_results):
+                        batch_results[i] = result
+                    del batch_image, infer_results
+
+                    if journal_list is not None:
+                        journal_page_dicts = defaultdict(list)
+                        for i in infer_indices:
+                            pdf_idx, page_idx, image_dict = page_buffer[i]
+                            journal_page_dicts[pdf_idx].append(
+                                _make_page_dict(page_idx, image_dict['img_pil'], batch_results[i])
+                            )
+                        for pdf_idx, page_dicts in journal_page_dicts.items():
+                            journal_list[pdf_idx].append_pages(page_dicts)
+
+                # 后处理线程按提交顺序执行，保证同一文档的页面顺序，在提交时的上下文中执行以继承当前trace
+                pending_futures.append(postprocess_executor.submit(
+                    contextvars.copy_context().run, _postprocess_batch,
+                    page_buffer, batch_results, _take_batch_doc_states(page_buffer, doc_states),
+                    image_writer_list, formula_enabled
+                ))
+                del page_buffer, batch_results
+
+            # 保留一个批次在后处理线程中与下一批次的推理重叠，其余的等待完成
+            while pending_futures and (
+                    page_iter_exhausted or len(pending_futures) > 1 or pending_futures[0].done()
+            ):
+                for pdf_idx, model_list, middle_json in pending_futures.popleft().result():
+                    finished_docs[pdf_idx] = (model_list, middle_json)
+
+            # 按输入顺序输出已完成的文档
+            while next_emit_idx in finished_docs:
+                model_list, middle_json = finished_docs.pop(next_emit_idx)
+                yield next_emit_idx, model_list, middle_json
+                next_emit_idx += 1
+    finally:
+        postprocess_executor.shutdown(wait=True)
 
 
 def batch_image_analyze(
         images_with_extra_info: List[Tuple[PIL.Image.Image, bool, str]],
         formula_enable=True,
         table_enable=True):
+    with timed_stage('batch_analyze', len(images_with_extra_info)):
+        page_result_cache = get_page_result_cache()
+        if page_result_cache is not None:
+            return page_result_cache.analyze(images_with_extra_info, formula_enable, table_enable, _batch_image_analyze)
+        return _batch_image_analyze(images_with_extra_info, formula_enable, table_enable)
+
+
+def _batch_image_analyze(
+        images_with_extra_info: List[Tuple[PIL.Image.Image, bool, str]],
+        formula_enable=True,
+        table_enable=True):
     # os.environ['CUDA_VISIBLE_DEVICES'] = str(idx)
 
+    executor = get_device_parallel_executor()
+    if executor is not None:
+        return executor.analyze(images_with_extra_info, formula_enable, table_enable)
+
     from .batch_analyze import BatchAnalyze
 
     model_manager = ModelSingleton()
@@ -19,6 +19,7 @@ from .base_predictor import (
     BasePredictor,
 )
 from .utils import load_resource
+from ...utils.trace_export import trace_span
 
 
 class HuggingfacePredictor(BasePredictor):
@@ -140,7 +141,7 @@ class HuggingfacePredictor(BasePredictor):
         input_ids = self.tokenizer(prompt, return_tensors="pt").input_ids
         input_ids = input_ids.to(device=self.model.device)
 
-        with torch.inference_mode():
+        with torch.inference_mode(), trace_span('vlm_generate', 'model', batch_size=1) as span:
             output_ids = self.model.generate(
                 input_ids,
                 images=image_tensor,
@@ -149,6 +150,7 @@ class HuggingfacePredictor(BasePredictor):
                 **generate_kwargs,
                 **kwargs,
             )
+            span.set_attribute('output_tokens', output_ids.shape[1])
 
         # Remove the last token if it is the eos_token_id
         if len(output_ids[0]) > 0 and output_ids[0, -1] == self.eos_token_id:
@@ -14,6 +14,7 @@ from .base_predictor import (
     DEFAULT_TOP_P,
     BasePredictor,
 )
+from ...utils.trace_export import trace_span
 
 
 class SglangEnginePredictor(BasePredictor):
@@ -122,11 +123,12 @@ class SglangEnginePredictor(BasePredictor):
 
         image_strings = [self.load_image_string(img) for img in images]
 
-        output = self.engine.generate(
-            prompt=prompts,
-            image_data=image_strings,
-            sampling_params=sampling_params,
-        )
+        with trace_span('sglang_generate', 'model', batch_size=len(image_strings)):
+            output = self.engine.generate(
+                prompt=prompts,
+                image_data=image_strings,
+                sampling_params=sampling_params,
+            )
         return [item["text"] for item in output]
 
     def stream_predict(
@@ -218,11 +220,12 @@ class SglangEnginePredictor(BasePredictor):
 
         image_strings = [self.load_image_string(img) for img in images]
 
-        output = await self.engine.async_generate(
-            prompt=prompts,
-            image_data=image_strings,
-            sampling_params=sampling_params,
-        )
+        with trace_span('sglang_generate', 'model', batch_size=len(image_strings)):
+            output = await self.engine.async_generate(
+                prompt=prompts,
+                image_data=image_strings,
+                sampling_params=sampling_params,
+            )
         ret = []
         for item in output:  # type: ignore
             ret.append(item["text"])
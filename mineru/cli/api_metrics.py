@@ -0,0 +1,127 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import sys
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+from mineru.utils.stage_timing import add_stage_listener
+from mineru.utils.trace_export import trace_session
+
+REQUEST_COUNT = Counter(
+    'mineru_api_requests', 'Number of /file_parse requests',
+    ['backend', 'parse_method', 'status'],
+)
+REQUEST_LATENCY = Histogram(
+    'mineru_api_request_duration_seconds', 'Latency of /file_parse requests',
+    ['backend', 'parse_method'],
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600),
+)
+IN_FLIGHT_REQUESTS = Gauge('mineru_api_in_flight_requests', 'Number of /file_parse requests being processed')
+PAGES_PROCESSED = Counter('mineru_api_pages_processed', 'Number of pages parsed by the service', ['backend'])
+UPLOAD_BYTES = Counter('mineru_api_upload_bytes', 'Bytes of uploaded files', ['backend'])
+OUTPUT_BYTES = Counter('mineru_api_output_bytes', 'Bytes of /file_parse response bodies', ['backend'])
+STAGE_DURATION = Histogram(
+    'mineru_stage_duration_seconds', 'Duration of pipeline stages',
+    ['stage'],
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+STAGE_ITEMS = Counter('mineru_stage_items', 'Number of items processed by pipeline stages', ['stage'])
+MODEL_LOAD_DURATION = Histogram(
+    'mineru_model_load_duration_seconds', 'Duration of model loading',
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+
+
+class AcceleratorMemoryCollector:
+    """抓取时读取加速卡显存，只在推理已经导入torch的情况下统计，不会为此额外导入torch"""
+
+    def collect(self):
+        gauge = GaugeMetricFamily(
+            'mineru_accelerator_memory_bytes', 'Accelerator memory of the service process',
+            labels=['device', 'kind'],
+        )
+        torch = sys.modules.get('torch')
+        torch_npu = sys.modules.get('torch_npu')
+        try:
+            if torch is not None and torch.cuda.is_available():
+                for index in range(torch.cuda.device_count()):
+                    device = f'cuda:{index}'
+                    gauge.add_metric([device, 'allocated'], torch.cuda.memory_allocated(index))
+                    gauge.add_metric([device, 'reserved'], torch.cuda.memory_reserved(index))
+                    gauge.add_metric([device, 'total'], torch.cuda.get_device_properties(index).total_memory)
+            if torch_npu is not None and torch_npu.npu.is_available():
+                for index in range(torch_npu.npu.device_count()):
+                    device = f'npu:{index}'
+                    gauge.add_metric([device, 'allocated'], torch_npu.npu.memory_allocated(index))
+                    gauge.add_metric([device, 'reserved'], torch_npu.npu.memory_reserved(index))
+        except Exception:
+            pass
+        yield gauge
+
+
+def _observe_stage(stage, start_time, elapsed, item_num):
+    if stage == 'model_init':
+        MODEL_LOAD_DURATION.observe(elapsed)
+        return
+    STAGE_DURATION.labels(stage).observe(elapsed)
+    STAGE_ITEMS.labels(stage).inc(item_num)
+
+
+add_stage_listener(_observe_stage)
+REGISTRY.register(AcceleratorMemoryCollector())
+
+
+def observe_request(backend, parse_method, status_code, start_time, output_bytes):
+    backend = backend or 'unknown'
+    parse_method = parse_method or 'unknown'
+    REQUEST_COUNT.labels(backend, parse_method, str(status_code)).inc()
+    REQUEST_LATENCY.labels(backend, parse_method).observe(time.time() - start_time)
+    OUTPUT_BYTES.labels(backend).inc(output_bytes)
+
+
+class RequestMetricsMiddleware:
+    """
+    统计path的请求数、延迟、并发数和响应字节数，backend等标签由接口处理函数写入request.state.metrics_labels，
+    设置了MINERU_TRACE_DIR时每个请求写出一个trace文件。
+    需注册在GZipMiddleware内侧：响应字节数按实际发送的响应体累计，是压缩前的大小，流式响应同样适用；
+    处理函数抛出异常而未发送响应时按500记录
+    """
+
+    def __init__(self, app, path: str = '/file_parse'):
+        self.app = app
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] != self.path:
+            await self.app(scope, receive, send)
+            return
+        start_time = time.time()
+        response_stat = {'status_code': 500, 'body_bytes': 0}
+
+        async def send_with_metrics(message):
+            if message['type'] == 'http.response.start':
+                response_stat['status_code'] = message['status']
+            elif message['type'] == 'http.response.body':
+                response_stat['body_bytes'] += len(message.get('body', b''))
+            await send(message)
+
+        IN_FLIGHT_REQUESTS.inc()
+        try:
+            with trace_session('file_parse') as span:
+                try:
+                    await self.app(scope, receive, send_with_metrics)
+                finally:
+                    span.set_attribute('status_code', response_stat['status_code'])
+        finally:
+            IN_FLIGHT_REQUESTS.dec()
+            # request.state的内容保存在scope['state']中
+            backend, parse_method = scope.get('state', {}).get('metrics_labels', (None, None))
+            observe_request(
+                backend, parse_method, response_stat['status_code'], start_time, response_stat['body_bytes']
+            )
+
+
+def generate_metrics():
+    """返回(内容, content_type)，进程RSS、CPU等由prometheus_client默认的process collector导出"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,342 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import click
+import pypdfium2 as pdfium
+from loguru import logger
+
+from mineru.utils.cli_parser import arg_parse
+from mineru.utils.config_reader import get_device, get_model_profile
+from mineru.utils.memory_profile import get_peak_rss_bytes, get_rss_bytes, reset_peak_rss
+from mineru.utils.model_utils import get_vram
+from mineru.utils.stage_timing import StageTimes, add_stage_listener, remove_stage_listener
+from ..version import __version__
+from .common import do_parse, read_fn, pdf_suffixes, image_suffixes
+
+try:
+    import resource
+except ImportError:
+    # windows下不可用
+    resource = None
+
+# 源码仓库中的demo文档，通过wheel安装时不存在
+DEFAULT_BENCH_PATH = Path(__file__).resolve().parents[2] / 'demo' / 'pdfs'
+
+
+def get_default_bench_path() -> str:
+    """未指定文档路径时使用源码仓库中的demo文档，不存在时要求显式指定"""
+    if not DEFAULT_BENCH_PATH.is_dir():
+        raise click.UsageError(
+            f'{DEFAULT_BENCH_PATH} is only available in a source checkout, please specify the documents with --path'
+        )
+    return str(DEFAULT_BENCH_PATH)
+
+
+def _to_mb(size: int) -> float:
+    return round(size / 1024 / 1024, 2)
+
+
+def get_process_peak_rss_mb() -> float:
+    """进程生命周期内的峰值RSS，用于无法重置峰值的平台"""
+    if resource is None:
+        return 0.0
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS下ru_maxrss单位为字节，linux下为KB
+    if sys.platform == 'darwin':
+        return _to_mb(max_rss)
+    return _to_mb(max_rss * 1024)
+
+
+def percentile(values: list, q: float) -> float:
+    """线性插值的百分位数，q取值0~100"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    pos = (len(values) - 1) * q / 100
+    lower = int(pos)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (pos - lower)
+
+
+def get_page_num(pdf_bytes: bytes) -> int:
+    pdf = pdfium.PdfDocument(pdf_bytes)
+    page_num = len(pdf)
+    pdf.close()
+    return page_num
+
+
+def load_bench_docs(input_path) -> list:
+    if os.path.isdir(input_path):
+        doc_path_list = sorted(
+            doc_path for doc_path in Path(input_path).glob('*') if doc_path.suffix in pdf_suffixes + image_suffixes
+        )
+    else:
+        doc_path_list = [Path(input_path)]
+    docs = []
+    for doc_path in doc_path_list:
+        pdf_bytes = read_fn(doc_path)
+        docs.append({'name': doc_path.stem, 'pdf_bytes': pdf_bytes, 'page_num': get_page_num(pdf_bytes)})
+    return docs
+
+
+def run_bench_case(docs, backend, parse_method, formula_enable, table_enable, lang, repeat, server_url, **kwargs) -> dict:
+    """
+    逐个文档调用do_parse并计时。页面按批次推理，没有逐页的延迟，doc_avg_page_latency_p50/p95是
+    各文档平均单页耗时(文档耗时除以页数，每个文档一个值)的百分位数，不是逐页延迟的百分位数。
+    各阶段耗时和模型加载耗时通过stage_timing的监听函数汇总。
+    linux下在用例开始时重置峰值RSS，peak_rss_mb只反映本用例，其他平台为进程生命周期内的峰值(peak_rss_scope为process)
+    """
+    stage_times = StageTimes()
+    rss_before = get_rss_bytes()
+    case_scoped_peak = reset_peak_rss()
+
+    def stage_listener(stage, start_time, elapsed, item_num):
+        stage_times.record(stage, elapsed, item_num)
+
+    doc_avg_page_latencies = []
+    total_pages = 0
+    total_time = 0.0
+    add_stage_listener(stage_listener)
+    try:
+        with tempfile.TemporaryDirectory(prefix='mineru_bench_') as output_dir:
+            for _ in range(repeat):
+                for doc in docs:
+                    start_time = time.perf_counter()
+                    do_parse(
+                        output_dir=output_dir,
+                        pdf_file_names=[doc['name']],
+                        pdf_bytes_list=[doc['pdf_bytes']],
+                        p_lang_list=[lang],
+                        backend=backend,
+                        parse_method=parse_method,
+                        formula_enable=formula_enable,
+                        table_enable=table_enable,
+                        server_url=server_url,
+                        **kwargs,
+                    )
+                    doc_time = time.perf_counter() - start_time
+                    total_time += doc_time
+                    total_pages += doc['page_num']
+                    if doc['page_num'] > 0:
+                        doc_avg_page_latencies.append(doc_time / doc['page_num'])
+    finally:
+        remove_stage_listener(stage_listener)
+
+    stages = stage_times.to_dict()['stages']
+    model_init = stages.pop('model_init', {})
+    return {
+        'backend': backend,
+        'parse_method': parse_method,
+        'formula_enable': formula_enable,
+        'table_enable': table_enable,
+        'docs': len(docs) * repeat,
+        'pages': total_pages,
+        'total_time': round(total_time, 4),
+        'pages_per_sec': round(total_pages / total_time, 4) if total_time > 0 else 0.0,
+        'doc_avg_page_latency_p50': round(percentile(doc_avg_page_latencies, 50), 4),
+        'doc_avg_page_latency_p95': round(percentile(doc_avg_page_latencies, 95), 4),
+        'model_load_time': model_init.get('time', 0.0),
+        'peak_rss_mb': _to_mb(get_peak_rss_bytes()) if case_scoped_peak else get_process_peak_rss_mb(),
+        'peak_rss_scope': 'case' if case_scoped_peak else 'process',
+        'rss_delta_mb': _to_mb(get_rss_bytes() - rss_before),
+        'stages': stages,
+    }
+
+
+def _case_key(case: dict) -> tuple:
+    return case['backend'], case['parse_method'], case['formula_enable'], case['table_enable']
+
+
+def compare_with_baseline(results: list, baseline: dict, threshold: float) -> list:
+    """
+    吞吐下降或文档平均单页耗时的p95上升超过threshold(比例)时视为回归，返回回归描述列表。
+    基线中没有doc_avg_page_latency_p95(旧版本的报告中为口径不同的page_latency_p95)时只比较吞吐
+    """
+    baseline_cases = {_case_key(case): case for case in baseline.get('results', [])}
+    regressions = []
+    for case in results:
+        base_case = baseline_cases.get(_case_key(case))
+        if base_case is None:
+            logger.warning(f'no baseline for case {_case_key(case)}')
+            continue
+        if case['pages_per_sec'] < base_case['pages_per_sec'] * (1 - threshold):
+            regressions.append(
+                f'{_case_key(case)} pages_per_sec: {base_case["pages_per_sec"]} -> {case["pages_per_sec"]}'
+            )
+        base_latency = base_case.get('doc_avg_page_latency_p95')
+        if base_latency is None:
+            logger.warning(f'no doc_avg_page_latency_p95 in the baseline of case {_case_key(case)}')
+        elif case['doc_avg_page_latency_p95'] > base_latency * (1 + threshold):
+            regressions.append(
+                f'{_case_key(case)} doc_avg_page_latency_p95: {base_latency} -> {case["doc_avg_page_latency_p95"]}'
+            )
+    return regressions
+
+
+@click.command(context_settings=dict(ignore_unknown_options=True, allow_extra_args=True))
+@click.pass_context
+@click.version_option(__version__, '--version', '-v', help='display the version and exit')
+@click.option(
+    '-p',
+    '--path',
+    'input_path',
+    type=click.Path(exists=True),
+    default=None,
+    help='local filepath or directory of the benchmark documents. Default is demo/pdfs of a source checkout.',
+)
+@click.option(
+    '-b',
+    '--backend',
+    'backends',
+    type=click.Choice(['pipeline', 'vlm-transformers', 'vlm-sglang-engine', 'vlm-sglang-client']),
+    multiple=True,
+    default=['pipeline'],
+    help='backends to benchmark, can be given multiple times. Default is pipeline.',
+)
+@click.option(
+    '-m',
+    '--method',
+    'methods',
+    type=click.Choice(['auto', 'txt', 'ocr']),
+    multiple=True,
+    default=['auto'],
+    help='parse methods to benchmark, can be given multiple times. Default is auto.',
+)
+@click.option(
+    '-f',
+    '--formula',
+    'formula_options',
+    type=bool,
+    multiple=True,
+    default=[True],
+    help='formula_enable values to benchmark, can be given multiple times. Default is True.',
+)
+@click.option(
+    '-t',
+    '--table',
+    'table_options',
+    type=bool,
+    multiple=True,
+    default=[True],
+    help='table_enable values to benchmark, can be given multiple times. Default is True.',
+)
+@click.option('-l', '--lang', 'lang', type=str, default='ch', help="document language. Default is 'ch'.")
+@click.option('-u', '--url', 'server_url', type=str, default=None, help='server url for the sglang-client backend.')
+@click.option('-d', '--device', 'device_mode', type=str, default=None, help='Device mode for model inference.')
+@click.option(
+    '--repeat',
+    'repeat',
+    type=int,
+    default=1,
+    help='number of measured runs over the document set for each case. Default is 1.',
+)
+@click.option(
+    '--warmup/--no-warmup',
+    'warmup',
+    default=True,
+    help='parse the first document once before measuring each backend so that model loading is excluded from '
+         'throughput. Model load time is still reported. Default is enabled.',
+)
+@click.option('-o', '--output', 'output_path', type=click.Path(), default=None, help='write the report to this JSON file.')
+@click.option('--baseline', 'baseline_path', type=click.Path(exists=True), default=None, help='baseline report JSON to compare with.')
+@click.option(
+    '--threshold',
+    'threshold',
+    type=float,
+    default=0.1,
+    help='allowed relative regression of pages/sec and p95 of the per-document average page latency against the '
+         'baseline. Default is 0.1.',
+)
+def main(
+        ctx, input_path, backends, methods, formula_options, table_options, lang, server_url,
+        device_mode, repeat, warmup, output_path, baseline_path, threshold
+):
+    kwargs = arg_parse(ctx)
+
+    if device_mode is not None and os.getenv('MINERU_DEVICE_MODE', None) is None:
+        os.environ['MINERU_DEVICE_MODE'] = device_mode
+    if os.getenv('MINERU_DEVICE_MODE', None) is None:
+        os.environ['MINERU_DEVICE_MODE'] = get_device()
+    device = os.environ['MINERU_DEVICE_MODE']
+    if os.getenv('MINERU_VIRTUAL_VRAM_SIZE', None) is None:
+        if device.startswith('cuda') or device.startswith('npu'):
+            os.environ['MINERU_VIRTUAL_VRAM_SIZE'] = str(round(get_vram(device)))
+        else:
+            os.environ['MINERU_VIRTUAL_VRAM_SIZE'] = '1'
+
+    if input_path is None:
+        input_path = get_default_bench_path()
+    docs = load_bench_docs(input_path)
+    if not docs:
+        raise click.UsageError(f'no pdf or image found in {input_path}')
+    logger.info(f'benchmark documents: {len(docs)}, pages: {sum(doc["page_num"] for doc in docs)}')
+
+    results = []
+    warmed_backends = set()
+    for backend, parse_method, formula_enable, table_enable in itertools.product(
+            backends, methods, formula_options, table_options
+    ):
+        if backend != 'pipeline' and parse_method != methods[0]:
+            # parse_method只对pipeline生效
+            continue
+        model_load_time = 0.0
+        if warmup and backend not in warmed_backends:
+            warmed_backends.add(backend)
+            warmup_case = run_bench_case(
+                docs[:1], backend, parse_method, formula_enable, table_enable, lang, 1, server_url, **kwargs
+            )
+            model_load_time = warmup_case['model_load_time']
+        case = run_bench_case(
+            docs, backend, parse_method, formula_enable, table_enable, lang, repeat, server_url, **kwargs
+        )
+        case['model_load_time'] = round(case['model_load_time'] + model_load_time, 4)
+        logger.info(
+            f'{backend}/{parse_method} formula={formula_enable} table={table_enable}: '
+            f'{case["pages_per_sec"]} pages/s, doc avg page latency p50={case["doc_avg_page_latency_p50"]}s, '
+            f'p95={case["doc_avg_page_latency_p95"]}s, '
+            f'model_load={case["model_load_time"]}s, peak_rss={case["peak_rss_mb"]}MB'
+        )
+        results.append(case)
+
+    report = {
+        'version': __version__,
+        'env': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'device': device,
+            'model_profile': get_model_profile(),
+        },
+        'documents': [{'name': doc['name'], 'pages': doc['page_num']} for doc in docs],
+        'repeat': repeat,
+        'results': results,
+    }
+    report_str = json.dumps(report, ensure_ascii=False, indent=4)
+    if output_path is not None:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(report_str)
+        logger.info(f'benchmark report is written to {output_path}')
+    else:
+        print(report_str)
+
+    if baseline_path is not None:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, threshold)
+        if regressions:
+            for regression in regressions:
+                logger.error(f'performance regression: {regression}')
+            sys.exit(1)
+        logger.info(f'no performance regression against {baseline_path} (threshold {threshold})')
+
+
+if __name__ == '__main__':
+    main()
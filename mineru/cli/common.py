@@ -8,10 +8,14 @@ from pathlib import Path
 import pypdfium2 as pdfium
 from loguru import logger
 
+from mineru.backend.pipeline.infer_journal import get_checkpoint_enable, get_doc_journals
 from mineru.data.data_reader_writer import FileBasedDataWriter
 from mineru.utils.draw_bbox import draw_layout_bbox, draw_span_bbox
 from mineru.utils.enum_class import MakeMode
-from mineru.utils.pdf_image_tools import images_bytes_to_pdf_bytes
+from mineru.utils.memory_profile import get_memory_profile_enable
+from mineru.utils.pdf_image_tools import images_bytes_to_pdf_bytes, load_images_from_pdf
+from mineru.utils.stage_timing import PipelineTimingReport, get_stage_timing_enable, stage_timing_scope, timed_stage
+from mineru.utils.trace_export import trace_session, trace_span
 from mineru.backend.vlm.vlm_middle_json_mkcontent import union_make as vlm_union_make
 from mineru.backend.vlm.vlm_analyze import doc_analyze as vlm_doc_analyze
 from mineru.backend.vlm.vlm_analyze import aio_doc_analyze as aio_vlm_doc_analyze
@@ -42,6 +46,11 @@ def prepare_env(output_dir, pdf_file_name, parse_method):
 
 
 def convert_pdf_bytes_to_bytes_by_pypdfium2(pdf_bytes, start_page_id=0, end_page_id=None):
+    return _convert_pdf_bytes(pdf_bytes, start_page_id, end_page_id)[0]
+
+
+def _convert_pdf_bytes(pdf_bytes, start_page_id=0, end_page_id=None):
+    """截取页码范围，返回(新的PDF字节数据, 页数)"""
 
     # 从字节数据加载PDF
     pdf = pdfium.PdfDocument(pdf_bytes)
@@ -71,16 +80,18 @@ def convert_pdf_bytes_to_bytes_by_pypdfium2(pdf_bytes, start_page_id=0, end_page
     pdf.close()  # 关闭原PDF文档以释放资源
     output_pdf.close()  # 关闭新PDF文档以释放资源
 
-    return output_bytes
+    return output_bytes, len(page_indices)
 
 
 def _prepare_pdf_bytes(pdf_bytes_list, start_page_id, end_page_id):
-    """准备处理PDF字节数据"""
+    """准备处理PDF字节数据，返回(截取页码范围后的PDF字节数据列表, 每个文档的页数列表)"""
     result = []
+    page_nums = []
     for pdf_bytes in pdf_bytes_list:
-        new_pdf_bytes = convert_pdf_bytes_to_bytes_by_pypdfium2(pdf_bytes, start_page_id, end_page_id)
+        new_pdf_bytes, page_num = _convert_pdf_bytes(pdf_bytes, start_page_id, end_page_id)
         result.append(new_pdf_bytes)
-    return result
+        page_nums.append(page_num)
+    return result, page_nums
 
 
 def _process_output(
@@ -104,58 +115,95 @@ def _process_output(
 ):
     from mineru.backend.pipeline.pipeline_middle_json_mkcontent import union_make as pipeline_union_make
     """处理输出文件"""
-    if f_draw_layout_bbox:
-        draw_layout_bbox(pdf_info, pdf_bytes, local_md_dir, f"{pdf_file_name}_layout.pdf")
+    with timed_stage('output'):
+        if f_draw_layout_bbox:
+            draw_layout_bbox(pdf_info, pdf_bytes, local_md_dir, f"{pdf_file_name}_layout.pdf")
 
-    if f_draw_span_bbox:
-        draw_span_bbox(pdf_info, pdf_bytes, local_md_dir, f"{pdf_file_name}_span.pdf")
+        if f_draw_span_bbox:
+            draw_span_bbox(pdf_info, pdf_bytes, local_md_dir, f"{pdf_file_name}_span.pdf")
 
-    if f_dump_orig_pdf:
-        md_writer.write(
-            f"{pdf_file_name}_origin.pdf",
-            pdf_bytes,
-        )
+        if f_dump_orig_pdf:
+            md_writer.write(
+                f"{pdf_file_name}_origin.pdf",
+                pdf_bytes,
+            )
 
     image_dir = str(os.path.basename(local_image_dir))
 
     if f_dump_md:
         make_func = pipeline_union_make if is_pipeline else vlm_union_make
-        md_content_str = make_func(pdf_info, f_make_md_mode, image_dir)
-        md_writer.write_string(
-            f"{pdf_file_name}.md",
-            md_content_str,
-        )
+        with timed_stage('markdown', len(pdf_info)):
+            md_content_str = make_func(pdf_info, f_make_md_mode, image_dir)
+        with timed_stage('output'):
+            md_writer.write_string(
+                f"{pdf_file_name}.md",
+                md_content_str,
+            )
 
     if f_dump_content_list:
         make_func = pipeline_union_make if is_pipeline else vlm_union_make
-        content_list = make_func(pdf_info, MakeMode.CONTENT_LIST, image_dir)
-        md_writer.write_string(
-            f"{pdf_file_name}_content_list.json",
-            json.dumps(content_list, ensure_ascii=False, indent=4),
-        )
-
-    if f_dump_middle_json:
-        md_writer.write_string(
-            f"{pdf_file_name}_middle.json",
-            json.dumps(middle_json, ensure_ascii=False, indent=4),
-        )
-
-    if f_dump_model_output:
-        if is_pipeline:
+        with timed_stage('markdown', len(pdf_info)):
+            content_list = make_func(pdf_info, MakeMode.CONTENT_LIST, image_dir)
+        with timed_stage('output'):
             md_writer.write_string(
-                f"{pdf_file_name}_model.json",
-                json.dumps(model_output, ensure_ascii=False, indent=4),
+                f"{pdf_file_name}_content_list.json",
+                json.dumps(content_list, ensure_ascii=False, indent=4),
             )
-        else:
-            output_text = ("\n" + "-" * 50 + "\n").join(model_output)
+
+    with timed_stage('output'):
+        if f_dump_middle_json:
             md_writer.write_string(
-                f"{pdf_file_name}_model_output.txt",
-                output_text,
+                f"{pdf_file_name}_middle.json",
+                json.dumps(middle_json, ensure_ascii=False, indent=4),
             )
 
+        if f_dump_model_output:
+            if is_pipeline:
+                md_writer.write_string(
+                    f"{pdf_file_name}_model.json",
+                    json.dumps(model_output, ensure_ascii=False, indent=4),
+                )
+            else:
+                output_text = ("\n" + "-" * 50 + "\n").join(model_output)
+                md_writer.write_string(
+                    f"{pdf_file_name}_model_output.txt",
+                    output_text,
+                )
+
     logger.info(f"local output dir is {local_md_dir}")
 
 
+def _dump_timings(md_writer, pdf_file_name, timing_report, idx, f_dump_timings=True):
+    """写出分阶段耗时报告，启用内存采集时同时写出分阶段内存报告"""
+    if f_dump_timings:
+        md_writer.write_string(
+            f"{pdf_file_name}_timings.json",
+            json.dumps(timing_report.doc_to_dict(idx), ensure_ascii=False, indent=4),
+        )
+    if get_memory_profile_enable():
+        md_writer.write_string(
+            f"{pdf_file_name}_memory.json",
+            json.dumps(timing_report.doc_to_dict(idx, memory=True), ensure_ascii=False, indent=4),
+        )
+
+
+def _doc_outputs_exist(output_dir, pdf_file_name, parse_method, f_dump_md, f_dump_middle_json,
+                       f_dump_model_output, f_dump_content_list) -> bool:
+    """本次需要写出的结果文件是否都已存在于文档的输出目录中"""
+    local_md_dir = os.path.join(output_dir, pdf_file_name, parse_method)
+    output_names = [
+        f"{pdf_file_name}{suffix}" for suffix, f_dump in [
+            (".md", f_dump_md),
+            ("_middle.json", f_dump_middle_json),
+            ("_model.json", f_dump_model_output),
+            ("_content_list.json", f_dump_content_list),
+        ] if f_dump
+    ]
+    return os.path.isdir(local_md_dir) and all(
+        os.path.exists(os.path.join(local_md_dir, output_name)) for output_name in output_names
+    )
+
+
 def _process_pipeline(
         output_dir,
         pdf_file_names,
@@ -172,20 +220,55 @@ def _process_pipeline(
         f_dump_orig_pdf,
         f_dump_content_list,
         f_make_md_mode,
+        journal_list=None,
+        f_dump_timings=False,
 ):
     """处理pipeline后端逻辑"""
     from mineru.backend.pipeline.model_json_to_middle_json import result_to_middle_json as pipeline_result_to_middle_json
     from mineru.backend.pipeline.pipeline_analyze import doc_analyze as pipeline_doc_analyze
+    from mineru.backend.pipeline.pipeline_analyze import get_pipeline_streaming_enable
+
+    if journal_list is not None:
+        # 跳过journal中已完成且输出文件仍然存在的文档，输出被删除的文档重新生成
+        undone_indices = [
+            idx for idx, journal in enumerate(journal_list)
+            if not (journal.is_done() and _doc_outputs_exist(
+                output_dir, pdf_file_names[idx], parse_method,
+                f_dump_md, f_dump_middle_json, f_dump_model_output, f_dump_content_list
+            ))
+        ]
+        if len(undone_indices) < len(journal_list):
+            logger.info(f"skip {len(journal_list) - len(undone_indices)} finished documents according to journal")
+        pdf_file_names = [pdf_file_names[idx] for idx in undone_indices]
+        pdf_bytes_list = [pdf_bytes_list[idx] for idx in undone_indices]
+        p_lang_list = [p_lang_list[idx] for idx in undone_indices]
+        journal_list = [journal_list[idx] for idx in undone_indices]
+        if len(pdf_file_names) == 0:
+            return
+
+    # 内存报告与耗时报告共用按文档和批次划分的统计范围
+    need_report = f_dump_timings or get_memory_profile_enable()
+    timing_report = PipelineTimingReport(len(pdf_file_names)) if need_report else None
+
+    if get_pipeline_streaming_enable():
+        _process_pipeline_streaming(
+            output_dir, pdf_file_names, pdf_bytes_list, p_lang_list,
+            parse_method, p_formula_enable, p_table_enable,
+            f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
+            f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode,
+            journal_list, timing_report, f_dump_timings
+        )
+        return
 
     infer_results, all_image_lists, all_pdf_docs, lang_list, ocr_enabled_list = (
         pipeline_doc_analyze(
             pdf_bytes_list, p_lang_list, parse_method=parse_method,
-            formula_enable=p_formula_enable, table_enable=p_table_enable
+            formula_enable=p_formula_enable, table_enable=p_table_enable,
+            journal_list=journal_list, timing_report=timing_report
         )
     )
 
     for idx, model_list in enumerate(infer_results):
-        model_json = copy.deepcopy(model_list)
         pdf_file_name = pdf_file_names[idx]
         local_image_dir, local_md_dir = prepare_env(output_dir, pdf_file_name, parse_method)
         image_writer, md_writer = FileBasedDataWriter(local_image_dir), FileBasedDataWriter(local_md_dir)
@@ -195,20 +278,87 @@ def _process_pipeline(
         _lang = lang_list[idx]
         _ocr_enable = ocr_enabled_list[idx]
 
-        middle_json = pipeline_result_to_middle_json(
-            model_list, images_list, pdf_doc, image_writer,
-            _lang, _ocr_enable, p_formula_enable
-        )
+        with stage_timing_scope(timing_report.doc(idx) if timing_report is not None else None), \
+                trace_span('document', 'document', pdf_name=pdf_file_name, page_num=len(model_list)):
+            with timed_stage('model_json_copy', len(model_list)):
+                model_json = copy.deepcopy(model_list)
+
+            middle_json = pipeline_result_to_middle_json(
+                model_list, images_list, pdf_doc, image_writer,
+                _lang, _ocr_enable, p_formula_enable
+            )
+
+            pdf_info = middle_json["pdf_info"]
+            pdf_bytes = pdf_bytes_list[idx]
+
+            _process_output(
+                pdf_info, pdf_bytes, pdf_file_name, local_md_dir, local_image_dir,
+                md_writer, f_draw_layout_bbox, f_draw_span_bbox, f_dump_orig_pdf,
+                f_dump_md, f_dump_content_list, f_dump_middle_json, f_dump_model_output,
+                f_make_md_mode, middle_json, model_json, is_pipeline=True
+            )
 
+        if timing_report is not None:
+            _dump_timings(md_writer, pdf_file_name, timing_report, idx, f_dump_timings)
+
+        if journal_list is not None:
+            journal_list[idx].mark_done()
+
+
+def _process_pipeline_streaming(
+        output_dir,
+        pdf_file_names,
+        pdf_bytes_list,
+        p_lang_list,
+        parse_method,
+        p_formula_enable,
+        p_table_enable,
+        f_draw_layout_bbox,
+        f_draw_span_bbox,
+        f_dump_md,
+        f_dump_middle_json,
+        f_dump_model_output,
+        f_dump_orig_pdf,
+        f_dump_content_list,
+        f_make_md_mode,
+        journal_list=None,
+        timing_report=None,
+        f_dump_timings=True,
+):
+    """流式处理pipeline后端逻辑，每个文档完成后立即输出"""
+    from mineru.backend.pipeline.pipeline_analyze import doc_analyze_streaming as pipeline_doc_analyze_streaming
+
+    image_writer_list = []
+    md_writer_list = []
+    local_dir_list = []
+    for pdf_file_name in pdf_file_names:
+        local_image_dir, local_md_dir = prepare_env(output_dir, pdf_file_name, parse_method)
+        image_writer_list.append(FileBasedDataWriter(local_image_dir))
+        md_writer_list.append(FileBasedDataWriter(local_md_dir))
+        local_dir_list.append((local_image_dir, local_md_dir))
+
+    for idx, model_json, middle_json in pipeline_doc_analyze_streaming(
+            pdf_bytes_list, p_lang_list, image_writer_list, parse_method=parse_method,
+            formula_enable=p_formula_enable, table_enable=p_table_enable,
+            journal_list=journal_list, timing_report=timing_report
+    ):
+        local_image_dir, local_md_dir = local_dir_list[idx]
         pdf_info = middle_json["pdf_info"]
-        pdf_bytes = pdf_bytes_list[idx]
 
-        _process_output(
-            pdf_info, pdf_bytes, pdf_file_name, local_md_dir, local_image_dir,
-            md_writer, f_draw_layout_bbox, f_draw_span_bbox, f_dump_orig_pdf,
-            f_dump_md, f_dump_content_list, f_dump_middle_json, f_dump_model_output,
-            f_make_md_mode, middle_json, model_json, is_pipeline=True
-        )
+        with stage_timing_scope(timing_report.doc(idx) if timing_report is not None else None), \
+                trace_span('document_output', 'document', pdf_name=pdf_file_names[idx], page_num=len(pdf_info)):
+            _process_output(
+                pdf_info, pdf_bytes_list[idx], pdf_file_names[idx], local_md_dir, local_image_dir,
+                md_writer_list[idx], f_draw_layout_bbox, f_draw_span_bbox, f_dump_orig_pdf,
+                f_dump_md, f_dump_content_list, f_dump_middle_json, f_dump_model_output,
+                f_make_md_mode, middle_json, model_json, is_pipeline=True
+            )
+
+        if timing_report is not None:
+            _dump_timings(md_writer_list[idx], pdf_file_names[idx], timing_report, idx, f_dump_timings)
+
+        if journal_list is not None:
+            journal_list[idx].mark_done()
 
 
 async def _async_process_vlm(
@@ -238,18 +388,20 @@ async def _async_process_vlm(
         local_image_dir, local_md_dir = prepare_env(output_dir, pdf_file_name, parse_method)
         image_writer, md_writer = FileBasedDataWriter(local_image_dir), FileBasedDataWriter(local_md_dir)
 
-        middle_json, infer_result = await aio_vlm_doc_analyze(
-            pdf_bytes, image_writer=image_writer, backend=backend, server_url=server_url, **kwargs,
-        )
+        with trace_span('document', 'document', pdf_name=pdf_file_name) as doc_span:
+            middle_json, infer_result = await aio_vlm_doc_analyze(
+                pdf_bytes, image_writer=image_writer, backend=backend, server_url=server_url, **kwargs,
+            )
 
-        pdf_info = middle_json["pdf_info"]
+            pdf_info = middle_json["pdf_info"]
+            doc_span.set_attribute('page_num', len(pdf_info))
 
-        _process_output(
-            pdf_info, pdf_bytes, pdf_file_name, local_md_dir, local_image_dir,
-            md_writer, f_draw_layout_bbox, f_draw_span_bbox, f_dump_orig_pdf,
-            f_dump_md, f_dump_content_list, f_dump_middle_json, f_dump_model_output,
-            f_make_md_mode, middle_json, infer_result, is_pipeline=False
-        )
+            _process_output(
+                pdf_info, pdf_bytes, pdf_file_name, local_md_dir, local_image_dir,
+                md_writer, f_draw_layout_bbox, f_draw_span_bbox, f_dump_orig_pdf,
+                f_dump_md, f_dump_content_list, f_dump_middle_json, f_dump_model_output,
+                f_make_md_mode, middle_json, infer_result, is_pipeline=False
+            )
 
 
 def _process_vlm(
@@ -279,18 +431,20 @@ def _process_vlm(
         local_image_dir, local_md_dir = prepare_env(output_dir, pdf_file_name, parse_method)
         image_writer, md_writer = FileBasedDataWriter(local_image_dir), FileBasedDataWriter(local_md_dir)
 
-        middle_json, infer_result = vlm_doc_analyze(
-            pdf_bytes, image_writer=image_writer, backend=backend, server_url=server_url, **kwargs,
-        )
+        with trace_span('document', 'document', pdf_name=pdf_file_name) as doc_span:
+            middle_json, infer_result = vlm_doc_analyze(
+                pdf_bytes, image_writer=image_writer, backend=backend, server_url=server_url, **kwargs,
+            )
 
-        pdf_info = middle_json["pdf_info"]
+            pdf_info = middle_json["pdf_info"]
+            doc_span.set_attribute('page_num', len(pdf_info))
 
-        _process_output(
-            pdf_info, pdf_bytes, pdf_file_name, local_md_dir, local_image_dir,
-            md_writer, f_draw_layout_bbox, f_draw_span_bbox, f_dump_orig_pdf,
-            f_dump_md, f_dump_content_list, f_dump_middle_json, f_dump_model_output,
-            f_make_md_mode, middle_json, infer_result, is_pipeline=False
-        )
+            _process_output(
+                pdf_info, pdf_bytes, pdf_file_name, local_md_dir, local_image_dir,
+                md_writer, f_draw_layout_bbox, f_draw_span_bbox, f_dump_orig_pdf,
+                f_dump_md, f_dump_content_list, f_dump_middle_json, f_dump_model_output,
+                f_make_md_mode, middle_json, infer_result, is_pipeline=False
+            )
 
 
 def do_parse(
@@ -313,31 +467,44 @@ def do_parse(
         f_make_md_mode=MakeMode.MM_MD,
         start_page_id=0,
         end_page_id=None,
+        f_dump_timings=None,
         **kwargs,
 ):
-    # 预处理PDF字节数据
-    pdf_bytes_list = _prepare_pdf_bytes(pdf_bytes_list, start_page_id, end_page_id)
-
-    if backend == "pipeline":
-        _process_pipeline(
-            output_dir, pdf_file_names, pdf_bytes_list, p_lang_list,
-            parse_method, formula_enable, table_enable,
-            f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
-            f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode
+    if f_dump_timings is None:
+        f_dump_timings = get_stage_timing_enable()
+
+    journal_list = None
+    if backend == "pipeline" and get_checkpoint_enable():
+        journal_list = get_doc_journals(
+            output_dir, pdf_file_names, pdf_bytes_list, p_lang_list, parse_method, formula_enable, table_enable,
+            start_page_id, end_page_id
         )
-    else:
-        if backend.startswith("vlm-"):
-            backend = backend[4:]
 
-        os.environ['MINERU_VLM_FORMULA_ENABLE'] = str(formula_enable)
-        os.environ['MINERU_VLM_TABLE_ENABLE'] = str(table_enable)
+    # 预处理PDF字节数据
+    pdf_bytes_list, _ = _prepare_pdf_bytes(pdf_bytes_list, start_page_id, end_page_id)
+
+    with trace_session('do_parse', backend=backend, doc_num=len(pdf_file_names)):
+        if backend == "pipeline":
+            _process_pipeline(
+                output_dir, pdf_file_names, pdf_bytes_list, p_lang_list,
+                parse_method, formula_enable, table_enable,
+                f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
+                f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode,
+                journal_list, f_dump_timings
+            )
+        else:
+            if backend.startswith("vlm-"):
+                backend = backend[4:]
 
-        _process_vlm(
-            output_dir, pdf_file_names, pdf_bytes_list, backend,
-            f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
-            f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode,
-            server_url, **kwargs,
-        )
+            os.environ['MINERU_VLM_FORMULA_ENABLE'] = str(formula_enable)
+            os.environ['MINERU_VLM_TABLE_ENABLE'] = str(table_enable)
+
+            _process_vlm(
+                output_dir, pdf_file_names, pdf_bytes_list, backend,
+                f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
+                f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode,
+                server_url, **kwargs,
+            )
 
 
 async def aio_do_parse(
@@ -360,33 +527,114 @@ async def aio_do_parse(
         f_make_md_mode=MakeMode.MM_MD,
         start_page_id=0,
         end_page_id=None,
+        f_dump_timings=None,
         **kwargs,
 ):
+    if f_dump_timings is None:
+        f_dump_timings = get_stage_timing_enable()
+
+    journal_list = None
+    if backend == "pipeline" and get_checkpoint_enable():
+        journal_list = get_doc_journals(
+            output_dir, pdf_file_names, pdf_bytes_list, p_lang_list, parse_method, formula_enable, table_enable,
+            start_page_id, end_page_id
+        )
+
     # 预处理PDF字节数据
-    pdf_bytes_list = _prepare_pdf_bytes(pdf_bytes_list, start_page_id, end_page_id)
+    pdf_bytes_list, page_nums = _prepare_pdf_bytes(pdf_bytes_list, start_page_id, end_page_id)
+
+    with trace_session('aio_do_parse', backend=backend, doc_num=len(pdf_file_names)):
+        if backend == "pipeline":
+            # pipeline模式暂不支持异步，使用同步处理方式
+            _process_pipeline(
+                output_dir, pdf_file_names, pdf_bytes_list, p_lang_list,
+                parse_method, formula_enable, table_enable,
+                f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
+                f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode,
+                journal_list, f_dump_timings
+            )
+        else:
+            if backend.startswith("vlm-"):
+                backend = backend[4:]
 
-    if backend == "pipeline":
-        # pipeline模式暂不支持异步，使用同步处理方式
-        _process_pipeline(
-            output_dir, pdf_file_names, pdf_bytes_list, p_lang_list,
-            parse_method, formula_enable, table_enable,
-            f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
-            f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode
-        )
-    else:
-        if backend.startswith("vlm-"):
-            backend = backend[4:]
+            os.environ['MINERU_VLM_FORMULA_ENABLE'] = str(formula_enable)
+            os.environ['MINERU_VLM_TABLE_ENABLE'] = str(table_enable)
+
+            await _async_process_vlm(
+                output_dir, pdf_file_names, pdf_bytes_list, backend,
+                f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
+                f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode,
+                server_url, **kwargs,
+            )
 
-        os.environ['MINERU_VLM_FORMULA_ENABLE'] = str(formula_enable)
-        os.environ['MINERU_VLM_TABLE_ENABLE'] = str(table_enable)
+    # 每个文档截取页码范围后的页数，供调用方统计处理的页数
+    return page_nums
 
-        await _async_process_vlm(
-            output_dir, pdf_file_names, pdf_bytes_list, backend,
-            f_draw_layout_bbox, f_draw_span_bbox, f_dump_md, f_dump_middle_json,
-            f_dump_model_output, f_dump_orig_pdf, f_dump_content_list, f_make_md_mode,
-            server_url, **kwargs,
-        )
 
+def do_replay(
+        output_dir,
+        pdf_file_names: list[str],
+        pdf_bytes_list: list[bytes],
+        model_lists: list[list],
+        p_lang_list: list[str],
+        parse_method="auto",
+        formula_enable=True,
+        f_draw_layout_bbox=True,
+        f_draw_span_bbox=True,
+        f_dump_md=True,
+        f_dump_middle_json=True,
+        f_dump_content_list=True,
+        f_make_md_mode=MakeMode.MM_MD,
+        start_page_id=0,
+        end_page_id=None,
+):
+    """
+    用pipeline后端保存的_model.json代替模型推理，重新生成middle_json、markdown和content_list，
+    页码范围需与生成_model.json时一致，返回记录了各文档每个后处理阶段耗时的PipelineTimingReport
+    """
+    from mineru.backend.pipeline.model_json_to_middle_json import result_to_middle_json as pipeline_result_to_middle_json
+    from mineru.backend.pipeline.pipeline_analyze import get_ocr_enable
+
+    pdf_bytes_list, _ = _prepare_pdf_bytes(pdf_bytes_list, start_page_id, end_page_id)
+    timing_report = PipelineTimingReport(len(pdf_file_names))
+
+    with trace_session('do_replay', doc_num=len(pdf_file_names)):
+        for idx, model_list in enumerate(model_lists):
+            pdf_file_name = pdf_file_names[idx]
+            pdf_bytes = pdf_bytes_list[idx]
+            local_image_dir, local_md_dir = prepare_env(output_dir, pdf_file_name, parse_method)
+            image_writer, md_writer = FileBasedDataWriter(local_image_dir), FileBasedDataWriter(local_md_dir)
+
+            with stage_timing_scope(timing_report.doc(idx)), \
+                    trace_span('document', 'document', pdf_name=pdf_file_name, page_num=len(model_list)):
+                _ocr_enable = get_ocr_enable(pdf_bytes, parse_method)
+                with timed_stage('render') as render_items:
+                    images_list, pdf_doc = load_images_from_pdf(pdf_bytes)
+                    render_items.item_num = len(images_list)
+
+                if len(images_list) != len(model_list):
+                    pdf_doc.close()
+                    logger.error(
+                        f"{pdf_file_name}: {len(model_list)} pages in model json but {len(images_list)} pages in pdf, "
+                        f"check that the page range matches the one used to generate the model json"
+                    )
+                    continue
+
+                middle_json = pipeline_result_to_middle_json(
+                    model_list, images_list, pdf_doc, image_writer,
+                    p_lang_list[idx], _ocr_enable, formula_enable
+                )
+
+                _process_output(
+                    middle_json["pdf_info"], pdf_bytes, pdf_file_name, local_md_dir, local_image_dir,
+                    md_writer, f_draw_layout_bbox, f_draw_span_bbox, False,
+                    f_dump_md, f_dump_content_list, f_dump_middle_json, False,
+                    f_make_md_mode, middle_json, is_pipeline=True
+                )
+
+            _dump_timings(md_writer, pdf_file_name, timing_report, idx)
+
+    return timing_report
 
 
 if __name__ == "__main__":
@@ -4,20 +4,32 @@ import uvicorn
 import click
 from pathlib import Path
 from glob import glob
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, UploadFile, File, Form, Request
 from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from typing import List, Optional
 from loguru import logger
 from base64 import b64encode
 
+from mineru.cli.api_metrics import PAGES_PROCESSED, UPLOAD_BYTES, RequestMetricsMiddleware, generate_metrics
 from mineru.cli.common import aio_do_parse, read_fn, pdf_suffixes, image_suffixes
+from mineru.cli.result_cache import get_doc_result_cache, get_doc_cache_key
 from mineru.utils.cli_parser import arg_parse
+from mineru.utils.trace_export import get_current_span
 from mineru.version import __version__
 
 app = FastAPI()
+# 后注册的中间件在外层，请求指标统计在GZip内侧，记录压缩前的响应字节数
+app.add_middleware(RequestMetricsMiddleware, path="/file_parse")
 app.add_middleware(GZipMiddleware, minimum_size=1000)
 
+
+@app.get(path="/metrics")
+async def metrics():
+    content, content_type = generate_metrics()
+    return Response(content=content, media_type=content_type)
+
+
 def encode_image(image_path: str) -> str:
     """Encode image using base64"""
     with open(image_path, "rb") as f:
@@ -33,8 +45,35 @@ def get_infer_result(file_suffix_identifier: str, pdf_name: str, parse_dir: str)
     return None
 
 
+def get_parse_result(pdf_name: str, parse_dir: str, backend: str, return_md: bool, return_middle_json: bool,
+                     return_model_output: bool, return_content_list: bool, return_images: bool) -> dict:
+    """从解析目录中读取需要返回的结果"""
+    data = {}
+    if return_md:
+        data["md_content"] = get_infer_result(".md", pdf_name, parse_dir)
+    if return_middle_json:
+        data["middle_json"] = get_infer_result("_middle.json", pdf_name, parse_dir)
+    if return_model_output:
+        if backend.startswith("pipeline"):
+            data["model_output"] = get_infer_result("_model.json", pdf_name, parse_dir)
+        else:
+            data["model_output"] = get_infer_result("_model_output.txt", pdf_name, parse_dir)
+    if return_content_list:
+        data["content_list"] = get_infer_result("_content_list.json", pdf_name, parse_dir)
+    if return_images:
+        image_paths = glob(f"{parse_dir}/images/*.jpg")
+        data["images"] = {
+            os.path.basename(
+                image_path
+            ): f"data:image/jpeg;base64,{encode_image(image_path)}"
+            for image_path in image_paths
+        }
+    return data
+
+
 @app.post(path="/file_parse",)
 async def parse_pdf(
+        request: Request,
         files: List[UploadFile] = File(...),
         output_dir: str = Form("./output"),
         lang_list: List[str] = Form(["ch"]),
@@ -50,10 +89,13 @@ async def parse_pdf(
         return_images: bool = Form(False),
         start_page_id: int = Form(0),
         end_page_id: int = Form(99999),
+        cache_control: str = Form(""),
+        return_timings: bool = Form(False),
 ):
 
     # 获取命令行配置参数
     config = getattr(app.state, "config", {})
+    request.state.metrics_labels = (backend, parse_method)
 
     try:
         # 创建唯一的输出目录
@@ -63,10 +105,12 @@ async def parse_pdf(
         # 处理上传的PDF文件
         pdf_file_names = []
         pdf_bytes_list = []
+        upload_bytes_list = []
 
         for file in files:
             content = await file.read()
             file_path = Path(file.filename)
+            UPLOAD_BYTES.labels(backend).inc(len(content))
 
             # 如果是图像文件或PDF，使用read_fn处理
             if file_path.suffix.lower() in pdf_suffixes + image_suffixes:
@@ -79,6 +123,7 @@ async def parse_pdf(
                     pdf_bytes = read_fn(temp_path)
                     pdf_bytes_list.append(pdf_bytes)
                     pdf_file_names.append(file_path.stem)
+                    upload_bytes_list.append(content)
                     os.remove(temp_path)  # 删除临时文件
                 except Exception as e:
                     return JSONResponse(
@@ -98,60 +143,105 @@ async def parse_pdf(
             # 如果语言列表长度不匹配，使用第一个语言或默认"ch"
             actual_lang_list = [actual_lang_list[0] if actual_lang_list else "ch"] * len(pdf_file_names)
 
-        # 调用异步处理函数
-        await aio_do_parse(
-            output_dir=unique_dir,
-            pdf_file_names=pdf_file_names,
-            pdf_bytes_list=pdf_bytes_list,
-            p_lang_list=actual_lang_list,
-            backend=backend,
-            parse_method=parse_method,
-            formula_enable=formula_enable,
-            table_enable=table_enable,
-            server_url=server_url,
-            f_draw_layout_bbox=False,
-            f_draw_span_bbox=False,
-            f_dump_md=return_md,
-            f_dump_middle_json=return_middle_json,
-            f_dump_model_output=return_model_output,
-            f_dump_orig_pdf=False,
-            f_dump_content_list=return_content_list,
-            start_page_id=start_page_id,
-            end_page_id=end_page_id,
-            **config
-        )
+        # 查询文档结果缓存，cache_control为no-cache时跳过查询，为no-store时既不查询也不写入。
+        # 缓存中只保存请求过的视图，请求的视图不全时视为未命中
+        views = [
+            view for view, requested in [
+                ("md_content", return_md),
+                ("middle_json", return_middle_json),
+                ("model_output", return_model_output),
+                ("content_list", return_content_list),
+                ("images", return_images),
+            ] if requested
+        ]
+        doc_result_cache = get_doc_result_cache()
+        cache_lookup = doc_result_cache is not None and cache_control not in ["no-cache", "no-store"]
+        cache_store = doc_result_cache is not None and cache_control != "no-store"
+        cache_keys = []
+        cached_results = {}
+        for idx, pdf_name in enumerate(pdf_file_names):
+            cache_key = get_doc_cache_key(
+                upload_bytes_list[idx], backend, parse_method, actual_lang_list[idx],
+                formula_enable, table_enable, start_page_id, end_page_id
+            ) if doc_result_cache is not None else None
+            cache_keys.append(cache_key)
+            if cache_lookup:
+                cached_data = doc_result_cache.get(cache_key, views)
+                if cached_data is not None:
+                    cached_results[idx] = cached_data
+        parse_indices = [idx for idx in range(len(pdf_file_names)) if idx not in cached_results]
+        request_span = get_current_span()
+        request_span.set_attribute("backend", backend)
+        request_span.set_attribute("parse_method", parse_method)
+        request_span.set_attribute("file_num", len(pdf_file_names))
+        request_span.set_attribute("cached_num", len(cached_results))
+
+        if parse_indices:
+            # 调用异步处理函数
+            page_nums = await aio_do_parse(
+                output_dir=unique_dir,
+                pdf_file_names=[pdf_file_names[idx] for idx in parse_indices],
+                pdf_bytes_list=[pdf_bytes_list[idx] for idx in parse_indices],
+                p_lang_list=[actual_lang_list[idx] for idx in parse_indices],
+                backend=backend,
+                parse_method=parse_method,
+                formula_enable=formula_enable,
+                table_enable=table_enable,
+                server_url=server_url,
+                f_draw_layout_bbox=False,
+                f_draw_span_bbox=False,
+                f_dump_md=return_md,
+                f_dump_middle_json=return_middle_json,
+                f_dump_model_output=return_model_output,
+                f_dump_orig_pdf=False,
+                f_dump_content_list=return_content_list,
+                start_page_id=start_page_id,
+                end_page_id=end_page_id,
+                f_dump_timings=True if return_timings else None,
+                **config
+            )
+            # 页数在截取页码范围时已经得到，不再重新打开PDF
+            PAGES_PROCESSED.labels(backend).inc(sum(page_nums))
 
         # 构建结果路径
         result_dict = {}
-        for pdf_name in pdf_file_names:
-            result_dict[pdf_name] = {}
-            data = result_dict[pdf_name]
-
-            if backend.startswith("pipeline"):
-                parse_dir = os.path.join(unique_dir, pdf_name, parse_method)
+        for idx, pdf_name in enumerate(pdf_file_names):
+            # 分阶段耗时只对本次实际解析的文档有意义，不写入缓存
+            timings = None
+            if idx in cached_results:
+                full_data = cached_results[idx]
             else:
-                parse_dir = os.path.join(unique_dir, pdf_name, "vlm")
-
-            if os.path.exists(parse_dir):
-                if return_md:
-                    data["md_content"] = get_infer_result(".md", pdf_name, parse_dir)
-                if return_middle_json:
-                    data["middle_json"] = get_infer_result("_middle.json", pdf_name, parse_dir)
-                if return_model_output:
-                    if backend.startswith("pipeline"):
-                        data["model_output"] = get_infer_result("_model.json", pdf_name, parse_dir)
-                    else:
-                        data["model_output"] = get_infer_result("_model_output.txt", pdf_name, parse_dir)
-                if return_content_list:
-                    data["content_list"] = get_infer_result("_content_list.json", pdf_name, parse_dir)
-                if return_images:
-                    image_paths = glob(f"{parse_dir}/images/*.jpg")
-                    data["images"] = {
-                        os.path.basename(
-                            image_path
-                        ): f"data:image/jpeg;base64,{encode_image(image_path)}"
-                        for image_path in image_paths
-                    }
+                if backend.startswith("pipeline"):
+                    parse_dir = os.path.join(unique_dir, pdf_name, parse_method)
+                else:
+                    parse_dir = os.path.join(unique_dir, pdf_name, "vlm")
+                if not os.path.exists(parse_dir):
+                    result_dict[pdf_name] = {}
+                    continue
+                full_data = get_parse_result(
+                    pdf_name, parse_dir, backend,
+                    return_md, return_middle_json, return_model_output, return_content_list, return_images,
+                )
+                if cache_store:
+                    doc_result_cache.put(cache_keys[idx], full_data)
+                if return_timings:
+                    timings = get_infer_result("_timings.json", pdf_name, parse_dir)
+
+            data = {}
+            if return_md:
+                data["md_content"] = full_data.get("md_content")
+            if return_middle_json:
+                data["middle_json"] = full_data.get("middle_json")
+            if return_model_output:
+                data["model_output"] = full_data.get("model_output")
+            if return_content_list:
+                data["content_list"] = full_data.get("content_list")
+            if return_images:
+                data["images"] = full_data.get("images", {})
+            if return_timings:
+                data["timings"] = timings
+            result_dict[pdf_name] = data
+
         return JSONResponse(
             status_code=200,
             content={
@@ -0,0 +1,116 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import json
+import os
+from pathlib import Path
+
+import click
+from loguru import logger
+
+from mineru.utils.config_reader import get_device
+from ..version import __version__
+from .common import do_replay, read_fn, pdf_suffixes, image_suffixes
+
+
+def get_model_json_path(model_json_path, output_dir, pdf_file_name, parse_method) -> Path:
+    """model_json_path为文件时直接使用，为目录(默认为输出目录)时按mineru的输出结构查找<name>/<method>/<name>_model.json"""
+    model_json_path = Path(model_json_path or output_dir)
+    if model_json_path.is_file():
+        return model_json_path
+    return model_json_path / pdf_file_name / parse_method / f'{pdf_file_name}_model.json'
+
+
+@click.command()
+@click.version_option(__version__, '--version', '-v', help='display the version and exit')
+@click.option(
+    '-p',
+    '--path',
+    'input_path',
+    type=click.Path(exists=True),
+    required=True,
+    help='local filepath or directory of the original documents. support pdf, png, jpg, jpeg files',
+)
+@click.option(
+    '-j',
+    '--model-json',
+    'model_json_path',
+    type=click.Path(exists=True),
+    default=None,
+    help='the saved <name>_model.json of a single document, or the output directory of a previous pipeline run '
+         'containing <name>/<method>/<name>_model.json. Default is the output directory.',
+)
+@click.option('-o', '--output', 'output_dir', type=click.Path(), required=True, help='output local directory')
+@click.option(
+    '-m',
+    '--method',
+    'method',
+    type=click.Choice(['auto', 'txt', 'ocr']),
+    default='auto',
+    help='the parse method used to generate the model json. Default is auto.',
+)
+@click.option('-l', '--lang', 'lang', type=str, default='ch', help="document language. Default is 'ch'.")
+@click.option('-f', '--formula', 'formula_enable', type=bool, default=True, help='Enable formula parsing. Default is True.')
+@click.option('-s', '--start', 'start_page_id', type=int, default=0, help='The starting page used to generate the model json.')
+@click.option('-e', '--end', 'end_page_id', type=int, default=None, help='The ending page used to generate the model json.')
+@click.option(
+    '-d',
+    '--device',
+    'device_mode',
+    type=str,
+    default=None,
+    help='Device mode for the layoutreader and OCR models used during post-processing.',
+)
+def main(input_path, model_json_path, output_dir, method, lang, formula_enable, start_page_id, end_page_id, device_mode):
+    """跳过全部模型推理，用保存的_model.json重新执行pipeline后端的后处理并统计各步骤耗时"""
+    if os.getenv('MINERU_DEVICE_MODE', None) is None:
+        os.environ['MINERU_DEVICE_MODE'] = device_mode if device_mode is not None else get_device()
+
+    if os.path.isdir(input_path):
+        doc_path_list = sorted(
+            doc_path for doc_path in Path(input_path).glob('*') if doc_path.suffix in pdf_suffixes + image_suffixes
+        )
+    else:
+        doc_path_list = [Path(input_path)]
+
+    file_name_list = []
+    pdf_bytes_list = []
+    model_lists = []
+    for doc_path in doc_path_list:
+        file_name = doc_path.stem
+        doc_model_json_path = get_model_json_path(model_json_path, output_dir, file_name, method)
+        if not doc_model_json_path.exists():
+            logger.warning(f'skip {doc_path}, model json not found: {doc_model_json_path}')
+            continue
+        with open(doc_model_json_path, 'r', encoding='utf-8') as f:
+            model_lists.append(json.load(f))
+        file_name_list.append(file_name)
+        pdf_bytes_list.append(read_fn(doc_path))
+
+    if not file_name_list:
+        raise click.UsageError('no document with a saved model json to replay')
+
+    os.makedirs(output_dir, exist_ok=True)
+    timing_report = do_replay(
+        output_dir=output_dir,
+        pdf_file_names=file_name_list,
+        pdf_bytes_list=pdf_bytes_list,
+        model_lists=model_lists,
+        p_lang_list=[lang] * len(file_name_list),
+        parse_method=method,
+        formula_enable=formula_enable,
+        start_page_id=start_page_id,
+        end_page_id=end_page_id,
+    )
+
+    for idx, file_name in enumerate(file_name_list):
+        stages = timing_report.doc_to_dict(idx)['document']['stages']
+        if not stages:
+            continue
+        total_time = sum(stage_dict['time'] for stage_dict in stages.values())
+        logger.info(
+            f'{file_name} replayed in {round(total_time, 4)}s: '
+            + ', '.join(f'{stage} {stage_dict["time"]}s' for stage, stage_dict in stages.items())
+        )
+
+
+if __name__ == '__main__':
+    main()
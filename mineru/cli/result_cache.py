@@ -0,0 +1,126 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import copy
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from mineru.utils.hash_utils import dict_md5
+from mineru.version import __version__
+
+
+def get_doc_cache_max_bytes() -> int:
+    """文档结果缓存容量，通过环境变量MINERU_API_CACHE_SIZE_MB设置，默认为0(不启用)"""
+    return int(os.getenv('MINERU_API_CACHE_SIZE_MB', 0)) * 1024 * 1024
+
+
+def get_doc_cache_ttl() -> float:
+    """文档结果缓存有效期(秒)，通过环境变量MINERU_API_CACHE_TTL设置，默认为3600"""
+    return float(os.getenv('MINERU_API_CACHE_TTL', 3600))
+
+
+def get_doc_cache_key(file_bytes: bytes, backend, parse_method, lang, formula_enable, table_enable,
+                      start_page_id, end_page_id) -> str:
+    return dict_md5({
+        'file_sha256': hashlib.sha256(file_bytes).hexdigest(),
+        'backend': backend,
+        'parse_method': parse_method,
+        'lang': lang,
+        'formula_enable': formula_enable,
+        'table_enable': table_enable,
+        'start_page_id': start_page_id,
+        'end_page_id': end_page_id,
+        'version': __version__,
+    })
+
+
+def _get_str_size(value) -> int:
+    return len(value.encode('utf-8')) if isinstance(value, str) else 0
+
+
+def _get_result_size(data: dict) -> int:
+    """按utf-8编码后的字节数计算，与MINERU_API_CACHE_SIZE_MB的单位一致"""
+    size = 0
+    for value in data.values():
+        if isinstance(value, str):
+            size += _get_str_size(value)
+        elif isinstance(value, dict):
+            size += sum(_get_str_size(k) + _get_str_size(v) for k, v in value.items())
+    return size
+
+
+class DocResultCache:
+    """
+    进程内的文档级解析结果缓存，按字节数限制容量，过期或超出容量时按LRU淘汰。
+    每个条目只保存请求过的结果视图(md_content、middle_json、images等)，
+    请求的视图不全时视为未命中，重新解析后把新的视图合并到条目中
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _pop(self, key):
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry['size']
+
+    def get(self, key: str, views: list):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['expire_at'] < time.time():
+                self._pop(key)
+                entry = None
+            if entry is None or any(view not in entry['data'] for view in views):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy({view: entry['data'][view] for view in views})
+
+    def put(self, key: str, data: dict):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                # 保留条目中已有的其他视图
+                data = {**entry['data'], **data}
+            size = _get_result_size(data)
+            if size > self.max_bytes:
+                # 合并后超出容量时保留原有条目
+                return
+            if entry is not None:
+                self._pop(key)
+            self._entries[key] = {'data': copy.deepcopy(data), 'size': size, 'expire_at': time.time() + self.ttl}
+            self.total_bytes += size
+            now = time.time()
+            for expired_key in [k for k, entry in self._entries.items() if entry['expire_at'] < now]:
+                self._pop(expired_key)
+            while self.total_bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self.total_bytes,
+            }
+
+
+_doc_result_cache = None
+
+
+def get_doc_result_cache():
+    global _doc_result_cache
+    max_bytes = get_doc_cache_max_bytes()
+    if max_bytes <= 0:
+        return None
+    if _doc_result_cache is None:
+        _doc_result_cache = DocResultCache(max_bytes, get_doc_cache_ttl())
+    return _doc_result_cache
@@ -0,0 +1,203 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import json
+import os
+import time
+from pathlib import Path
+
+import click
+from loguru import logger
+
+from mineru.backend.pipeline.model_init import get_model_weight_path
+from mineru.model.layout.doclayout_yolo import DocLayoutYOLOModel
+from mineru.model.mfd.yolo_v8 import YOLOv8MFDModel
+from mineru.utils.boxbase import calculate_iou
+from mineru.utils.enum_class import ModelPath
+from mineru.utils.pdf_image_tools import load_images_from_pdf
+from mineru.utils.yolo_onnx import export_fp32_onnx, get_int8_onnx_path, quantize_int8
+from ..version import __version__
+from .bench import get_default_bench_path
+from .common import read_fn, pdf_suffixes, image_suffixes
+
+# 检测结果视为同一目标的最小IoU
+MATCH_IOU = 0.5
+
+YOLO_MODELS = {
+    'layout': (DocLayoutYOLOModel, ModelPath.doclayout_yolo),
+    'mfd': (YOLOv8MFDModel, ModelPath.yolo_v8_mfd),
+}
+
+
+def load_pages(input_path, max_page_num=None) -> list:
+    """读取目录或单个文件中的pdf和图片，按与解析相同的dpi渲染为PIL页面"""
+    if os.path.isdir(input_path):
+        doc_path_list = sorted(
+            doc_path for doc_path in Path(input_path).glob('*') if doc_path.suffix in pdf_suffixes + image_suffixes
+        )
+    else:
+        doc_path_list = [Path(input_path)]
+    pages = []
+    for doc_path in doc_path_list:
+        images_list, pdf_doc = load_images_from_pdf(read_fn(doc_path))
+        pdf_doc.close()
+        pages.extend(image_dict['img_pil'] for image_dict in images_list)
+        if max_page_num is not None and len(pages) >= max_page_num:
+            return pages[:max_page_num]
+    return pages
+
+
+def to_detections(model, pred) -> list:
+    """layout结果本身就是检测列表，MFD结果转换为与公式识别输入相同的category_id和poly"""
+    if isinstance(model, DocLayoutYOLOModel):
+        return pred
+    detections = []
+    for xyxy, conf, cls in zip(pred.boxes.xyxy, pred.boxes.conf, pred.boxes.cls):
+        xmin, ymin, xmax, ymax = [int(p.item()) for p in xyxy]
+        detections.append({
+            'category_id': 13 + int(cls.item()),
+            'poly': [xmin, ymin, xmax, ymin, xmax, ymax, xmin, ymax],
+            'score': float(conf.item()),
+        })
+    return detections
+
+
+def poly_to_bbox(poly: list) -> list:
+    return [poly[0], poly[1], poly[4], poly[5]]
+
+
+def compare_detections(ref_pages: list, test_pages: list) -> dict:
+    """以fp32结果为参照，按类别贪心匹配IoU最高的检测框，统计int8结果的精确率、召回率、匹配框的IoU和置信度差"""
+    ref_num, test_num, matched_num = 0, 0, 0
+    iou_sum, score_delta_sum = 0.0, 0.0
+    category_stats = {}
+    for ref_dets, test_dets in zip(ref_pages, test_pages):
+        ref_num += len(ref_dets)
+        test_num += len(test_dets)
+        unmatched = list(range(len(test_dets)))
+        for ref_det in sorted(ref_dets, key=lambda det: -det['score']):
+            stats = category_stats.setdefault(ref_det['category_id'], {'ref_num': 0, 'matched_num': 0})
+            stats['ref_num'] += 1
+            best_index, best_iou = None, MATCH_IOU
+            for index in unmatched:
+                test_det = test_dets[index]
+                if test_det['category_id'] != ref_det['category_id']:
+                    continue
+                iou = calculate_iou(poly_to_bbox(ref_det['poly']), poly_to_bbox(test_det['poly']))
+                if iou >= best_iou:
+                    best_index, best_iou = index, iou
+            if best_index is None:
+                continue
+            unmatched.remove(best_index)
+            matched_num += 1
+            stats['matched_num'] += 1
+            iou_sum += best_iou
+            score_delta_sum += abs(test_dets[best_index]['score'] - ref_det['score'])
+    return {
+        'ref_num': ref_num,
+        'test_num': test_num,
+        'matched_num': matched_num,
+        'precision': round(matched_num / test_num, 4) if test_num else 1.0,
+        'recall': round(matched_num / ref_num, 4) if ref_num else 1.0,
+        'mean_iou': round(iou_sum / matched_num, 4) if matched_num else 0.0,
+        'mean_score_delta': round(score_delta_sum / matched_num, 4) if matched_num else 0.0,
+        'category_recall': {
+            str(category_id): round(stats['matched_num'] / stats['ref_num'], 4)
+            for category_id, stats in sorted(category_stats.items())
+        },
+    }
+
+
+def run_model(model, pages) -> tuple:
+    """逐页推理，返回检测结果和平均单页耗时"""
+    results = []
+    start_time = time.perf_counter()
+    for pred in model.batch_predict(pages, 1):
+        results.append(to_detections(model, pred))
+    return results, round((time.perf_counter() - start_time) / max(len(pages), 1), 4)
+
+
+@click.command()
+@click.version_option(__version__, '--version', '-v', help='display the version and exit')
+@click.option(
+    '-c',
+    '--calibration',
+    'calibration_path',
+    type=click.Path(exists=True),
+    required=True,
+    help='local filepath or directory of pdf/image samples used to calibrate the int8 quantization.',
+)
+@click.option(
+    '-e',
+    '--eval',
+    'eval_path',
+    type=click.Path(exists=True),
+    default=None,
+    help='local filepath or directory of pdf/image documents used for the accuracy report. '
+         'Default is demo/pdfs of a source checkout.',
+)
+@click.option(
+    '-n',
+    '--calibration-pages',
+    'calibration_page_num',
+    type=int,
+    default=64,
+    help='max number of calibration pages. Default is 64.',
+)
+@click.option(
+    '-m',
+    '--model',
+    'model_names',
+    type=click.Choice(['layout', 'mfd']),
+    multiple=True,
+    default=['layout', 'mfd'],
+    help='models to quantize, can be given multiple times. Default is both layout and mfd.',
+)
+@click.option(
+    '-r',
+    '--report',
+    'report_path',
+    type=click.Path(),
+    default='yolo_int8_report.json',
+    help='output path of the accuracy report. Default is yolo_int8_report.json.',
+)
+def main(calibration_path, eval_path, calibration_page_num, model_names, report_path):
+    """
+    导出layout和MFD模型的fp32 ONNX，用本地样本页面静态量化为int8，保存在权重旁，
+    并以fp32 torch模型为参照在评估文档上生成int8模型的精度和速度报告，用于决定是否设置MINERU_YOLO_BACKEND=onnx_int8
+    """
+    calibration_pages = load_pages(calibration_path, calibration_page_num)
+    eval_pages = load_pages(eval_path if eval_path is not None else get_default_bench_path())
+    if not calibration_pages or not eval_pages:
+        raise click.UsageError('no pdf or image found for calibration or evaluation')
+    logger.info(f'{len(calibration_pages)} calibration pages, {len(eval_pages)} evaluation pages')
+
+    report = {'calibration_page_num': len(calibration_pages), 'eval_page_num': len(eval_pages), 'models': {}}
+    for model_name in model_names:
+        model_class, model_path = YOLO_MODELS[model_name]
+        weight = get_model_weight_path(model_path)
+        ref_model = model_class(weight, 'cpu')
+        fp32_path = export_fp32_onnx(model_class.yolo_class, weight, ref_model.imgsz)
+        int8_path = get_int8_onnx_path(weight)
+        logger.info(f'quantizing {fp32_path} to {int8_path}')
+        quantize_int8(fp32_path, int8_path, calibration_pages, ref_model.imgsz)
+
+        ref_results, ref_page_time = run_model(ref_model, eval_pages)
+        int8_results, int8_page_time = run_model(model_class(int8_path, 'cpu'), eval_pages)
+        model_report = compare_detections(ref_results, int8_results)
+        model_report.update({
+            'int8_path': int8_path,
+            'fp32_page_time': ref_page_time,
+            'int8_page_time': int8_page_time,
+        })
+        report['models'][model_name] = model_report
+        logger.info(
+            f'{model_name}: precision {model_report["precision"]}, recall {model_report["recall"]}, '
+            f'mean iou {model_report["mean_iou"]}, {ref_page_time}s/page fp32 -> {int8_page_time}s/page int8'
+        )
+
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logger.info(f'report written to {report_path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -4,17 +4,28 @@ from tqdm import tqdm
 import numpy as np
 from PIL import Image
 
+from mineru.utils.trace_export import trace_span
+from mineru.utils.yolo_utils import PreparedChunk, predict_prepared
+
+
+LAYOUT_IMGSZ = 1280
+
 
 class DocLayoutYOLOModel:
+    yolo_class = YOLOv10
+
     def __init__(
         self,
         weight: str,
         device: str = "cuda",
-        imgsz: int = 1280,
+        imgsz: int = LAYOUT_IMGSZ,
         conf: float = 0.1,
         iou: float = 0.45,
     ):
-        self.model = YOLOv10(weight).to(device)
+        # onnx模型由ultralytics用onnxruntime在cpu上执行，不能移动到其他设备
+        self.model = self.yolo_class(weight)
+        if not str(weight).endswith('.onnx'):
+            self.model = self.model.to(device)
         self.device = device
         self.imgsz = imgsz
         self.conf = conf
@@ -60,14 +71,33 @@ class DocLayoutYOLOModel:
         with tqdm(total=len(images), desc="Layout Predict") as pbar:
             for idx in range(0, len(images), batch_size):
                 batch = images[idx: idx + batch_size]
-                predictions = self.model.predict(
-                    batch,
-                    imgsz=self.imgsz,
-                    conf=self.conf,
-                    iou=self.iou,
-                    verbose=False,
-                )
+                with trace_span('doclayout_yolo', 'model', batch_size=len(batch)):
+                    predictions = self.model.predict(
+                        batch,
+                        imgsz=self.imgsz,
+                        conf=self.conf,
+                        iou=self.iou,
+                        verbose=False,
+                    )
                 for pred in predictions:
                     results.append(self._parse_prediction(pred))
                 pbar.update(len(batch))
-        return results
\ No newline at end of file
+        return results
+
+    def batch_predict_prepared(self, chunk: PreparedChunk, batch_size: int = 4) -> List[List[Dict]]:
+        """与batch_predict相同，复用chunk中预先解码和缩放的页面"""
+        results = []
+        with tqdm(total=len(chunk), desc="Layout Predict") as pbar:
+            for idx in range(0, len(chunk), batch_size):
+                end = min(idx + batch_size, len(chunk))
+                with trace_span('doclayout_yolo', 'model', batch_size=end - idx):
+                    predictions = predict_prepared(
+                        self.model, chunk, list(range(idx, end)), self.imgsz,
+                        conf=self.conf,
+                        iou=self.iou,
+                        verbose=False,
+                    )
+                for pred in predictions:
+                    results.append(self._parse_prediction(pred))
+                pbar.update(end - idx)
+        return results
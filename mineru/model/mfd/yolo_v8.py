@@ -4,17 +4,28 @@ from ultralytics import YOLO
 import numpy as np
 from PIL import Image
 
+from mineru.utils.trace_export import trace_span
+from mineru.utils.yolo_utils import PreparedChunk, group_batches_by_shape, image_shape, predict_prepared
+
+
+MFD_IMGSZ = 1888
+
 
 class YOLOv8MFDModel:
+    yolo_class = YOLO
+
     def __init__(
         self,
         weight: str,
         device: str = "cpu",
-        imgsz: int = 1888,
+        imgsz: int = MFD_IMGSZ,
         conf: float = 0.25,
         iou: float = 0.45,
     ):
-        self.model = YOLO(weight).to(device)
+        # onnx模型由ultralytics用onnxruntime在cpu上执行，不能移动到其他设备
+        self.model = self.yolo_class(weight)
+        if not str(weight).endswith('.onnx'):
+            self.model = self.model.to(device)
         self.device = device
         self.imgsz = imgsz
         self.conf = conf
@@ -43,11 +54,35 @@ class YOLOv8MFDModel:
         images: List[Union[np.ndarray, Image.Image]],
         batch_size: int = 4
     ) -> List:
-        results = []
+        """按页面尺寸分组批量推理，结果与逐页predict一致，按输入顺序返回"""
+        results = [None] * len(images)
         with tqdm(total=len(images), desc="MFD Predict") as pbar:
-            for idx in range(0, len(images), batch_size):
-                batch = images[idx: idx + batch_size]
-                batch_preds = self._run_predict(batch, is_batch=True)
-                results.extend(batch_preds)
+            for batch_indices in group_batches_by_shape([image_shape(image) for image in images], batch_size):
+                batch = [images[index] for index in batch_indices]
+                with trace_span('yolo_v8_mfd', 'model', batch_size=len(batch)):
+                    batch_preds = self._run_predict(batch, is_batch=True)
+                for index, pred in zip(batch_indices, batch_preds):
+                    results[index] = pred
                 pbar.update(len(batch))
-        return results
\ No newline at end of file
+        return results
+
+    def batch_predict_prepared(self, chunk: PreparedChunk, batch_size: int = 4, indices: List[int] = None) -> List:
+        """与batch_predict相同，复用chunk中预先解码和缩放的页面，传入indices时只推理这些页面，按indices的顺序返回"""
+        if indices is None:
+            indices = list(range(len(chunk)))
+        results = {}
+        with tqdm(total=len(indices), desc="MFD Predict") as pbar:
+            for batch in group_batches_by_shape([chunk.shapes[index] for index in indices], batch_size):
+                batch_indices = [indices[i] for i in batch]
+                with trace_span('yolo_v8_mfd', 'model', batch_size=len(batch_indices)):
+                    batch_preds = predict_prepared(
+                        self.model, chunk, batch_indices, self.imgsz,
+                        conf=self.conf,
+                        iou=self.iou,
+                        verbose=False,
+                        device=self.device
+                    )
+                for index, pred in zip(batch_indices, batch_preds):
+                    results[index] = pred.cpu()
+                pbar.update(len(batch_indices))
+        return [results[index] for index in indices]
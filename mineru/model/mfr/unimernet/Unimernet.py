@@ -1,7 +1,32 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import torch
 from torch.utils.data import DataLoader, Dataset
 from tqdm import tqdm
 
+from mineru.utils.trace_export import trace_span
+
+# 公式裁剪、缩放、归一化和padding的线程数，cv2和numpy在这些操作中会释放GIL
+MFR_PREPROCESS_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def get_line_height(mfd_res) -> float:
+    """页面的行高估计：行内公式框高度的中位数，页面没有行内公式时使用全部公式框高度的中位数"""
+    heights = (mfd_res.boxes.xyxy[:, 3] - mfd_res.boxes.xyxy[:, 1]).float()
+    inline_heights = heights[mfd_res.boxes.cls == 0]
+    if len(inline_heights) > 0:
+        heights = inline_heights
+    return max(1.0, float(heights.median().item())) if len(heights) > 0 else 1.0
+
+
+def estimate_decode_length(width: int, height: int, line_height: float) -> float:
+    """
+    按公式框估计解码长度：一行的token数约与宽度/行高成正比，多行公式(矩阵、公式组)再乘以行数。
+    以行高归一化后，不同字号、不同渲染分辨率的页面上的公式可以直接比较，比按面积排序更接近实际解码长度
+    """
+    return width / line_height * max(1.0, height / line_height)
+
 
 class MathDataset(Dataset):
     def __init__(self, image_paths, transform=None):
@@ -61,17 +86,38 @@ class UnimernetModel(object):
             res["latex"] = latex
         return formula_list
 
+    def _iter_prefetched_batches(self, crop_items: list, batch_size: int):
+        """
+        按batch_size依次yield预处理后的批次，裁剪和transform在线程池中逐个公式并行执行。
+        yield当前批次前先提交下一批次，模型对当前批次generate时下一批次已在准备，同一时刻最多有两个批次在内存中
+        """
+        def prepare(pil_img, box):
+            return self.model.transform(pil_img.crop(box))
+
+        with ThreadPoolExecutor(
+                max_workers=MFR_PREPROCESS_WORKERS, thread_name_prefix='mineru-mfr-preprocess'
+        ) as executor:
+            def submit(start):
+                return [executor.submit(prepare, *item) for item in crop_items[start: start + batch_size]]
+
+            futures = submit(0)
+            for start in range(0, len(crop_items), batch_size):
+                next_start = start + batch_size
+                next_futures = submit(next_start) if next_start < len(crop_items) else []
+                yield torch.stack([future.result() for future in futures])
+                futures = next_futures
+
     def batch_predict(self, images_mfd_res: list, images: list, batch_size: int = 64) -> list:
         images_formula_list = []
-        mf_image_list = []
         backfill_list = []
-        image_info = []  # Store (area, original_index, image) tuples
+        image_info = []  # Store (decode_length, area, original_index, page_image, crop_box) tuples
 
         # Collect images with their original indices
         for image_index in range(len(images_mfd_res)):
             mfd_res = images_mfd_res[image_index]
             pil_img = images[image_index]
             formula_list = []
+            line_height = get_line_height(mfd_res)
 
             for idx, (xyxy, conf, cla) in enumerate(zip(
                     mfd_res.boxes.xyxy, mfd_res.boxes.conf, mfd_res.boxes.cls
@@ -84,47 +130,38 @@ class UnimernetModel(object):
                     "latex": "",
                 }
                 formula_list.append(new_item)
-                bbox_img = pil_img.crop((xmin, ymin, xmax, ymax))
                 area = (xmax - xmin) * (ymax - ymin)
+                decode_length = estimate_decode_length(xmax - xmin, ymax - ymin, line_height)
 
-                curr_idx = len(mf_image_list)
-                image_info.append((area, curr_idx, bbox_img))
-                mf_image_list.append(bbox_img)
+                # 裁剪推迟到预处理线程中进行
+                curr_idx = len(image_info)
+                image_info.append((decode_length, area, curr_idx, pil_img, (xmin, ymin, xmax, ymax)))
 
             images_formula_list.append(formula_list)
             backfill_list += formula_list
 
-        # Stable sort by area
-        image_info.sort(key=lambda x: x[0])  # sort by area
-        sorted_indices = [x[1] for x in image_info]
-        sorted_images = [x[2] for x in image_info]
+        # 按估计的解码长度稳定排序，相邻切分的批次内解码长度接近，减少先结束的公式陪跑的解码步数
+        image_info.sort(key=lambda x: (x[0], x[1]))
+        sorted_indices = [x[2] for x in image_info]
+        sorted_crop_items = [(x[3], x[4]) for x in image_info]
 
         # Create mapping for results
         index_mapping = {new_idx: old_idx for new_idx, old_idx in enumerate(sorted_indices)}
 
-        # Create dataset with sorted images
-        dataset = MathDataset(sorted_images, transform=self.model.transform)
-
-        # 如果batch_size > len(sorted_images)，则设置为不超过len(sorted_images)的2的幂
-        batch_size = min(batch_size, max(1, 2 ** (len(sorted_images).bit_length() - 1))) if sorted_images else 1
-
-        dataloader = DataLoader(dataset, batch_size=batch_size, num_workers=0)
+        # 如果batch_size > len(sorted_crop_items)，则设置为不超过len(sorted_crop_items)的2的幂
+        batch_size = min(batch_size, max(1, 2 ** (len(sorted_crop_items).bit_length() - 1))) if sorted_crop_items else 1
 
         # Process batches and store results
         mfr_res = []
-        # for mf_img in dataloader:
 
-        with tqdm(total=len(sorted_images), desc="MFR Predict") as pbar:
-            for index, mf_img in enumerate(dataloader):
+        with tqdm(total=len(sorted_crop_items), desc="MFR Predict") as pbar:
+            for mf_img in self._iter_prefetched_batches(sorted_crop_items, batch_size):
                 mf_img = mf_img.to(dtype=self.model.dtype)
                 mf_img = mf_img.to(self.device)
-                with torch.no_grad():
+                with torch.no_grad(), trace_span('unimernet', 'model', batch_size=mf_img.shape[0]):
                     output = self.model.generate({"image": mf_img}, batch_size=batch_size)
                 mfr_res.extend(output["fixed_str"])
-
-                # 更新进度条，每次增加batch_size，但要注意最后一个batch可能不足batch_size
-                current_batch_size = min(batch_size, len(sorted_images) - index * batch_size)
-                pbar.update(current_batch_size)
+                pbar.update(mf_img.shape[0])
 
         # Restore original order
         unsorted_results = [""] * len(mfr_res)
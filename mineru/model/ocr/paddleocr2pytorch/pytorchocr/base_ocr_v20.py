@@ -1,10 +1,12 @@
 import os
 import torch
+from mineru.utils.config_reader import get_ocr_backend
 from .modeling.architectures.base_model import BaseModel
 
 class BaseOCRV20:
     def __init__(self, config, **kwargs):
         self.config = config
+        self.onnx_net = None
         self.build_net(**kwargs)
         self.net.eval()
 
@@ -33,6 +35,18 @@ class BaseOCRV20:
         self.net.load_state_dict(torch.load(weights_path, weights_only=True))
         # print('model is loaded: {}'.format(weights_path))
 
+    def init_onnx_net(self, weights_path, device, dummy_input, input_dynamic_axes):
+        """配置为onnx后端且运行在cpu上时，改用onnxruntime执行网络，不可用时保持torch"""
+        if get_ocr_backend() != 'onnx' or not str(device).startswith('cpu'):
+            return
+        from .onnx_net import load_onnx_net
+        self.onnx_net = load_onnx_net(self.net, weights_path, dummy_input, input_dynamic_axes)
+
+    def run_net(self, inputs):
+        if self.onnx_net is not None:
+            return self.onnx_net(inputs)
+        return self.net(inputs)
+
     def inference(self, inputs):
         with torch.no_grad():
             infer = self.net(inputs)
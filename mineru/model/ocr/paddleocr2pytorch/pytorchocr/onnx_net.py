@@ -0,0 +1,103 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""
+det/rec网络的onnxruntime执行。
+首次使用时把按arch_config.yaml构建并加载权重的torch网络导出为ONNX，缓存在权重文件旁，之后直接加载；
+OnnxNet与torch网络的调用方式相同(输入输出都是torch张量)，前后处理无需改动。
+"""
+import os
+
+import numpy as np
+import torch
+from loguru import logger
+
+# 导出后与torch输出比对的最大绝对误差，超过时认为导出不可靠并回退到torch
+ONNX_CHECK_ATOL = 1e-3
+
+
+class OnnxNet:
+    """用onnxruntime执行导出的网络，输出结构(dict、list或单个张量)与torch网络一致"""
+
+    def __init__(self, session, output_keys):
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+        self.output_names = [output.name for output in session.get_outputs()]
+        self.output_keys = output_keys
+
+    def __call__(self, inp: torch.Tensor):
+        outputs = self.session.run(self.output_names, {self.input_name: inp.cpu().numpy()})
+        outputs = [torch.from_numpy(output) for output in outputs]
+        if isinstance(self.output_keys, list):
+            return dict(zip(self.output_keys, outputs))
+        if self.output_keys == 'list':
+            return outputs
+        return outputs[0]
+
+
+def _flatten_outputs(outputs) -> tuple:
+    """返回(输出张量列表, 输出结构)，输出结构为dict的key列表、'list'或'tensor'"""
+    if isinstance(outputs, dict):
+        return list(outputs.values()), list(outputs.keys())
+    if isinstance(outputs, (list, tuple)):
+        return list(outputs), 'list'
+    return [outputs], 'tensor'
+
+
+def _export(net, onnx_path: str, dummy_input: torch.Tensor, input_dynamic_axes: dict, output_num: int):
+    output_names = [f'output_{i}' for i in range(output_num)]
+    with torch.no_grad():
+        outputs, _ = _flatten_outputs(net(dummy_input))
+    dynamic_axes = {'x': input_dynamic_axes}
+    for name, output in zip(output_names, outputs):
+        dynamic_axes[name] = {axis: f'{name}_{axis}' for axis in range(output.dim())}
+    # 先写临时文件再替换，避免多个进程同时导出时读到不完整的文件
+    tmp_path = f'{onnx_path}.{os.getpid()}.tmp'
+    try:
+        torch.onnx.export(
+            net, dummy_input, tmp_path,
+            input_names=['x'], output_names=output_names, dynamic_axes=dynamic_axes,
+            opset_version=14, do_constant_folding=True,
+        )
+        os.replace(tmp_path, onnx_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_onnx_net(net, weights_path: str, dummy_input: torch.Tensor, input_dynamic_axes: dict):
+    """
+    返回与net等价的OnnxNet，ONNX文件缓存为权重文件同目录下的同名.onnx文件。
+    未安装onnxruntime、导出失败或与torch输出不一致时返回None，由调用方继续使用torch网络
+    """
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        logger.warning('onnxruntime is not installed, OCR det/rec fall back to torch')
+        return None
+
+    onnx_path = f'{os.path.splitext(weights_path)[0]}.onnx'
+    net.eval()
+    with torch.no_grad():
+        torch_outputs, output_keys = _flatten_outputs(net(dummy_input))
+    try:
+        if not os.path.exists(onnx_path):
+            logger.info(f'exporting {weights_path} to {onnx_path}')
+            _export(net, onnx_path, dummy_input, input_dynamic_axes, len(torch_outputs))
+
+        sess_options = ort.SessionOptions()
+        sess_options.intra_op_num_threads = torch.get_num_threads()
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session = ort.InferenceSession(onnx_path, sess_options, providers=['CPUExecutionProvider'])
+        onnx_net = OnnxNet(session, output_keys)
+
+        onnx_outputs, _ = _flatten_outputs(onnx_net(dummy_input))
+        max_diff = max(
+            float(np.abs(torch_output.numpy() - onnx_output.numpy()).max())
+            for torch_output, onnx_output in zip(torch_outputs, onnx_outputs)
+        )
+        if max_diff > ONNX_CHECK_ATOL:
+            logger.warning(f'{onnx_path} differs from torch by {max_diff}, OCR falls back to torch')
+            return None
+    except Exception as e:
+        logger.warning(f'failed to run {weights_path} with onnxruntime, OCR falls back to torch: {e}')
+        return None
+    return onnx_net
@@ -7,6 +7,7 @@ from ...pytorchocr.base_ocr_v20 import BaseOCRV20
 from . import pytorchocr_utility as utility
 from ...pytorchocr.data import create_operators, transform
 from ...pytorchocr.postprocess import build_post_process
+from mineru.utils.trace_export import trace_span
 
 
 class TextDetector(BaseOCRV20):
@@ -116,6 +117,9 @@ class TextDetector(BaseOCRV20):
         self.load_pytorch_weights(self.weights_path)
         self.net.eval()
         self.net.to(self.device)
+        self.init_onnx_net(
+            self.weights_path, self.device, torch.zeros(1, 3, 640, 640), {0: 'batch', 2: 'height', 3: 'width'}
+        )
 
     def _batch_process_same_size(self, img_list):
         """
@@ -162,10 +166,10 @@ class TextDetector(BaseOCRV20):
             return batch_results, time.time() - starttime
 
         # 批处理推理
-        with torch.no_grad():
+        with torch.no_grad(), trace_span('text_detector', 'model', batch_size=len(img_list)):
             inp = torch.from_numpy(batch_tensor)
             inp = inp.to(self.device)
-            outputs = self.net(inp)
+            outputs = self.run_net(inp)
 
         # 处理输出
         preds = {}
@@ -304,10 +308,10 @@ class TextDetector(BaseOCRV20):
         img = img.copy()
         starttime = time.time()
 
-        with torch.no_grad():
+        with torch.no_grad(), trace_span('text_detector', 'model', batch_size=1):
             inp = torch.from_numpy(img)
             inp = inp.to(self.device)
-            outputs = self.net(inp)
+            outputs = self.run_net(inp)
 
         preds = {}
         if self.det_algorithm == "EAST":
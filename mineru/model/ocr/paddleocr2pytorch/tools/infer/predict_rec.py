@@ -9,6 +9,10 @@ from tqdm import tqdm
 from ...pytorchocr.base_ocr_v20 import BaseOCRV20
 from . import pytorchocr_utility as utility
 from ...pytorchocr.postprocess import build_post_process
+from mineru.utils.trace_export import trace_span
+
+# 按宽度预算组批时，批内padding宽度向上取整到该值的倍数，使不同批次的输入尺寸集中在少数几种
+REC_WIDTH_BUCKET = 32
 
 
 class TextRecognizer(BaseOCRV20):
@@ -93,8 +97,13 @@ class TextRecognizer(BaseOCRV20):
         self.load_state_dict(weights)
         self.net.eval()
         self.net.to(self.device)
+        if self.rec_algorithm not in ['SRN', 'SAR', 'CAN']:
+            imgC, imgH, imgW = self.rec_image_shape[:3]
+            self.init_onnx_net(
+                self.weights_path, self.device, torch.zeros(1, imgC, imgH, imgW), {0: 'batch', 3: 'width'}
+            )
 
-    def resize_norm_img(self, img, max_wh_ratio):
+    def resize_norm_img(self, img, max_wh_ratio, padded_width=None):
         imgC, imgH, imgW = self.rec_image_shape
         if self.rec_algorithm == 'NRTR' or self.rec_algorithm == 'ViTSTR':
             img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
@@ -124,9 +133,12 @@ class TextRecognizer(BaseOCRV20):
             return resized_image
 
         assert imgC == img.shape[2]
-        max_wh_ratio = max(max_wh_ratio, imgW / imgH)
-        imgW = int((imgH * max_wh_ratio))
-        imgW = max(min(imgW, self.limited_max_width), self.limited_min_width)
+        if padded_width is not None:
+            imgW = padded_width
+        else:
+            max_wh_ratio = max(max_wh_ratio, imgW / imgH)
+            imgW = int((imgH * max_wh_ratio))
+            imgW = max(min(imgW, self.limited_max_width), self.limited_min_width)
         h, w = img.shape[:2]
         ratio = w / float(h)
         ratio_imgH = math.ceil(imgH * ratio)
@@ -288,6 +300,41 @@ class TextRecognizer(BaseOCRV20):
 
         return img
 
+    def get_padded_width(self, max_wh_ratio):
+        """批内最宽文本行所需的padding宽度，向上取整到REC_WIDTH_BUCKET的倍数，不超过limited_max_width"""
+        imgC, imgH, imgW = self.rec_image_shape
+        width = max(math.ceil(imgH * max_wh_ratio), imgW, self.limited_min_width)
+        width = math.ceil(width / REC_WIDTH_BUCKET) * REC_WIDTH_BUCKET
+        return min(width, self.limited_max_width)
+
+    def get_rec_batches(self, sorted_wh_ratios):
+        """
+        把按宽高比升序排列的文本行切分为(起始下标, 结束下标, padding宽度)的批次。
+        默认的CTC识别网络按宽度预算组批：批内行数×padding宽度不超过rec_batch_num×limited_max_width，
+        即与原来rec_batch_num行都按最大宽度padding时的峰值输入相同；窄行可以多放，宽行少放，减少padding的计算。
+        其他识别算法的输入宽度与批内组成无关，仍按rec_batch_num组批
+        """
+        img_num = len(sorted_wh_ratios)
+        if self.rec_algorithm in ['SVTR', 'SRN', 'SAR', 'CAN', 'NRTR', 'ViTSTR', 'RFL']:
+            return [
+                (beg_img_no, min(img_num, beg_img_no + self.rec_batch_num), None)
+                for beg_img_no in range(0, img_num, self.rec_batch_num)
+            ]
+        width_budget = self.rec_batch_num * self.limited_max_width
+        batches = []
+        beg_img_no = 0
+        padded_width = None
+        for ino, wh_ratio in enumerate(sorted_wh_ratios):
+            # 升序排列，加入当前行后批内最宽的就是当前行
+            new_padded_width = self.get_padded_width(wh_ratio)
+            if ino > beg_img_no and (ino - beg_img_no + 1) * new_padded_width > width_budget:
+                batches.append((beg_img_no, ino, padded_width))
+                beg_img_no = ino
+            padded_width = new_padded_width
+        if img_num > beg_img_no:
+            batches.append((beg_img_no, img_num, padded_width))
+        return batches
+
     def __call__(self, img_list, tqdm_enable=False):
         img_num = len(img_list)
         # Calculate the aspect ratio of all text bars
@@ -299,13 +346,10 @@ class TextRecognizer(BaseOCRV20):
 
         # rec_res = []
         rec_res = [['', 0.0]] * img_num
-        batch_num = self.rec_batch_num
         elapse = 0
-        # for beg_img_no in range(0, img_num, batch_num):
+        rec_batches = self.get_rec_batches([width_list[index] for index in indices])
         with tqdm(total=img_num, desc='OCR-rec Predict', disable=not tqdm_enable) as pbar:
-            index = 0
-            for beg_img_no in range(0, img_num, batch_num):
-                end_img_no = min(img_num, beg_img_no + batch_num)
+            for beg_img_no, end_img_no, padded_width in rec_batches:
                 norm_img_batch = []
                 max_wh_ratio = 0
                 for ino in range(beg_img_no, end_img_no):
@@ -354,7 +398,7 @@ class TextRecognizer(BaseOCRV20):
                         word_label_list.append(word_label)
                     else:
                         norm_img = self.resize_norm_img(img_list[indices[ino]],
-                                                        max_wh_ratio)
+                                                        max_wh_ratio, padded_width)
                         norm_img = norm_img[np.newaxis, :]
                         norm_img_batch.append(norm_img)
                 norm_img_batch = np.concatenate(norm_img_batch)
@@ -417,10 +461,10 @@ class TextRecognizer(BaseOCRV20):
                 else:
                     starttime = time.time()
 
-                    with torch.no_grad():
+                    with torch.no_grad(), trace_span('text_recognizer', 'model', batch_size=end_img_no - beg_img_no):
                         inp = torch.from_numpy(norm_img_batch)
                         inp = inp.to(self.device)
-                        prob_out = self.net(inp)
+                        prob_out = self.run_net(inp)
 
                     if isinstance(prob_out, list):
                         preds = [v.cpu().numpy() for v in prob_out]
@@ -432,10 +476,7 @@ class TextRecognizer(BaseOCRV20):
                     rec_res[indices[beg_img_no + rno]] = rec_result[rno]
                 elapse += time.time() - starttime
 
-                # 更新进度条，每次增加batch_size，但要注意最后一个batch可能不足batch_size
-                current_batch_size = min(batch_num, img_num - index * batch_num)
-                index += 1
-                pbar.update(current_batch_size)
+                pbar.update(end_img_no - beg_img_no)
 
         # Fix NaN values in recognition results
         for i in range(len(rec_res)):
@@ -0,0 +1 @@
+# Copyright (c) Opendatalab. All rights reserved.
@@ -0,0 +1,471 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""
+合成模型，不加载任何权重，按页面尺寸和少量采样像素生成确定性的检测/识别结果，并按配置的代价模型消耗时间。
+接口与真实的layout/mfd/mfr/ocr/table/layoutreader模型一致，批处理、裁剪、padding、分组和后处理仍走真实流程，
+用于在任意CPU机器上测量和优化doc_analyze和BatchAnalyze的编排开销。
+"""
+import copy
+import random
+import time
+import warnings
+import zlib
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+from tqdm import tqdm
+
+from mineru.utils.config_reader import get_synthetic_model_config
+from mineru.utils.ocr_utils import (check_img, get_rotate_crop_image, merge_det_boxes, preprocess_image,
+                                    sorted_boxes, update_det_boxes)
+from mineru.utils.trace_export import trace_span
+from ..reading_order.xycut import recursive_xy_cut
+
+# 文本行间距(像素)，与200dpi渲染下的正文行高接近
+LINE_PITCH = 36
+
+_BLOCK_KINDS = ['text', 'figure', 'table', 'equation']
+_BLOCK_WEIGHTS = [6, 1, 1, 1]
+_WORDS = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit', 'sed', 'do', 'eiusmod',
+          'tempor', 'incididunt', 'ut', 'labore', 'et', 'dolore', 'magna', 'aliqua']
+_LATEX_TOKENS = ['x', 'y', 'z', 'n', '\\alpha', '\\beta', '+', '-', '=', '^{2}', '_{i}', '\\frac{a}{b}',
+                 '\\sum_{i=1}^{n}', '\\int_{0}^{1}', '\\left(', '\\right)']
+
+
+class SyntheticCost:
+    """
+    单次调用耗时 = base + per_item * 条目数 + per_mpixel * 输入百万像素数(秒)，
+    mode为sleep时释放GIL，模拟加速卡推理；为busy时空转占用CPU，模拟CPU推理
+    """
+
+    def __init__(self, name='synthetic', base=0.0, per_item=0.0, per_mpixel=0.0, mode='sleep'):
+        self.name = name
+        self.base = float(base)
+        self.per_item = float(per_item)
+        self.per_mpixel = float(per_mpixel)
+        self.mode = mode
+
+    def spend(self, item_num=1, pixel_num=0) -> float:
+        cost = self.base + self.per_item * item_num + self.per_mpixel * pixel_num / 1e6
+        with trace_span(self.name, 'model', batch_size=item_num):
+            if cost <= 0:
+                return 0.0
+            if self.mode == 'busy':
+                end_time = time.perf_counter() + cost
+                while time.perf_counter() < end_time:
+                    pass
+            else:
+                time.sleep(cost)
+        return cost
+
+
+def get_synthetic_cost(model_name: str) -> SyntheticCost:
+    config = get_synthetic_model_config()
+    return SyntheticCost(f'synthetic_{model_name}', mode=config.get('mode', 'sleep'), **config.get(model_name, {}))
+
+
+def _image_size(image) -> tuple:
+    if isinstance(image, Image.Image):
+        return image.size
+    height, width = image.shape[:2]
+    return width, height
+
+
+def _image_seed(image) -> int:
+    """由尺寸和8x8网格采样的像素生成随机种子，同一张图多次推理得到相同结果"""
+    width, height = _image_size(image)
+    if isinstance(image, Image.Image):
+        pixels = [
+            image.getpixel((x * (width - 1) // 7, y * (height - 1) // 7)) for y in range(8) for x in range(8)
+        ]
+        return zlib.crc32(repr((width, height, pixels)).encode())
+    sample = np.ascontiguousarray(image[::max(1, height // 8), ::max(1, width // 8)])
+    return zlib.crc32(repr((width, height)).encode() + sample.tobytes())
+
+
+def _plan_page(width, height, seed) -> list:
+    """
+    生成页面版面 [(category_id, [x0, y0, x1, y1])]，依次为页眉、标题、单栏或双栏正文和页码，
+    正文中按权重穿插图片+图注、表头+表格和行间公式
+    """
+    rng = random.Random(seed)
+    pitch = max(8, height // 60)
+    margin_x = int(width * 0.08)
+    margin_y = int(height * 0.06)
+    bottom = height - margin_y
+    blocks = [
+        (2, [margin_x, margin_y // 3, width // 2, margin_y // 3 + pitch]),
+        (0, [margin_x, margin_y, width - margin_x, margin_y + 2 * pitch]),
+    ]
+    top = margin_y + 3 * pitch
+    column_num = rng.choice([1, 2])
+    column_gap = int(width * 0.04)
+    column_w = (width - 2 * margin_x - (column_num - 1) * column_gap) // column_num
+    for column in range(column_num):
+        x0 = margin_x + column * (column_w + column_gap)
+        x1 = x0 + column_w
+        y = top
+        while True:
+            kind = rng.choices(_BLOCK_KINDS, weights=_BLOCK_WEIGHTS)[0]
+            # (category_id, 高度, 左右缩进)
+            if kind == 'text':
+                group = [(1, rng.randint(3, 12) * pitch, 0)]
+            elif kind == 'figure':
+                group = [(3, int(column_w * rng.uniform(0.4, 0.7)), 0), (4, 2 * pitch, 0)]
+            elif kind == 'table':
+                group = [(6, pitch, 0), (5, int(column_w * rng.uniform(0.3, 0.6)), 0)]
+            else:
+                group = [(8, 2 * pitch, column_w // 6)]
+            if y + sum(h + pitch // 2 for _, h, _ in group) > bottom:
+                break
+            for category_id, h, indent in group:
+                blocks.append((category_id, [x0 + indent, y, x1 - indent, y + h]))
+                y += h + pitch // 2
+            y += pitch // 2
+    if bottom + 2 * pitch <= height:
+        blocks.append((2, [width // 2 - pitch, bottom + pitch, width // 2 + pitch, bottom + 2 * pitch]))
+    return blocks
+
+
+def _plan_formulas(width, height, seed) -> list:
+    """在_plan_page的版面上生成公式 [(cls, [x0, y0, x1, y1])]，cls为0表示行内公式，1表示行间公式"""
+    rng = random.Random(seed + 1)
+    pitch = max(8, height // 60)
+    formulas = []
+    for category_id, (x0, y0, x1, y1) in _plan_page(width, height, seed):
+        if category_id == 8:
+            formulas.append((1, [x0 + pitch, y0 + pitch // 4, x1 - pitch, y1 - pitch // 4]))
+        elif category_id == 1 and rng.random() < 0.4:
+            line_num = max(1, (y1 - y0) // pitch)
+            for _ in range(rng.randint(1, 3)):
+                line_y0 = y0 + rng.randrange(line_num) * pitch
+                formula_w = min(x1 - x0, rng.randint(2, 6) * pitch)
+                formula_x0 = rng.randint(x0, x1 - formula_w)
+                formulas.append((0, [
+                    formula_x0, line_y0 + pitch // 10, formula_x0 + formula_w, line_y0 + pitch * 9 // 10
+                ]))
+    return formulas
+
+
+class SyntheticLayoutModel:
+    def __init__(self):
+        self.cost = get_synthetic_cost('layout')
+
+    def predict(self, image) -> list:
+        width, height = _image_size(image)
+        seed = _image_seed(image)
+        rng = random.Random(seed + 2)
+        pitch = max(8, height // 60)
+        layout_res = []
+        for category_id, bbox in _plan_page(width, height, seed):
+            candidates = [(bbox, round(rng.uniform(0.6, 0.98), 3))]
+            if rng.random() < 0.1:
+                # 与真实模型一样输出少量低置信度的近似重复框，让后处理的去重逻辑参与计时
+                jitter = rng.randint(1, max(1, pitch // 4))
+                candidates.append((
+                    [max(0, bbox[0] - jitter), max(0, bbox[1] - jitter),
+                     min(width, bbox[2] + jitter), min(height, bbox[3] + jitter)],
+                    round(rng.uniform(0.2, 0.5), 3),
+                ))
+            for (xmin, ymin, xmax, ymax), score in candidates:
+                layout_res.append({
+                    "category_id": category_id,
+                    "poly": [xmin, ymin, xmax, ymin, xmax, ymax, xmin, ymax],
+                    "score": score,
+                })
+        return layout_res
+
+    def batch_predict(self, images: list, batch_size: int = 4) -> list:
+        results = []
+        with tqdm(total=len(images), desc="Layout Predict") as pbar:
+            for idx in range(0, len(images), batch_size):
+                batch = images[idx: idx + batch_size]
+                self.cost.spend(len(batch), sum(w * h for w, h in map(_image_size, batch)))
+                results += [self.predict(image) for image in batch]
+                pbar.update(len(batch))
+        return results
+
+
+class _SyntheticBoxes:
+    """与ultralytics Boxes一致的xyxy/conf/cls张量"""
+
+    def __init__(self, detections):
+        self.xyxy = torch.tensor([bbox for _, bbox, _ in detections], dtype=torch.float32).reshape(-1, 4)
+        self.conf = torch.tensor([conf for _, _, conf in detections], dtype=torch.float32)
+        self.cls = torch.tensor([cls for cls, _, _ in detections], dtype=torch.float32)
+
+    def __len__(self):
+        return len(self.cls)
+
+
+class SyntheticMFDResult:
+    def __init__(self, detections):
+        self.boxes = _SyntheticBoxes(detections)
+
+    def cpu(self):
+        return self
+
+
+class SyntheticMFDModel:
+    def __init__(self):
+        self.cost = get_synthetic_cost('mfd')
+
+    def predict(self, image) -> SyntheticMFDResult:
+        width, height = _image_size(image)
+        seed = _image_seed(image)
+        rng = random.Random(seed + 3)
+        return SyntheticMFDResult([
+            (cls, bbox, round(rng.uniform(0.5, 0.95), 2)) for cls, bbox in _plan_formulas(width, height, seed)
+        ])
+
+    def batch_predict(self, images: list, batch_size: int = 4) -> list:
+        results = []
+        with tqdm(total=len(images), desc="MFD Predict") as pbar:
+            for idx in range(0, len(images), batch_size):
+                batch = images[idx: idx + batch_size]
+                self.cost.spend(len(batch), sum(w * h for w, h in map(_image_size, batch)))
+                results += [self.predict(image) for image in batch]
+                pbar.update(len(batch))
+        return results
+
+
+class SyntheticMFRModel:
+    """裁剪、按面积排序和分批方式与UnimernetModel.batch_predict一致，latex长度随公式宽高比增长"""
+
+    def __init__(self):
+        self.cost = get_synthetic_cost('mfr')
+
+    @staticmethod
+    def _recognize(bbox_img, seed) -> str:
+        width, height = bbox_img.size
+        rng = random.Random(seed)
+        token_num = min(64, max(1, round(width / max(height, 1) * 2)))
+        return ' '.join(rng.choice(_LATEX_TOKENS) for _ in range(token_num))
+
+    def batch_predict(self, images_mfd_res: list, images: list, batch_size: int = 64) -> list:
+        images_formula_list = []
+        backfill_list = []
+        image_info = []  # (area, original_index, image, seed)
+
+        for image_index in range(len(images_mfd_res)):
+            mfd_res = images_mfd_res[image_index]
+            pil_img = images[image_index]
+            formula_list = []
+
+            for xyxy, conf, cla in zip(mfd_res.boxes.xyxy, mfd_res.boxes.conf, mfd_res.boxes.cls):
+                xmin, ymin, xmax, ymax = [int(p.item()) for p in xyxy]
+                new_item = {
+                    "category_id": 13 + int(cla.item()),
+                    "poly": [xmin, ymin, xmax, ymin, xmax, ymax, xmin, ymax],
+                    "score": round(float(conf.item()), 2),
+                    "latex": "",
+                }
+                formula_list.append(new_item)
+                bbox_img = pil_img.crop((xmin, ymin, xmax, ymax))
+                area = (xmax - xmin) * (ymax - ymin)
+                image_info.append((area, len(backfill_list), bbox_img, zlib.crc32(repr(new_item["poly"]).encode())))
+                backfill_list.append(new_item)
+
+            images_formula_list.append(formula_list)
+
+        image_info.sort(key=lambda x: x[0])
+        batch_size = min(batch_size, max(1, 2 ** (len(image_info).bit_length() - 1))) if image_info else 1
+
+        with tqdm(total=len(image_info), desc="MFR Predict") as pbar:
+            for idx in range(0, len(image_info), batch_size):
+                batch = image_info[idx: idx + batch_size]
+                self.cost.spend(len(batch), sum(area for area, _, _, _ in batch))
+                for _, original_idx, bbox_img, seed in batch:
+                    backfill_list[original_idx]["latex"] = self._recognize(bbox_img, seed)
+                pbar.update(len(batch))
+
+        return images_formula_list
+
+
+class SyntheticTextDetector:
+    """按非白色像素的包围框把内容区域切成等高的文本行"""
+
+    def __init__(self):
+        self.cost = get_synthetic_cost('ocr_det')
+
+    @staticmethod
+    def _detect(img):
+        if img is None:
+            return None
+        sample = img[::4, ::4]
+        if sample.ndim == 3:
+            sample = sample.min(axis=2)
+        ys, xs = np.nonzero(sample < 200)
+        if len(ys) == 0:
+            return np.zeros((0, 4, 2), dtype=np.float32)
+        height, width = img.shape[:2]
+        x0, x1 = xs.min() * 4, min(width, xs.max() * 4 + 4)
+        y0, y1 = ys.min() * 4, min(height, ys.max() * 4 + 4)
+        rng = random.Random(_image_seed(img))
+        line_num = max(1, round((y1 - y0) / LINE_PITCH))
+        line_h = (y1 - y0) / line_num
+        dt_boxes = []
+        for index in range(line_num):
+            line_y0 = y0 + index * line_h
+            line_y1 = line_y0 + (line_h if line_num == 1 else line_h * 0.8)
+            # 段落最后一行不满行
+            line_x1 = x1 if index < line_num - 1 else x0 + (x1 - x0) * rng.uniform(0.3, 1.0)
+            dt_boxes.append([[x0, line_y0], [line_x1, line_y0], [line_x1, line_y1], [x0, line_y1]])
+        return np.array(dt_boxes, dtype=np.float32)
+
+    def __call__(self, img):
+        start_time = time.time()
+        if img is None:
+            return None, 0
+        self.cost.spend(1, img.shape[0] * img.shape[1])
+        return self._detect(img), time.time() - start_time
+
+    def batch_predict(self, img_list, max_batch_size=8):
+        batch_results = []
+        for i in range(0, len(img_list), max_batch_size):
+            batch_imgs = img_list[i:i + max_batch_size]
+            start_time = time.time()
+            self.cost.spend(len(batch_imgs), sum(img.shape[0] * img.shape[1] for img in batch_imgs))
+            batch_dt_boxes = [self._detect(img) for img in batch_imgs]
+            elapse = time.time() - start_time
+            batch_results += [(dt_boxes, elapse) for dt_boxes in batch_dt_boxes]
+        return batch_results
+
+
+class SyntheticTextRecognizer:
+    """文本长度随行图宽高比增长，约3%的结果为低置信度，让低分过滤逻辑参与计时"""
+
+    def __init__(self, rec_batch_num=16):
+        self.rec_batch_num = rec_batch_num
+        self.cost = get_synthetic_cost('ocr_rec')
+
+    @staticmethod
+    def _recognize(img) -> tuple:
+        height, width = img.shape[:2]
+        rng = random.Random(_image_seed(img))
+        char_num = max(1, round(width / max(height, 1) * 1.5))
+        text = ''
+        while len(text) < char_num:
+            text += rng.choice(_WORDS) + ' '
+        score = rng.uniform(0.3, 0.5) if rng.random() < 0.03 else rng.uniform(0.85, 0.99)
+        return text[:char_num].strip(), score
+
+    def __call__(self, img_list, tqdm_enable=False):
+        start_time = time.time()
+        rec_res = []
+        with tqdm(total=len(img_list), desc='OCR-rec Predict', disable=not tqdm_enable) as pbar:
+            for beg_img_no in range(0, len(img_list), self.rec_batch_num):
+                batch_imgs = img_list[beg_img_no: beg_img_no + self.rec_batch_num]
+                self.cost.spend(len(batch_imgs), sum(img.shape[0] * img.shape[1] for img in batch_imgs))
+                rec_res += [self._recognize(img) for img in batch_imgs]
+                pbar.update(len(batch_imgs))
+        return rec_res, time.time() - start_time
+
+
+class SyntheticOCRModel:
+    """
+    与PytorchPaddleOCR接口一致的ocr/__call__，预处理、检测框排序合并、公式避让、透视裁剪和低分过滤走相同的流程，
+    只把检测和识别模型替换为合成模型
+    """
+
+    def __init__(self, lang=None, **kwargs):
+        self.lang = lang or 'ch'
+        self.text_detector = SyntheticTextDetector()
+        self.text_recognizer = SyntheticTextRecognizer()
+        self.use_angle_cls = False
+        self.drop_score = 0.5
+
+    def ocr(self, img, det=True, rec=True, mfd_res=None, tqdm_enable=False):
+        assert isinstance(img, (np.ndarray, list, str, bytes))
+        if isinstance(img, list) and det:
+            raise ValueError('When input a list of images, det must be false')
+        img = check_img(img)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            if det and rec:
+                dt_boxes, rec_res = self.__call__(preprocess_image(img), mfd_res=mfd_res)
+                if not dt_boxes and not rec_res:
+                    return [None]
+                return [[[box.tolist(), res] for box, res in zip(dt_boxes, rec_res)]]
+            elif det and not rec:
+                dt_boxes, elapse = self.text_detector(preprocess_image(img))
+                if dt_boxes is None:
+                    return [None]
+                dt_boxes = merge_det_boxes(sorted_boxes(dt_boxes))
+                if mfd_res:
+                    dt_boxes = update_det_boxes(dt_boxes, mfd_res)
+                return [[box.tolist() for box in dt_boxes]]
+            elif not det and rec:
+                if not isinstance(img, list):
+                    img = [preprocess_image(img)]
+                rec_res, elapse = self.text_recognizer(img, tqdm_enable=tqdm_enable)
+                return [rec_res]
+
+    def __call__(self, img, mfd_res=None):
+        if img is None:
+            return None, None
+        ori_im = img.copy()
+        dt_boxes, elapse = self.text_detector(img)
+        if dt_boxes is None:
+            return None, None
+        dt_boxes = merge_det_boxes(sorted_boxes(dt_boxes))
+        if mfd_res:
+            dt_boxes = update_det_boxes(dt_boxes, mfd_res)
+        img_crop_list = [get_rotate_crop_image(ori_im, copy.deepcopy(box)) for box in dt_boxes]
+        rec_res, elapse = self.text_recognizer(img_crop_list)
+
+        filter_boxes, filter_rec_res = [], []
+        for box, rec_result in zip(dt_boxes, rec_res):
+            text, score = rec_result
+            if score >= self.drop_score:
+                filter_boxes.append(box)
+                filter_rec_res.append(rec_result)
+        return filter_boxes, filter_rec_res
+
+
+class SyntheticTableModel:
+    """与RapidTableModel一样先对表格图做OCR，再把每个文本行拆成若干单元格生成html"""
+
+    def __init__(self, ocr_engine):
+        self.ocr_engine = ocr_engine
+        self.cost = get_synthetic_cost('table')
+
+    def predict(self, image):
+        bgr_image = cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
+        ocr_result = self.ocr_engine.ocr(bgr_image)[0]
+        if not ocr_result:
+            return None, None, None, None
+
+        start_time = time.time()
+        self.cost.spend(len(ocr_result), bgr_image.shape[0] * bgr_image.shape[1])
+        rows_html = []
+        table_cell_bboxes = []
+        logic_points = []
+        for row_index, (box, (text, score)) in enumerate(ocr_result):
+            cells = text.split()[:3] or ['']
+            (x0, y0), _, (x1, y1), _ = box
+            cell_w = (x1 - x0) / len(cells)
+            for col_index in range(len(cells)):
+                cell_x0 = x0 + col_index * cell_w
+                table_cell_bboxes.append([cell_x0, y0, cell_x0 + cell_w, y0, cell_x0 + cell_w, y1, cell_x0, y1])
+                logic_points.append([row_index, row_index, col_index, col_index])
+            rows_html.append('<tr>' + ''.join(f'<td>{cell}</td>' for cell in cells) + '</tr>')
+        html_code = '<html><body><table>' + ''.join(rows_html) + '</table></body></html>'
+        return html_code, np.array(table_cell_bboxes), np.array(logic_points), time.time() - start_time
+
+
+class SyntheticLayoutReaderModel:
+    """用xycut代替layoutreader给出行的阅读顺序"""
+
+    # block_sort.do_predict据此识别合成模型
+    is_synthetic = True
+
+    def __init__(self):
+        self.cost = get_synthetic_cost('layoutreader')
+
+    def predict(self, boxes) -> list:
+        self.cost.spend(len(boxes))
+        orders = []
+        recursive_xy_cut(np.asarray(boxes).astype(int), np.arange(len(boxes)), orders)
+        return orders
@@ -7,7 +7,7 @@ from typing import List
 import torch
 from loguru import logger
 
-from mineru.utils.config_reader import get_device
+from mineru.utils.config_reader import get_device, get_model_profile
 from mineru.utils.enum_class import BlockType, ModelPath
 from mineru.utils.models_download_utils import auto_download_and_get_model_root_path
 
@@ -186,7 +186,10 @@ def model_init(model_name: str):
         bf_16_support = True
 
     device = torch.device(device_name)
-    if model_name == 'layoutreader':
+    if model_name == 'layoutreader' and get_model_profile() == 'synthetic':
+        from mineru.model.synthetic.synthetic_models import SyntheticLayoutReaderModel
+        model = SyntheticLayoutReaderModel()
+    elif model_name == 'layoutreader':
         # 检测modelscope的缓存目录是否存在
         layoutreader_model_dir = os.path.join(auto_download_and_get_model_root_path(ModelPath.layout_reader), ModelPath.layout_reader)
         if os.path.exists(layoutreader_model_dir):
@@ -226,6 +229,10 @@ class ModelSingleton:
 
 
 def do_predict(boxes: List[List[int]], model) -> List[int]:
+    if getattr(model, 'is_synthetic', False):
+        # 合成模型直接给出阅读顺序，按属性识别，正常路径不导入合成模型模块
+        return model.predict(boxes)
+
     from mineru.model.reading_order.layout_reader import (
         boxes2inputs, parse_logits, prepare_inputs)
 
@@ -1,6 +1,7 @@
 # Copyright (c) Opendatalab. All rights reserved.
 import json
 import os
+from functools import lru_cache
 from loguru import logger
 
 try:
@@ -96,6 +97,11 @@ def get_formula_enable(formula_enable):
     return formula_enable
 
 
+def get_formula_prefilter_enable():
+    """是否根据pdf文本层和版面结果跳过不含公式的页面的公式检测与识别，通过环境变量MINERU_FORMULA_PREFILTER_ENABLE设置，默认为false"""
+    return os.getenv('MINERU_FORMULA_PREFILTER_ENABLE', 'false').lower() == 'true'
+
+
 def get_table_enable(table_enable):
     table_enable_env = os.getenv('MINERU_TABLE_ENABLE')
     table_enable = table_enable if table_enable_env is None else table_enable_env.lower() == 'true'
@@ -133,4 +139,55 @@ def get_local_models_dir():
     models_dir = config.get('models-dir')
     if models_dir is None:
         logger.warning(f"'models-dir' not found in {CONFIG_FILE_NAME}, use None as default")
-    return models_dir
\ No newline at end of file
+    return models_dir
+
+
+@lru_cache(maxsize=1)
+def _get_config_model_profile():
+    """配置文件中的model-profile，每页都会查询模型配置，只在首次调用时读取配置文件"""
+    config = read_config()
+    if config is None:
+        return None
+    return config.get('model-profile')
+
+
+def get_model_profile():
+    """模型配置，为synthetic时使用不加载权重的合成模型，环境变量MINERU_MODEL_PROFILE优先于配置文件中的model-profile"""
+    model_profile = os.getenv('MINERU_MODEL_PROFILE')
+    if model_profile is None:
+        model_profile = _get_config_model_profile()
+    return (model_profile or 'default').lower()
+
+
+def get_ocr_backend():
+    """OCR检测和识别网络在cpu上的执行后端，torch或onnx，环境变量MINERU_OCR_BACKEND优先于配置文件中的ocr-backend"""
+    ocr_backend = os.getenv('MINERU_OCR_BACKEND')
+    if ocr_backend is None:
+        config = read_config()
+        if config is not None:
+            ocr_backend = config.get('ocr-backend')
+    return (ocr_backend or 'torch').lower()
+
+
+def get_yolo_backend():
+    """
+    layout和MFD模型在cpu上的执行后端，torch、onnx或onnx_int8，
+    环境变量MINERU_YOLO_BACKEND优先于配置文件中的yolo-backend
+    """
+    yolo_backend = os.getenv('MINERU_YOLO_BACKEND')
+    if yolo_backend is None:
+        config = read_config()
+        if config is not None:
+            yolo_backend = config.get('yolo-backend')
+    return (yolo_backend or 'torch').lower()
+
+
+def get_synthetic_model_config():
+    """合成模型的代价配置，环境变量MINERU_SYNTHETIC_MODEL_CONFIG(json字符串)优先于配置文件中的synthetic-model-config"""
+    synthetic_model_config = os.getenv('MINERU_SYNTHETIC_MODEL_CONFIG')
+    if synthetic_model_config is not None:
+        return json.loads(synthetic_model_config)
+    config = read_config()
+    if config is None:
+        return {}
+    return config.get('synthetic-model-config', {})
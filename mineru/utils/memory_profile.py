@@ -0,0 +1,162 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import os
+import sys
+import threading
+import tracemalloc
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 每个阶段保留的增长最多的分配位置数量
+TOP_ALLOCATION_NUM = 10
+# 只在这些批次或文档级的阶段采集tracemalloc快照，逐页执行的阶段只读取RSS、堆内存和显存的计数与峰值
+SNAPSHOT_STAGES = {'batch_analyze', 'model_init', 'model_json_copy', 'markdown', 'output'}
+
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+]
+
+
+def get_memory_profile_enable() -> bool:
+    """是否在阶段边界采集内存，通过环境变量MINERU_MEMORY_PROFILE_ENABLE设置，默认为false"""
+    return os.getenv('MINERU_MEMORY_PROFILE_ENABLE', 'false').lower() == 'true'
+
+
+def get_rss_bytes() -> int:
+    """当前进程的RSS，linux下读取/proc/self/statm，其他平台安装了psutil时使用psutil，否则返回0"""
+    if sys.platform.startswith('linux'):
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    return 0
+
+
+def reset_peak_rss() -> bool:
+    """
+    重置进程的峰值RSS(VmHWM)，只在linux下可用，成功时返回True。
+    重置前的峰值先计入尚未结束的MemorySample，避免被其他重置(如batch size自动调节)抹掉
+    """
+    if not sys.platform.startswith('linux'):
+        return False
+    with _open_samples_lock:
+        _collect_peaks()
+        return _clear_peak_rss()
+
+
+def _clear_peak_rss() -> bool:
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def get_peak_rss_bytes() -> int:
+    """上次reset_peak_rss()以来的峰值RSS，linux下读取/proc/self/status的VmHWM，其他平台返回当前RSS"""
+    if sys.platform.startswith('linux'):
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    return get_rss_bytes()
+
+
+def _get_initialized_torch():
+    """推理已经初始化cuda时返回torch模块，不会为此额外导入torch"""
+    torch = sys.modules.get('torch')
+    try:
+        if torch is not None and torch.cuda.is_initialized():
+            return torch
+    except Exception:
+        pass
+    return None
+
+
+def get_device_allocated_bytes() -> int:
+    """推理已经初始化cuda时返回当前设备已分配的显存，否则返回0"""
+    torch = _get_initialized_torch()
+    return torch.cuda.memory_allocated() if torch is not None else 0
+
+
+def get_device_peak_bytes() -> int:
+    torch = _get_initialized_torch()
+    return torch.cuda.max_memory_allocated() if torch is not None else 0
+
+
+def _take_snapshot():
+    return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+
+_open_samples = []
+_open_samples_lock = threading.Lock()
+
+
+def _collect_peaks():
+    """把上次重置以来的RSS与显存峰值计入所有尚未结束的采样，调用方需持有_open_samples_lock"""
+    if not _open_samples:
+        return
+    peak_rss = get_peak_rss_bytes()
+    device_peak = get_device_peak_bytes()
+    for sample in _open_samples:
+        sample.peak_rss = max(sample.peak_rss, peak_rss)
+        sample.device_peak = max(sample.device_peak, device_peak)
+
+
+def _reset_peaks():
+    """在阶段边界收集并重置峰值，使每个采样只看到自己打开期间的峰值，调用方需持有_open_samples_lock"""
+    _collect_peaks()
+    _clear_peak_rss()
+    torch = _get_initialized_torch()
+    if torch is not None:
+        torch.cuda.reset_peak_memory_stats()
+
+
+class MemorySample:
+    """
+    阶段开始时的内存状态，stop()返回该阶段结束时相对开始时的变化以及阶段内的RSS与显存峰值。
+    snapshot为True时额外比较tracemalloc快照得到增长最多的分配位置，快照开销较大，只用于SNAPSHOT_STAGES
+    """
+
+    def __init__(self, snapshot: bool = False):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.snapshot = _take_snapshot() if snapshot else None
+        self.traced = tracemalloc.get_traced_memory()[0]
+        self.device_allocated = get_device_allocated_bytes()
+        self.rss = get_rss_bytes()
+        self.peak_rss = self.rss
+        self.device_peak = self.device_allocated
+        with _open_samples_lock:
+            _reset_peaks()
+            _open_samples.append(self)
+
+    def stop(self) -> dict:
+        with _open_samples_lock:
+            _reset_peaks()
+            _open_samples.remove(self)
+        rss = get_rss_bytes()
+        traced = tracemalloc.get_traced_memory()[0]
+        top_allocations = []
+        if self.snapshot is not None:
+            stats = _take_snapshot().compare_to(self.snapshot, 'lineno')
+            top_allocations = [
+                (f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}', stat.size_diff, stat.count_diff)
+                for stat in stats[:TOP_ALLOCATION_NUM] if stat.size_diff > 0
+            ]
+            self.snapshot = None
+        return {
+            'rss_before': self.rss,
+            'rss_after': rss,
+            'peak_rss': max(self.peak_rss, rss),
+            'traced_delta': traced - self.traced,
+            'device_allocated_delta': get_device_allocated_bytes() - self.device_allocated,
+            'device_peak': self.device_peak,
+            'top_allocations': top_allocations,
+        }
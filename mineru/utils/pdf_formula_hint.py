@@ -0,0 +1,83 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""
+根据pdf文本层判断页面是否可能包含公式，供MINERU_FORMULA_PREFILTER_ENABLE跳过公式检测与识别。
+文本层中出现数学字体(TeX数学字体、AMS符号字体、OpenType数学字体、公式编辑器字体)或数学符号时认为页面含有公式；
+文本层字符过少(扫描件、纯图片页)时无法判断，由调用方根据版面结果决定。
+"""
+import re
+from ctypes import byref, c_int, create_string_buffer
+
+import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
+
+# 结论写入页面图像的info中，随页面传给推理
+FORMULA_HINT_KEY = 'mineru_formula_hint'
+# 页面在本次解析中的(文档下标, 页码)，同样写入info，跳过公式检测的日志据此指出具体页面
+PAGE_ID_KEY = 'mineru_page_id'
+# 文本层的非空白字符少于该值时认为没有可用的文本层
+FORMULA_HINT_MIN_CHARS = 50
+
+MATH_FONT_PATTERN = re.compile(
+    r'CMMI|CMSY|CMEX|CMBSY|MSAM|MSBM|EUFM|EUSM|EUEX|RSFS|STMARY|WASY|'
+    r'LMMATH|LATINMODERNMATH|LMMI|LMSY|LMEX|TEXGYRE\w*MATH|STIXMATH|STIXTWOMATH|XITSMATH|CAMBRIAMATH|'
+    r'ASANAMATH|FIRAMATH|NEWCMMATH|MATHJAX|SYMBOL|MTEXTRA|MT-EXTRA|EUCLID|MATHEMATICA',
+    re.IGNORECASE,
+)
+
+# 数学运算符、数学字母数字符号、数学杂项符号以及希腊字母
+MATH_CHAR_RANGES = (
+    (0x0391, 0x03C9),
+    (0x2200, 0x22FF),
+    (0x27C0, 0x27EF),
+    (0x2980, 0x2AFF),
+    (0x1D400, 0x1D7FF),
+)
+MATH_CHARS = {0x00B1, 0x00D7, 0x00F7, 0x2032, 0x2033}
+
+
+def is_math_char(code: int) -> bool:
+    if code in MATH_CHARS:
+        return True
+    return any(start <= code <= end for start, end in MATH_CHAR_RANGES)
+
+
+def is_math_font(font_name: str) -> bool:
+    # 子集字体名带有"ABCDEF+"前缀
+    return MATH_FONT_PATTERN.search(font_name.split('+')[-1]) is not None
+
+
+def get_page_formula_hint(page: pdfium.PdfPage):
+    """
+    返回True(文本层中有数学字体或数学符号)、False(有可用的文本层但没有数学内容)或None(没有可用的文本层)。
+    调用方需持有pdfium_lock
+    """
+    textpage = page.get_textpage()
+    try:
+        textpage_raw = textpage.raw
+        char_num = pdfium_c.FPDFText_CountChars(textpage_raw)
+        font_buffer = create_string_buffer(256)
+        font_flags = c_int()
+        checked_fonts = {}
+        text_char_num = 0
+        for index in range(char_num):
+            code = pdfium_c.FPDFText_GetUnicode(textpage_raw, index)
+            if code <= 0x20:
+                continue
+            text_char_num += 1
+            if is_math_char(code):
+                return True
+            length = pdfium_c.FPDFText_GetFontInfo(
+                textpage_raw, index, font_buffer, len(font_buffer), byref(font_flags)
+            )
+            if length <= 0 or length > len(font_buffer):
+                continue
+            font_name = font_buffer.value
+            if font_name not in checked_fonts:
+                checked_fonts[font_name] = is_math_font(font_name.decode('utf-8', errors='replace'))
+            if checked_fonts[font_name]:
+                return True
+    finally:
+        textpage.close()
+    if text_char_num < FORMULA_HINT_MIN_CHARS:
+        return None
+    return False
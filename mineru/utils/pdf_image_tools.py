@@ -1,4 +1,9 @@
 # Copyright (c) Opendatalab. All rights reserved.
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from io import BytesIO
 
 import pypdfium2 as pdfium
@@ -7,35 +12,113 @@ from PIL import Image
 
 from mineru.data.data_reader_writer import FileBasedDataWriter
 from mineru.utils.pdf_reader import image_to_b64str, image_to_bytes, page_to_image
-from .hash_utils import str_sha256
+from .config_reader import get_formula_prefilter_enable
+from .enum_class import ImageType
+from .pdf_formula_hint import FORMULA_HINT_KEY, get_page_formula_hint
+from .hash_utils import str_sha256, bytes_md5
 
 
-def pdf_page_to_image(page: pdfium.PdfPage, dpi=200) -> dict:
-    """Convert pdfium.PdfDocument to image, Then convert the image to base64.
+def pdf_page_to_image(page: pdfium.PdfPage, dpi=200, image_type=ImageType.PIL) -> dict:
+    """Convert pdfium.PdfDocument to image, Then convert the image to base64 if needed.
 
     Args:
         page (_type_): pdfium.PdfPage
         dpi (int, optional): reset the dpi of dpi. Defaults to 200.
+        image_type (str, optional): ImageType.BASE64 additionally encodes the page as a base64 PNG,
+            which is only needed by consumers that send the page bytes elsewhere. Defaults to ImageType.PIL.
 
     Returns:
-        dict:  {'img_base64': str, 'img_pil': pil_img, 'scale': float }
+        dict:  {'img_pil': pil_img, 'scale': float, 'img_base64': str (only for ImageType.BASE64)}
+            For ImageType.PIL with MINERU_FORMULA_PREFILTER_ENABLE set, pil_img.info also carries
+            the formula hint read from the page text layer.
     """
     pil_img, scale = page_to_image(page, dpi=dpi)
-    img_base64 = image_to_b64str(pil_img)
+    if image_type == ImageType.PIL and get_formula_prefilter_enable():
+        pil_img.info[FORMULA_HINT_KEY] = get_page_formula_hint(page)
 
     image_dict = {
-        "img_base64": img_base64,
         "img_pil": pil_img,
         "scale": scale,
     }
+    if image_type == ImageType.BASE64:
+        image_dict["img_base64"] = image_to_b64str(pil_img)
     return image_dict
 
 
+def get_page_img_md5(image_dict: dict) -> str:
+    """页面图像的指纹，用于生成截图路径，直接对原始位图求哈希而不做PNG编码"""
+    return bytes_md5(image_dict["img_pil"].tobytes())
+
+
+_render_pool = None
+_render_pool_size = 0
+
+
+def get_pdf_render_processes() -> int:
+    """页面渲染进程数，可通过环境变量MINERU_PDF_RENDER_PROCESSES设置，默认为1(在主进程中串行渲染)"""
+    render_processes = int(os.getenv('MINERU_PDF_RENDER_PROCESSES', 1))
+    return max(1, render_processes)
+
+
+def _get_render_pool(processes: int) -> ProcessPoolExecutor:
+    global _render_pool, _render_pool_size
+    if _render_pool is None or _render_pool_size != processes:
+        if _render_pool is not None:
+            _render_pool.shutdown(wait=False)
+        # 主进程可能已持有cuda上下文和大量线程，使用spawn避免fork带来的问题
+        _render_pool = ProcessPoolExecutor(
+            max_workers=processes, mp_context=multiprocessing.get_context('spawn')
+        )
+        _render_pool_size = processes
+    return _render_pool
+
+
+def _shutdown_render_pool():
+    global _render_pool, _render_pool_size
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False)
+    _render_pool = None
+    _render_pool_size = 0
+
+
+def _render_page_range(pdf_bytes: bytes, dpi: int, start_page_id: int, end_page_id: int, image_type) -> list:
+    """在子进程中独立打开文档并渲染[start_page_id, end_page_id]范围内的页面"""
+    pdf_doc = pdfium.PdfDocument(pdf_bytes)
+    try:
+        return [
+            pdf_page_to_image(pdf_doc[index], dpi=dpi, image_type=image_type)
+            for index in range(start_page_id, end_page_id + 1)
+        ]
+    finally:
+        pdf_doc.close()
+
+
+def _load_images_parallel(pdf_bytes: bytes, dpi: int, start_page_id: int, end_page_id: int, processes: int, image_type) -> list:
+    page_count = end_page_id - start_page_id + 1
+    # 每个进程分配多个分片以平衡不同页面的渲染耗时
+    chunk_size = max(1, math.ceil(page_count / (processes * 2)))
+    page_ranges = [
+        (chunk_start, min(chunk_start + chunk_size - 1, end_page_id))
+        for chunk_start in range(start_page_id, end_page_id + 1, chunk_size)
+    ]
+    render_pool = _get_render_pool(processes)
+    futures = [
+        render_pool.submit(_render_page_range, pdf_bytes, dpi, range_start, range_end, image_type)
+        for range_start, range_end in page_ranges
+    ]
+    images_list = []
+    for future in futures:
+        images_list.extend(future.result())
+    return images_list
+
+
 def load_images_from_pdf(
     pdf_bytes: bytes,
     dpi=200,
     start_page_id=0,
     end_page_id=None,
+    render_processes=None,
+    image_type=ImageType.PIL,
 ):
     images_list = []
     pdf_doc = pdfium.PdfDocument(pdf_bytes)
@@ -45,10 +128,22 @@ def load_images_from_pdf(
         logger.warning("end_page_id is out of range, use images length")
         end_page_id = pdf_page_num - 1
 
+    render_processes = render_processes if render_processes is not None else get_pdf_render_processes()
+    if render_processes > 1 and end_page_id - start_page_id + 1 > 1:
+        try:
+            images_list = _load_images_parallel(
+                pdf_bytes, dpi, start_page_id, end_page_id, render_processes, image_type
+            )
+            return images_list, pdf_doc
+        except BrokenProcessPool as e:
+            logger.warning(f"parallel page rendering failed, fallback to serial rendering: {e}")
+            _shutdown_render_pool()
+            images_list = []
+
     for index in range(0, pdf_page_num):
         if start_page_id <= index <= end_page_id:
             page = pdf_doc[index]
-            image_dict = pdf_page_to_image(page, dpi=dpi)
+            image_dict = pdf_page_to_image(page, dpi=dpi, image_type=image_type)
             images_list.append(image_dict)
 
     return images_list, pdf_doc
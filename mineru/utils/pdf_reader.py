@@ -1,11 +1,15 @@
 # Copyright (c) Opendatalab. All rights reserved.
 import base64
+import threading
 from io import BytesIO
 
 from loguru import logger
 from PIL import Image
 from pypdfium2 import PdfBitmap, PdfDocument, PdfPage
 
+# pdfium不是线程安全的(即使是不同的文档也不能在多个线程中同时调用)，多线程访问pdfium时需持有该锁
+pdfium_lock = threading.RLock()
+
 
 def page_to_image(
     page: PdfPage,
@@ -5,6 +5,8 @@ import pypdfium2 as pdfium
 from pdftext.pdf.chars import get_chars, deduplicate_chars
 from pdftext.pdf.pages import get_spans, get_lines, assign_scripts, get_blocks
 
+from mineru.utils.pdf_reader import pdfium_lock
+
 
 def get_page(
     page: pdfium.PdfPage,
@@ -13,18 +15,25 @@ def get_page(
     line_distance_threshold: float = 0.1,
 ) -> dict:
 
-        textpage = page.get_textpage()
-        page_bbox: List[float] = page.get_bbox()
+        # 只有读取字符时访问pdfium，textpage在锁内显式关闭，后续的分组都是纯python计算
+        with pdfium_lock:
+            textpage = page.get_textpage()
+            page_bbox: List[float] = page.get_bbox()
+
+            page_rotation = 0
+            try:
+                page_rotation = page.get_rotation()
+            except:
+                pass
+
+            try:
+                chars = get_chars(textpage, page_bbox, page_rotation, quote_loosebox)
+            finally:
+                textpage.close()
         page_width = math.ceil(abs(page_bbox[2] - page_bbox[0]))
         page_height = math.ceil(abs(page_bbox[1] - page_bbox[3]))
 
-        page_rotation = 0
-        try:
-            page_rotation = page.get_rotation()
-        except:
-            pass
-
-        chars = deduplicate_chars(get_chars(textpage, page_bbox, page_rotation, quote_loosebox))
+        chars = deduplicate_chars(chars)
         spans = get_spans(chars, superscript_height_threshold=superscript_height_threshold, line_distance_threshold=line_distance_threshold)
         lines = get_lines(spans)
         assign_scripts(lines, height_threshold=superscript_height_threshold, line_distance_threshold=line_distance_threshold)
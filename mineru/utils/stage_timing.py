@@ -0,0 +1,191 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from mineru.utils.memory_profile import MemorySample, SNAPSHOT_STAGES, TOP_ALLOCATION_NUM, get_memory_profile_enable
+from mineru.utils.trace_export import trace_span, tracing_active
+
+_local = threading.local()
+_stage_listeners = []
+
+
+def get_stage_timing_enable() -> bool:
+    """是否输出分阶段耗时报告，通过环境变量MINERU_STAGE_TIMING_ENABLE设置，默认为false"""
+    return os.getenv('MINERU_STAGE_TIMING_ENABLE', 'false').lower() == 'true'
+
+
+def add_stage_listener(listener):
+    """注册阶段耗时的监听函数 listener(stage, start_time, elapsed, item_num)，每个阶段结束时在执行该阶段的线程中调用"""
+    if listener not in _stage_listeners:
+        _stage_listeners.append(listener)
+
+
+def remove_stage_listener(listener):
+    if listener in _stage_listeners:
+        _stage_listeners.remove(listener)
+
+
+def _to_mb(size: int) -> float:
+    return round(size / 1024 / 1024, 3)
+
+
+class StageTimes:
+    """按阶段累计耗时、调用次数和处理条数，启用内存采集时同时累计内存变化，info中保存批次等附加信息"""
+
+    def __init__(self, **info):
+        self.info = info
+        self.stages = {}
+        self.memory = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, elapsed: float, item_num: int = 0):
+        with self._lock:
+            stage_stat = self.stages.get(stage)
+            if stage_stat is None:
+                stage_stat = self.stages[stage] = {'calls': 0, 'time': 0.0, 'items': 0}
+            stage_stat['calls'] += 1
+            stage_stat['time'] += elapsed
+            stage_stat['items'] += item_num
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            stages = {}
+            for stage, stage_stat in self.stages.items():
+                stages[stage] = {
+                    'time': round(stage_stat['time'], 4),
+                    'calls': stage_stat['calls'],
+                    'items': stage_stat['items'],
+                    'throughput': round(stage_stat['items'] / stage_stat['time'], 2) if stage_stat['time'] > 0 else 0.0,
+                }
+        return {**self.info, 'stages': stages}
+
+    def record_memory(self, stage: str, memory_stat: dict):
+        with self._lock:
+            stage_memory = self.memory.get(stage)
+            if stage_memory is None:
+                stage_memory = self.memory[stage] = {
+                    'calls': 0, 'rss_delta': 0, 'max_rss': 0, 'traced_delta': 0, 'device_allocated_delta': 0,
+                    'max_device_allocated': 0, 'top_allocations': {},
+                }
+            stage_memory['calls'] += 1
+            stage_memory['rss_delta'] += memory_stat['rss_after'] - memory_stat['rss_before']
+            stage_memory['max_rss'] = max(stage_memory['max_rss'], memory_stat['peak_rss'])
+            stage_memory['traced_delta'] += memory_stat['traced_delta']
+            stage_memory['device_allocated_delta'] += memory_stat['device_allocated_delta']
+            stage_memory['max_device_allocated'] = max(stage_memory['max_device_allocated'], memory_stat['device_peak'])
+            for location, size_diff, count_diff in memory_stat['top_allocations']:
+                allocation = stage_memory['top_allocations'].setdefault(location, [0, 0])
+                allocation[0] += size_diff
+                allocation[1] += count_diff
+
+    def memory_to_dict(self) -> dict:
+        with self._lock:
+            stages = {}
+            for stage, stage_memory in self.memory.items():
+                top_allocations = sorted(
+                    stage_memory['top_allocations'].items(), key=lambda item: item[1][0], reverse=True
+                )[:TOP_ALLOCATION_NUM]
+                stages[stage] = {
+                    'calls': stage_memory['calls'],
+                    'rss_delta_mb': _to_mb(stage_memory['rss_delta']),
+                    'max_rss_mb': _to_mb(stage_memory['max_rss']),
+                    'traced_delta_mb': _to_mb(stage_memory['traced_delta']),
+                    'device_allocated_delta_mb': _to_mb(stage_memory['device_allocated_delta']),
+                    'max_device_allocated_mb': _to_mb(stage_memory['max_device_allocated']),
+                    'top_allocations': [
+                        {'location': location, 'size_diff_mb': _to_mb(size_diff), 'count_diff': count_diff}
+                        for location, (size_diff, count_diff) in top_allocations
+                    ],
+                }
+        return {**self.info, 'stages': stages}
+
+
+class PipelineTimingReport:
+    """
+    一次pipeline调用的分阶段耗时报告，推理阶段按批次统计(一个批次可能包含多个文档的页面)，
+    其余阶段按文档统计
+    """
+
+    def __init__(self, doc_num: int):
+        self.docs = [StageTimes() for _ in range(doc_num)]
+        self.batches = []
+
+    def doc(self, pdf_idx: int) -> StageTimes:
+        return self.docs[pdf_idx]
+
+    def new_batch(self, pdf_indices: list) -> StageTimes:
+        """pdf_indices为批次中每个页面所属的文档序号"""
+        doc_pages = {}
+        for pdf_idx in pdf_indices:
+            doc_pages[pdf_idx] = doc_pages.get(pdf_idx, 0) + 1
+        batch_times = StageTimes(batch_idx=len(self.batches), page_num=len(pdf_indices), doc_pages=doc_pages)
+        self.batches.append(batch_times)
+        return batch_times
+
+    def doc_to_dict(self, pdf_idx: int, memory: bool = False) -> dict:
+        """memory为True时返回该文档的内存报告，否则返回耗时报告"""
+        batches = []
+        for batch_times in self.batches:
+            if pdf_idx not in batch_times.info['doc_pages']:
+                continue
+            batch_dict = batch_times.memory_to_dict() if memory else batch_times.to_dict()
+            batch_dict['doc_page_num'] = batch_dict.pop('doc_pages')[pdf_idx]
+            batches.append(batch_dict)
+        doc_times = self.docs[pdf_idx]
+        return {'document': doc_times.memory_to_dict() if memory else doc_times.to_dict(), 'batches': batches}
+
+
+@contextmanager
+def stage_timing_scope(stage_times):
+    """在当前线程中把后续timed_stage的耗时记录到stage_times，stage_times为None时不记录"""
+    if stage_times is None:
+        yield
+        return
+    scopes = getattr(_local, 'scopes', None)
+    if scopes is None:
+        scopes = _local.scopes = []
+    scopes.append(stage_times)
+    try:
+        yield
+    finally:
+        scopes.pop()
+
+
+class _StageItems:
+    """timed_stage返回的对象，处理条数在阶段结束后才能确定时可以修改item_num"""
+
+    def __init__(self, item_num: int):
+        self.item_num = item_num
+
+
+@contextmanager
+def timed_stage(stage: str, item_num: int = 0):
+    """
+    统计一个阶段的耗时，当前线程没有打开的stage_timing_scope、没有监听函数且不在trace中时不做任何事。
+    启用内存采集且存在stage_timing_scope时，在阶段开始和结束时读取RSS、堆内存和显存的计数与峰值，
+    SNAPSHOT_STAGES中的批次、文档级阶段额外比较tracemalloc快照，采集本身不计入该阶段的耗时
+    """
+    scopes = getattr(_local, 'scopes', None)
+    if not scopes and not _stage_listeners and not tracing_active():
+        yield _StageItems(item_num)
+        return
+    stage_items = _StageItems(item_num)
+    memory_sample = MemorySample(stage in SNAPSHOT_STAGES) if scopes and get_memory_profile_enable() else None
+    with trace_span(stage) as span:
+        start_time = time.time()
+        start_counter = time.perf_counter()
+        try:
+            yield stage_items
+        finally:
+            elapsed = time.perf_counter() - start_counter
+            span.set_attribute('item_num', stage_items.item_num)
+            memory_stat = memory_sample.stop() if memory_sample is not None else None
+            if scopes:
+                for stage_times in scopes:
+                    stage_times.record(stage, elapsed, stage_items.item_num)
+                    if memory_stat is not None:
+                        stage_times.record_memory(stage, memory_stat)
+            for listener in list(_stage_listeners):
+                listener(stage, start_time, elapsed, stage_items.item_num)
@@ -0,0 +1,234 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""
+本地trace导出，不需要collector或网络。
+trace_session打开一次解析的根span，结束时把其下的全部span写入MINERU_TRACE_DIR下的一个文件，
+格式为Chrome trace(可直接用Perfetto或chrome://tracing打开)或OTLP-JSON。
+当前span通过contextvars传递，同一请求内的协程自动继承，提交到线程池的任务需用contextvars.copy_context().run执行。
+"""
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from loguru import logger
+
+_current_span = contextvars.ContextVar('mineru_trace_span', default=None)
+
+
+def get_trace_dir():
+    """trace文件的输出目录，通过环境变量MINERU_TRACE_DIR设置，未设置时不采集trace"""
+    return os.getenv('MINERU_TRACE_DIR') or None
+
+
+def get_trace_format() -> str:
+    """trace文件格式，通过环境变量MINERU_TRACE_FORMAT设置，可选chrome和otlp，默认为chrome"""
+    trace_format = os.getenv('MINERU_TRACE_FORMAT', 'chrome').lower()
+    if trace_format not in ['chrome', 'otlp']:
+        logger.warning(f'unknown MINERU_TRACE_FORMAT: {trace_format}, use chrome instead')
+        return 'chrome'
+    return trace_format
+
+
+class Span:
+    """一段有起止时间的处理过程，attributes中保存页数、批大小等附加信息"""
+
+    def __init__(self, trace, parent_id, name: str, category: str, attributes: dict):
+        self.trace = trace
+        self.span_id = trace.new_span_id()
+        self.parent_id = parent_id
+        self.name = name
+        self.category = category
+        self.attributes = attributes
+        thread = threading.current_thread()
+        self.thread_id = thread.ident
+        self.thread_name = thread.name
+        self.start_ns = time.time_ns()
+        self._start_counter = time.perf_counter_ns()
+        self.end_ns = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def end(self):
+        self.end_ns = self.start_ns + time.perf_counter_ns() - self._start_counter
+        self.trace.add(self)
+
+
+class _NoopSpan:
+    """未开启trace时返回的span，设置属性不做任何事"""
+
+    def set_attribute(self, key: str, value):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def _json_value(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_json_value(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _json_value(item) for key, item in value.items()}
+    return str(value)
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    if isinstance(value, str):
+        return {'stringValue': value}
+    return {'stringValue': json.dumps(_json_value(value), ensure_ascii=False)}
+
+
+class _Trace:
+    """一次trace_session中结束的全部span"""
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []
+        self._span_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def new_span_id(self) -> str:
+        with self._lock:
+            return f'{next(self._span_ids):016x}'
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_chrome(self) -> dict:
+        """Chrome trace的complete事件，同一线程上的span按时间包含关系嵌套显示"""
+        pid = os.getpid()
+        spans = sorted(self.spans, key=lambda span: (span.start_ns, -span.end_ns))
+        start_ns = spans[0].start_ns if spans else 0
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': 'mineru'}}]
+        thread_names = {}
+        for span in spans:
+            thread_names.setdefault(span.thread_id, span.thread_name)
+        for thread_id, thread_name in thread_names.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': thread_id, 'args': {'name': thread_name}})
+        for span in spans:
+            events.append({
+                'name': span.name,
+                'cat': span.category,
+                'ph': 'X',
+                'ts': (span.start_ns - start_ns) / 1000,
+                'dur': (span.end_ns - span.start_ns) / 1000,
+                'pid': pid,
+                'tid': span.thread_id,
+                'args': _json_value(span.attributes),
+            })
+        return {
+            'traceEvents': events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'trace_id': self.trace_id, 'start_time_unix_nano': start_ns},
+        }
+
+    def to_otlp(self) -> dict:
+        """OTLP/JSON的ExportTraceServiceRequest"""
+        otlp_spans = []
+        for span in sorted(self.spans, key=lambda span: span.start_ns):
+            attributes = {'mineru.category': span.category, 'thread.name': span.thread_name, **span.attributes}
+            otlp_span = {
+                'traceId': self.trace_id,
+                'spanId': span.span_id,
+                'name': span.name,
+                'kind': 1,
+                'startTimeUnixNano': str(span.start_ns),
+                'endTimeUnixNano': str(span.end_ns),
+                'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in attributes.items()],
+            }
+            if span.parent_id is not None:
+                otlp_span['parentSpanId'] = span.parent_id
+            otlp_spans.append(otlp_span)
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': 'mineru'}}]},
+                'scopeSpans': [{'scope': {'name': 'mineru'}, 'spans': otlp_spans}],
+            }]
+        }
+
+
+def get_current_span():
+    """当前上下文中打开的span，未开启trace时返回不做任何事的span"""
+    span = _current_span.get()
+    return span if span is not None else _NOOP_SPAN
+
+
+def tracing_active() -> bool:
+    return _current_span.get() is not None
+
+
+@contextmanager
+def trace_span(name: str, category: str = 'stage', **attributes):
+    """在当前trace中记录一个子span，当前上下文没有打开的trace时不做任何事"""
+    parent = _current_span.get()
+    if parent is None:
+        yield _NOOP_SPAN
+        return
+    span = Span(parent.trace, parent.span_id, name, category, attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.set_attribute('error', repr(e))
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+
+def _write_trace(trace: _Trace, trace_dir: str, name: str) -> str:
+    os.makedirs(trace_dir, exist_ok=True)
+    trace_format = get_trace_format()
+    suffix = 'otlp.json' if trace_format == 'otlp' else 'trace.json'
+    trace_path = os.path.join(
+        trace_dir, f'{name}_{time.strftime("%Y%m%d_%H%M%S")}_{trace.trace_id[:8]}.{suffix}'
+    )
+    trace_dict = trace.to_otlp() if trace_format == 'otlp' else trace.to_chrome()
+    with open(trace_path, 'w', encoding='utf-8') as f:
+        json.dump(trace_dict, f, ensure_ascii=False)
+    return trace_path
+
+
+@contextmanager
+def trace_session(name: str, **attributes):
+    """
+    开始一次trace，结束时写出trace文件；未设置MINERU_TRACE_DIR时不做任何事，
+    已在trace中时(如/file_parse中调用的aio_do_parse)等同于trace_span
+    """
+    if _current_span.get() is not None:
+        with trace_span(name, 'session', **attributes) as span:
+            yield span
+        return
+    trace_dir = get_trace_dir()
+    if trace_dir is None:
+        yield _NOOP_SPAN
+        return
+    trace = _Trace()
+    span = Span(trace, None, name, 'session', attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.set_attribute('error', repr(e))
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+        try:
+            trace_path = _write_trace(trace, trace_dir, name)
+            logger.info(f'trace written to {trace_path}')
+        except Exception as e:
+            logger.warning(f'failed to write trace: {e}')
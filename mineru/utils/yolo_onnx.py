@@ -0,0 +1,112 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""
+layout(DocLayout-YOLO)与MFD(YOLOv8)模型的onnxruntime执行。
+onnx：首次加载时把权重导出为动态batch和尺寸的fp32 ONNX，缓存为权重旁的<权重名>.onnx；
+onnx_int8：使用mineru-yolo-quantize以本地样本静态量化得到的<权重名>_int8.onnx。
+ONNX模型仍由ultralytics加载，前后处理与torch模型相同，layout_res/mfd_res的结构不变。
+"""
+import os
+
+import numpy as np
+from loguru import logger
+
+from .config_reader import get_yolo_backend
+from .yolo_utils import letterbox_resize, page_to_bgr
+
+# 与ultralytics LetterBox相同的padding颜色
+LETTERBOX_PAD_VALUE = 114
+
+
+def get_fp32_onnx_path(weight: str) -> str:
+    return f'{os.path.splitext(weight)[0]}.onnx'
+
+
+def get_int8_onnx_path(weight: str) -> str:
+    return f'{os.path.splitext(weight)[0]}_int8.onnx'
+
+
+def export_fp32_onnx(yolo_class, weight: str, imgsz: int) -> str:
+    """导出fp32 ONNX并返回路径，已导出时直接返回缓存"""
+    onnx_path = get_fp32_onnx_path(weight)
+    if not os.path.exists(onnx_path):
+        logger.info(f'exporting {weight} to {onnx_path}')
+        exported_path = yolo_class(weight).export(format='onnx', imgsz=imgsz, dynamic=True, verbose=False)
+        if os.path.abspath(exported_path) != os.path.abspath(onnx_path):
+            os.replace(exported_path, onnx_path)
+    return onnx_path
+
+
+def resolve_yolo_weight(yolo_class, weight: str, imgsz: int, device) -> str:
+    """
+    按MINERU_YOLO_BACKEND返回实际加载的模型文件。只在cpu上生效，
+    未安装onnxruntime、导出失败或int8模型尚未生成时记录警告并使用原始权重
+    """
+    yolo_backend = get_yolo_backend()
+    if yolo_backend == 'torch' or not str(device).startswith('cpu'):
+        return weight
+    if yolo_backend not in ['onnx', 'onnx_int8']:
+        logger.warning(f'unknown MINERU_YOLO_BACKEND: {yolo_backend}, use torch instead')
+        return weight
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        logger.warning('onnxruntime is not installed, layout/MFD fall back to torch')
+        return weight
+
+    if yolo_backend == 'onnx_int8':
+        int8_path = get_int8_onnx_path(weight)
+        if os.path.exists(int8_path):
+            return int8_path
+        logger.warning(f'{int8_path} not found, run mineru-yolo-quantize first, {weight} falls back to torch')
+        return weight
+    try:
+        return export_fp32_onnx(yolo_class, weight, imgsz)
+    except Exception as e:
+        logger.warning(f'failed to export {weight} to onnx, falls back to torch: {e}')
+        return weight
+
+
+def letterbox_input(image, imgsz: int) -> np.ndarray:
+    """与ultralytics对方形输入的预处理一致：等比缩放后居中padding到imgsz，BGR转RGB，归一化为1x3xHxW的float32"""
+    resized = letterbox_resize(page_to_bgr(image), imgsz)
+    h, w = resized.shape[:2]
+    top, left = (imgsz - h) // 2, (imgsz - w) // 2
+    padded = np.full((imgsz, imgsz, 3), LETTERBOX_PAD_VALUE, dtype=np.uint8)
+    padded[top: top + h, left: left + w] = resized
+    return np.ascontiguousarray(padded[:, :, ::-1].transpose(2, 0, 1))[None].astype(np.float32) / 255
+
+
+def quantize_int8(fp32_path: str, int8_path: str, calibration_images: list, imgsz: int):
+    """
+    用calibration_images对fp32 ONNX做静态int8量化(QDQ格式，权重按通道量化)，
+    激活值的量化范围由样本页面经过与推理相同的预处理后统计得到
+    """
+    import onnxruntime as ort
+    from onnxruntime.quantization import CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType, quantize_static
+
+    input_name = ort.InferenceSession(fp32_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+    class PageCalibrationReader(CalibrationDataReader):
+        def __init__(self):
+            self.images = iter(calibration_images)
+
+        def get_next(self):
+            image = next(self.images, None)
+            if image is None:
+                return None
+            return {input_name: letterbox_input(image, imgsz)}
+
+    tmp_path = f'{int8_path}.{os.getpid()}.tmp'
+    try:
+        quantize_static(
+            fp32_path, tmp_path, PageCalibrationReader(),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+            calibrate_method=CalibrationMethod.MinMax,
+        )
+        os.replace(tmp_path, int8_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
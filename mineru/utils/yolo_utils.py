@@ -0,0 +1,137 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""
+layout(DocLayout-YOLO)与MFD(YOLOv8)共用的页面预处理。
+ultralytics的predict对每个输入都会把PIL转换为BGR数组并做letterbox缩放，两个检测模型各做一遍，
+这里每页只解码一次，在后台线程中按两个模型的imgsz分别缩放，推理时只剩按批次padding和归一化。
+"""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import torch
+
+# 后处理只用到原图尺寸，用零步长的数组代替原图，避免为此保留解码后的页面
+_PLACEHOLDER_PIXEL = np.zeros((1, 1, 3), dtype=np.uint8)
+
+
+def page_to_bgr(image) -> np.ndarray:
+    """与ultralytics读取PIL输入的方式一致，转换为连续的uint8 BGR数组"""
+    if isinstance(image, np.ndarray):
+        return image
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return np.ascontiguousarray(np.asarray(image)[:, :, ::-1])
+
+
+def letterbox_resize(image: np.ndarray, imgsz: int) -> np.ndarray:
+    """
+    ultralytics LetterBox中的缩放部分，padding留给predictor按批次完成。
+    缩放后的图像再经过LetterBox时缩放比例为1，不会再次缩放，padding与直接对原图做LetterBox一致
+    """
+    h, w = image.shape[:2]
+    r = min(imgsz / h, imgsz / w)
+    new_unpad = int(round(w * r)), int(round(h * r))
+    if (w, h) != new_unpad:
+        image = cv2.resize(image, new_unpad, interpolation=cv2.INTER_LINEAR)
+    return image
+
+
+class PreparedChunk:
+    """
+    一块页面的原图尺寸，以及按各imgsz缩放后的BGR数组。
+    page_filters中给出某个imgsz每页是否需要缩放时，不需要的页面对应位置为None
+    """
+
+    def __init__(self, images: list, imgsz_list: list, page_filters: dict = None):
+        self.images = images
+        self.shapes = []
+        self.resized = {imgsz: [] for imgsz in imgsz_list}
+        page_filters = page_filters or {}
+        for index, image in enumerate(images):
+            array = page_to_bgr(image)
+            self.shapes.append(array.shape)
+            for imgsz in imgsz_list:
+                page_filter = page_filters.get(imgsz)
+                if page_filter is None or page_filter[index]:
+                    self.resized[imgsz].append(letterbox_resize(array, imgsz))
+                else:
+                    self.resized[imgsz].append(None)
+
+    def __len__(self):
+        return len(self.images)
+
+
+def iter_prepared_chunks(images: list, imgsz_list: list, chunk_size: int, page_filters: dict = None):
+    """
+    按chunk_size分块yield PreparedChunk，下一块在后台线程中与当前块的推理重叠计算，同一时刻最多保留两块。
+    page_filters为{imgsz: 每页是否需要该尺寸的bool列表}，未给出的imgsz对所有页面缩放
+    """
+    page_filters = page_filters or {}
+
+    def prepare(start):
+        chunk_filters = {imgsz: page_filter[start: start + chunk_size] for imgsz, page_filter in page_filters.items()}
+        return PreparedChunk(images[start: start + chunk_size], imgsz_list, chunk_filters)
+
+    chunk_starts = range(0, len(images), chunk_size)
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='mineru-page-preprocess') as executor:
+        future = None
+        for start in chunk_starts:
+            if future is None:
+                future = executor.submit(prepare, start)
+            chunk = future.result()
+            next_start = start + chunk_size
+            future = executor.submit(prepare, next_start) if next_start < len(images) else None
+            yield chunk
+            del chunk
+
+
+def image_shape(image) -> tuple:
+    if isinstance(image, np.ndarray):
+        return image.shape[:2]
+    return image.height, image.width
+
+
+def group_batches_by_shape(shapes: list, batch_size: int) -> list:
+    """
+    按图像尺寸分组后在组内切分批次，返回每个批次的下标列表。
+    同组图像letterbox后的尺寸相同，批内没有额外padding，每张图的输入与逐张推理时完全一致
+    """
+    groups = defaultdict(list)
+    for index, shape in enumerate(shapes):
+        groups[tuple(shape[:2])].append(index)
+    return [
+        indices[start: start + batch_size]
+        for indices in groups.values()
+        for start in range(0, len(indices), batch_size)
+    ]
+
+
+def predict_prepared(yolo, chunk: PreparedChunk, indices: list, imgsz: int, **predict_kwargs) -> list:
+    """
+    用chunk中indices对应页面预先缩放的图像执行yolo推理，padding、归一化、推理和后处理仍由ultralytics的predictor完成，
+    结果与yolo.predict(对应的原始页面)一致。以下情况回退为yolo.predict：
+    predictor尚未初始化(首次调用)、imgsz与predictor不一致、有页面没有预先缩放、
+    批内原图尺寸不同但缩放后尺寸相同(此时predictor对letterbox是否按stride最小padding的判断会与原图不同)。
+    predict_kwargs(conf、iou等)与yolo.predict一样写入predictor.args，同一模型以不同参数调用时后处理使用本次的参数
+    """
+    predictor = yolo.predictor
+    resized = [chunk.resized[imgsz][index] for index in indices]
+    shapes = [chunk.shapes[index] for index in indices]
+    if (
+            predictor is None
+            or list(predictor.imgsz) != [imgsz, imgsz]
+            or any(image is None for image in resized)
+            or (len(set(shapes)) > 1 and len({image.shape for image in resized}) == 1)
+    ):
+        return yolo.predict([chunk.images[index] for index in indices], imgsz=imgsz, **predict_kwargs)
+
+    for key, value in predict_kwargs.items():
+        setattr(predictor.args, key, value)
+    im = predictor.preprocess(resized)
+    # postprocess从batch中读取图片路径
+    predictor.batch = ([''] * len(resized),)
+    orig_imgs = [np.broadcast_to(_PLACEHOLDER_PIXEL, shape) for shape in shapes]
+    with torch.no_grad():
+        preds = predictor.inference(im)
+        return predictor.postprocess(preds, im, orig_imgs)
@@ -0,0 +1,110 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""
+合成页面版面生成器，用于在没有模型权重的情况下对后处理中的几何算法做基准测试。
+生成的block按双栏自上而下排布，span按行填充在文本类block内，
+overlap_density控制额外生成的重叠span/block比例(近似重复框与被包含的小框各占一半)。
+"""
+import copy
+import random
+
+import numpy as np
+
+from mineru.utils.enum_class import BlockType, ContentType
+
+PAGE_W = 612
+PAGE_H = 792
+LINE_HEIGHT = 12
+
+_BLOCK_TYPES = [
+    BlockType.TEXT, BlockType.TEXT, BlockType.TEXT, BlockType.TEXT,
+    BlockType.TITLE, BlockType.INTERLINE_EQUATION, BlockType.IMAGE_BODY, BlockType.TABLE_BODY,
+]
+
+
+def _overlap_box(bbox, rng):
+    """以相同概率返回与bbox近似重合的框或被bbox包含的小框"""
+    x0, y0, x1, y1 = bbox
+    w, h = x1 - x0, y1 - y0
+    if rng.random() < 0.5:
+        dx, dy = w * 0.02, h * 0.02
+        return [x0 + dx, y0 + dy, x1 + dx, y1 + dy]
+    return [x0 + w * 0.1, y0 + h * 0.1, x0 + w * 0.6, y0 + h * 0.9]
+
+
+def generate_page_layout(block_num, span_num, overlap_density=0.1, page_w=PAGE_W, page_h=PAGE_H, seed=0) -> dict:
+    """
+    生成一页合成版面，返回 {'page_w', 'page_h', 'blocks', 'spans'}，
+    blocks为 {'bbox', 'type', 'score', 'group_id'} 字典列表，spans为 {'bbox', 'type', 'score', 'content'} 字典列表
+    """
+    rng = random.Random(seed)
+    margin = 36
+    column_gap = 18
+    column_w = (page_w - 2 * margin - column_gap) / 2
+    rows = max(1, (block_num + 1) // 2)
+    row_h = (page_h - 2 * margin) / rows
+
+    blocks = []
+    for index in range(block_num):
+        column, row = index % 2, index // 2
+        x0 = margin + column * (column_w + column_gap)
+        y0 = margin + row * row_h
+        bbox = [round(x0, 2), round(y0, 2), round(x0 + column_w, 2), round(y0 + row_h * 0.9, 2)]
+        blocks.append({
+            'bbox': bbox,
+            'type': rng.choice(_BLOCK_TYPES),
+            'score': round(rng.uniform(0.5, 1.0), 3),
+            'group_id': index,
+        })
+
+    overlap_block_num = int(block_num * overlap_density)
+    for block in rng.sample(blocks, min(overlap_block_num, len(blocks))):
+        blocks.append({**copy.deepcopy(block), 'bbox': _overlap_box(block['bbox'], rng), 'group_id': len(blocks)})
+
+    overlap_span_num = int(span_num * overlap_density)
+    base_span_num = span_num - overlap_span_num
+    text_blocks = [block for block in blocks if block['type'] in [BlockType.TEXT, BlockType.TITLE]] or blocks
+    spans_per_block = -(-base_span_num // len(text_blocks))
+    spans = []
+    for index in range(base_span_num):
+        block = text_blocks[index % len(text_blocks)]
+        x0, y0, x1, y1 = block['bbox']
+        # 每个block内的span先按行排列，行数不够时同一行沿x方向等分为多个span
+        line_h = min(LINE_HEIGHT, y1 - y0)
+        line_num = max(1, int((y1 - y0) // line_h))
+        segment_num = -(-spans_per_block // line_num)
+        segment_w = (x1 - x0) / segment_num
+        block_span_index = index // len(text_blocks)
+        line_y0 = y0 + (block_span_index % line_num) * line_h
+        span_x0 = x0 + (block_span_index // line_num) * segment_w
+        spans.append({
+            'bbox': [
+                round(span_x0, 2), round(line_y0, 2),
+                round(span_x0 + segment_w * 0.9, 2), round(line_y0 + line_h * 0.8, 2),
+            ],
+            'type': ContentType.INLINE_EQUATION if rng.random() < 0.1 else ContentType.TEXT,
+            'score': round(rng.uniform(0.5, 1.0), 3),
+            'content': 'lorem ipsum',
+        })
+    for span in rng.sample(spans, min(overlap_span_num, len(spans))):
+        spans.append({**copy.deepcopy(span), 'bbox': _overlap_box(span['bbox'], rng)})
+
+    return {'page_w': page_w, 'page_h': page_h, 'blocks': blocks, 'spans': spans}
+
+
+def to_block_bboxes(blocks) -> list:
+    """转换为prepare_block_bboxes输出的列表格式"""
+    block_bboxes = []
+    for block in blocks:
+        x0, y0, x1, y1 = block['bbox']
+        block_bbox = [x0, y0, x1, y1, None, None, None, block['type'], None, None, None, None, block['score']]
+        if block['type'] in [BlockType.IMAGE_BODY, BlockType.TABLE_BODY]:
+            block_bbox.append(block['group_id'])
+        block_bboxes.append(block_bbox)
+    return block_bboxes
+
+
+def to_dt_boxes(spans) -> np.ndarray:
+    """转换为OCR检测输出的四点框 shape [N, 4, 2]"""
+    return np.array([
+        [[x0, y0], [x1, y0], [x1, y1], [x0, y1]] for x0, y0, x1, y1 in (span['bbox'] for span in spans)
+    ], dtype=np.float32)
@@ -0,0 +1,88 @@
+# Copyright (c) Opendatalab. All rights reserved.
+"""
+后处理几何算法的微基准测试，不需要模型权重，运行方式：
+    pytest tests/benchmark --benchmark-only --benchmark-group-by=func
+各函数在不同规模的合成页面上计时，便于观察复杂度随规模的变化并发现性能回退。
+"""
+import copy
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from synthetic_layout import generate_page_layout, to_block_bboxes, to_dt_boxes
+from mineru.utils import block_sort
+from mineru.utils.block_sort import sort_blocks_by_bbox
+from mineru.utils.magic_model_utils import reduct_overlap
+from mineru.utils.model_utils import remove_overlaps_min_blocks
+from mineru.utils.ocr_utils import sorted_boxes
+from mineru.utils.span_block_fix import fill_spans_in_blocks, fix_block_spans
+from mineru.utils.span_pre_proc import remove_overlaps_low_confidence_spans, remove_overlaps_min_spans
+
+# (block数量, span数量)
+SCALES = [(10, 50), (40, 200), (160, 800)]
+OVERLAP_DENSITY = 0.1
+
+
+@pytest.fixture(params=SCALES, ids=lambda scale: f'blocks{scale[0]}-spans{scale[1]}')
+def page_layout(request):
+    block_num, span_num = request.param
+    return generate_page_layout(block_num, span_num, overlap_density=OVERLAP_DENSITY)
+
+
+def _run_on_copy(benchmark, func, *args):
+    """被测函数会修改入参，每轮计时前重新拷贝输入"""
+    return benchmark.pedantic(
+        func, setup=lambda: (copy.deepcopy(args), {}), rounds=5, iterations=1, warmup_rounds=1
+    )
+
+
+def test_remove_overlaps_low_confidence_spans(benchmark, page_layout):
+    spans, dropped_spans = _run_on_copy(benchmark, remove_overlaps_low_confidence_spans, page_layout['spans'])
+    assert len(spans) + len(dropped_spans) == len(page_layout['spans'])
+
+
+def test_remove_overlaps_min_spans(benchmark, page_layout):
+    spans, dropped_spans = _run_on_copy(benchmark, remove_overlaps_min_spans, page_layout['spans'])
+    assert len(spans) + len(dropped_spans) == len(page_layout['spans'])
+
+
+def test_fill_spans_in_blocks(benchmark, page_layout):
+    block_with_spans, spans = _run_on_copy(
+        benchmark, fill_spans_in_blocks, to_block_bboxes(page_layout['blocks']), page_layout['spans'], 0.5
+    )
+    assert len(block_with_spans) == len(page_layout['blocks'])
+
+
+def test_remove_overlaps_min_blocks(benchmark, page_layout):
+    res_list, need_remove = _run_on_copy(benchmark, remove_overlaps_min_blocks, page_layout['blocks'])
+    assert len(res_list) + len(need_remove) == len(page_layout['blocks'])
+
+
+def test_reduct_overlap(benchmark, page_layout):
+    bboxes = _run_on_copy(benchmark, reduct_overlap, page_layout['spans'])
+    assert 0 < len(bboxes) <= len(page_layout['spans'])
+
+
+def test_sorted_boxes(benchmark, page_layout):
+    dt_boxes = to_dt_boxes(page_layout['spans'])
+    boxes = benchmark(sorted_boxes, dt_boxes)
+    assert len(boxes) == len(dt_boxes)
+
+
+def _reading_order_by_position(boxes, model):
+    return sorted(range(len(boxes)), key=lambda i: (boxes[i][1], boxes[i][0]))
+
+
+def test_sort_blocks_by_bbox(benchmark, page_layout, monkeypatch):
+    # layoutreader推理替换为按位置排序，只统计排序前后的几何处理
+    monkeypatch.setattr(block_sort.ModelSingleton, 'get_model', lambda self, model_name: None)
+    monkeypatch.setattr(block_sort, 'do_predict', _reading_order_by_position)
+    block_with_spans, _ = fill_spans_in_blocks(
+        to_block_bboxes(page_layout['blocks']), copy.deepcopy(page_layout['spans']), 0.5
+    )
+    fix_blocks = fix_block_spans(block_with_spans)
+    sorted_blocks = _run_on_copy(
+        benchmark, sort_blocks_by_bbox, fix_blocks, page_layout['page_w'], page_layout['page_h'], []
+    )
+    assert len(sorted_blocks) > 0
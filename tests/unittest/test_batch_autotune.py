@@ -0,0 +1,82 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import json
+
+import pytest
+
+from mineru.backend.pipeline.batch_autotune import BatchSizeAutotuner
+
+
+@pytest.fixture
+def autotuner(tmp_path, monkeypatch):
+    monkeypatch.setenv('MINERU_BATCH_PROFILE_PATH', str(tmp_path / 'batch_size_profile.json'))
+    return BatchSizeAutotuner('cpu')
+
+
+def feed(autotuner, stage, default_batch_size, item_num, throughput_fn, call_num=64):
+    """模拟call_num次阶段调用，每次处理item_num个样本，耗时由throughput_fn(batch_size)给出的吞吐决定"""
+    for _ in range(call_num):
+        batch_size = autotuner.get_batch_size(stage, default_batch_size)
+        throughput = throughput_fn(min(batch_size, item_num))
+        autotuner.record(stage, batch_size, item_num, item_num / throughput, 0)
+
+
+def test_converge_at_throughput_plateau(autotuner):
+    # 吞吐在batch_size=16之后不再提升
+    feed(autotuner, 'ocr_rec', 4, 64, lambda batch_size: min(batch_size, 16) * 10.0)
+    state = autotuner.stages['ocr_rec']
+    assert state['converged']
+    assert state['batch_size'] == 16
+
+
+def test_batch_size_capped_by_item_num(autotuner):
+    # 每次调用最多32个样本(页面预处理分块)，吞吐持续提升时也不会尝试64
+    feed(autotuner, 'layout', 8, 32, lambda batch_size: batch_size * 10.0)
+    state = autotuner.stages['layout']
+    assert state['converged']
+    assert state['batch_size'] == 32
+
+
+def test_partial_batches_are_recorded(autotuner):
+    # 样本数小于batch_size的调用同样计入吞吐，阶段可以收敛
+    feed(autotuner, 'mfr', 64, 20, lambda batch_size: batch_size * 10.0)
+    state = autotuner.stages['mfr']
+    assert state['converged']
+    assert state['batch_size'] == 64
+
+
+def test_oom_back_off(autotuner):
+    batch_sizes = []
+
+    def stage_fn(batch_size):
+        batch_sizes.append(batch_size)
+        if batch_size > 8:
+            raise RuntimeError('CUDA out of memory')
+        return batch_size
+
+    assert autotuner.run('mfd', 32, stage_fn, 64) == 8
+    assert batch_sizes == [32, 16, 8]
+    state = autotuner.stages['mfd']
+    assert state['converged']
+    assert state['batch_size'] == 8
+    assert state['max_batch_size'] == 8
+
+
+def test_non_oom_error_is_raised(autotuner):
+    def stage_fn(batch_size):
+        raise ValueError('bad input')
+
+    with pytest.raises(ValueError):
+        autotuner.run('layout', 8, stage_fn, 8)
+    assert not autotuner.stages['layout']['converged']
+
+
+def test_profile_save_and_load(autotuner, tmp_path):
+    feed(autotuner, 'ocr_rec', 4, 64, lambda batch_size: min(batch_size, 16) * 10.0)
+    with open(tmp_path / 'batch_size_profile.json', encoding='utf-8') as f:
+        profile = json.load(f)
+    assert profile[autotuner.profile_key] == {'ocr_rec': 16}
+
+    reloaded = BatchSizeAutotuner('cpu')
+    assert reloaded.stages['ocr_rec']['converged']
+    assert reloaded.get_batch_size('ocr_rec', 4) == 16
+    assert reloaded.get_batch_size('layout', 8) == 8
@@ -0,0 +1,40 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import os
+import signal
+
+import pytest
+from PIL import Image
+
+from mineru.backend.pipeline.device_parallel import DeviceParallelExecutor
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    # 工作进程继承环境变量，使用不加载权重的合成模型
+    monkeypatch.setenv('MINERU_MODEL_PROFILE', 'synthetic')
+    monkeypatch.setenv('MINERU_SYNTHETIC_MODEL_CONFIG', '{}')
+    executor = DeviceParallelExecutor(['cpu', 'cpu'])
+    yield executor
+    executor.shutdown()
+
+
+def make_pages(page_num):
+    return [(Image.new('RGB', (400, 560), 'white'), True, 'ch') for _ in range(page_num)]
+
+
+def test_analyze_after_worker_crash(executor):
+    pages = make_pages(40)
+    assert len(executor.analyze(pages, False, False)) == len(pages)
+
+    # 模拟工作进程被OOM killer杀掉
+    killed = []
+    for replica in executor.replicas:
+        for process in list((replica._processes or {}).values()):
+            os.kill(process.pid, signal.SIGKILL)
+            process.join()
+            killed.append(process.pid)
+    assert killed
+
+    # 崩溃的副本被重建，分片重新处理，后续请求仍能完成
+    assert len(executor.analyze(pages, False, False)) == len(pages)
+    assert len(executor.analyze(pages, False, False)) == len(pages)
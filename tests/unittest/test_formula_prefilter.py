@@ -0,0 +1,44 @@
+# Copyright (c) Opendatalab. All rights reserved.
+from loguru import logger
+
+from mineru.backend.pipeline.batch_analyze import BatchAnalyze
+from mineru.utils.enum_class import CategoryId
+
+
+def make_layout(*category_ids):
+    return [{'category_id': category_id, 'poly': [0, 0, 10, 0, 10, 10, 0, 10], 'score': 0.9}
+            for category_id in category_ids]
+
+
+def test_formula_page_indices_by_hint():
+    layout_res_list = [
+        # 文本层中有数学内容：始终检测
+        make_layout(CategoryId.ImageBody),
+        # 文本层中没有数学内容：只有版面中检测到行间公式时才检测
+        make_layout(CategoryId.Text),
+        make_layout(CategoryId.Text, CategoryId.InterlineEquation_Layout),
+        # 没有可用的文本层：版面中有可能包含公式的区域时检测
+        make_layout(CategoryId.Text),
+        make_layout(CategoryId.ImageBody, CategoryId.Abandon),
+    ]
+    formula_hints = [True, False, False, None, None]
+    page_ids = [(0, 0), (0, 1), (0, 2), (1, 0), (1, 1)]
+
+    messages = []
+    handler_id = logger.add(lambda message: messages.append(str(message)), format='{message}')
+    try:
+        indices = BatchAnalyze._get_formula_page_indices(layout_res_list, formula_hints, 0, page_ids)
+    finally:
+        logger.remove(handler_id)
+    assert indices == [0, 2, 3]
+    # 跳过的页面按文档和页码记录
+    assert any('page 1 of document 0' in message for message in messages)
+    assert any('page 1 of document 1' in message for message in messages)
+
+
+def test_formula_page_indices_with_chunk_offset():
+    formula_hints = [True, True, False, None]
+    indices = BatchAnalyze._get_formula_page_indices(
+        [make_layout(CategoryId.Text), make_layout(CategoryId.ImageBody)], formula_hints, 2, [None] * 4
+    )
+    assert indices == []
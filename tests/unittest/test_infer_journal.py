@@ -0,0 +1,66 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import json
+
+from mineru.backend.pipeline.infer_journal import DocInferJournal, get_doc_journals
+
+
+def make_page(page_no):
+    return {
+        'layout_dets': [{'category_id': 1, 'poly': [0, 0, 10, 0, 10, 10, 0, 10], 'score': 0.9}],
+        'page_info': {'page_no': page_no, 'width': 100, 'height': 200},
+    }
+
+
+def simulate_crash(journal, page_no):
+    """模拟写入一条记录的中途进程被杀：只留下该记录的前半部分且没有换行符"""
+    record = json.dumps(make_page(page_no), ensure_ascii=False)
+    with open(journal.pages_path, 'a', encoding='utf-8') as f:
+        f.write(record[:len(record) // 2])
+
+
+def test_resume_after_crash(tmp_path):
+    journal = DocInferJournal(str(tmp_path), 'doc')
+    journal.append_pages([make_page(0), make_page(1)])
+    simulate_crash(journal, 2)
+
+    # 重启后加载：不完整的记录被丢弃并从文件中截掉
+    journal = DocInferJournal(str(tmp_path), 'doc')
+    pages = journal.load_pages()
+    assert sorted(pages) == [0, 1]
+    with open(journal.pages_path, 'rb') as f:
+        assert f.read().endswith(b'\n')
+
+    journal.append_pages([make_page(2), make_page(3)])
+    pages = DocInferJournal(str(tmp_path), 'doc').load_pages()
+    assert sorted(pages) == [0, 1, 2, 3]
+    assert pages[2] == make_page(2)
+
+
+def test_append_after_crash_without_load(tmp_path):
+    journal = DocInferJournal(str(tmp_path), 'doc')
+    journal.append_pages([make_page(0)])
+    simulate_crash(journal, 1)
+
+    # 未经过load_pages直接追加时，新记录也不会与残留内容拼在同一行
+    journal.append_pages([make_page(1)])
+    pages = journal.load_pages()
+    assert sorted(pages) == [0, 1]
+
+
+def test_done_marker(tmp_path):
+    journal = DocInferJournal(str(tmp_path), 'doc')
+    assert not journal.is_done()
+    assert journal.load_pages() == {}
+    journal.mark_done()
+    assert DocInferJournal(str(tmp_path), 'doc').is_done()
+
+
+def test_journal_key_includes_file_name(tmp_path):
+    pdf_bytes = b'%PDF-1.4 same content'
+    journals = get_doc_journals(
+        str(tmp_path), ['a', 'a_copy'], [pdf_bytes, pdf_bytes], ['ch', 'ch'], 'auto', True, True
+    )
+    journals[0].mark_done()
+    # 重命名后的同一文档使用各自的journal，不会因为a已完成而被跳过
+    assert not journals[1].is_done()
+    assert get_doc_journals(str(tmp_path), ['a'], [pdf_bytes], ['ch'], 'auto', True, True)[0].is_done()
@@ -0,0 +1,104 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import sqlite3
+
+from PIL import Image
+
+from mineru.backend.pipeline.page_result_cache import PageResultCache, get_page_cache_key
+
+
+def make_result(text, size=1):
+    return [{'category_id': 15, 'poly': [0, 0, 10, 0, 10, 10, 0, 10], 'score': 0.9, 'text': text * size}]
+
+
+def test_hit_and_miss(tmp_path):
+    cache = PageResultCache(str(tmp_path), 1024 * 1024)
+    assert cache.get('a') is None
+    cache.put('a', make_result('hello'))
+    assert cache.get('a') == make_result('hello')
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_values_are_stored_as_json(tmp_path):
+    cache = PageResultCache(str(tmp_path), 1024 * 1024)
+    cache.put('a', make_result('公式'))
+    blob = cache.conn.execute('SELECT value FROM page_result WHERE key = ?', ('a',)).fetchone()[0]
+    assert blob.decode('utf-8').startswith('[{')
+
+
+def test_undecodable_entry_is_a_miss(tmp_path):
+    cache = PageResultCache(str(tmp_path), 1024 * 1024)
+    cache.conn.execute(
+        'INSERT INTO page_result (key, value, size, last_access) VALUES (?, ?, ?, ?)',
+        ('a', b'\x80\x04\x95', 3, 0.0)
+    )
+    cache.conn.commit()
+    assert cache.get('a') is None
+    cache.put('a', make_result('hello'))
+    assert cache.get('a') == make_result('hello')
+
+
+def test_lru_eviction_order(tmp_path):
+    entry_size = len(b'[{"category_id":15,"poly":[0,0,10,0,10,10,0,10],"score":0.9,"text":""}]') + 100
+    cache = PageResultCache(str(tmp_path), entry_size * 3)
+    for key in ['a', 'b', 'c']:
+        cache.put(key, make_result('x', 100))
+    # 访问a之后，b成为最久未使用的条目
+    assert cache.get('a') is not None
+    cache.put('d', make_result('x', 100))
+    assert cache.stats()['evictions'] == 1
+    assert cache.get('b') is None
+    for key in ['a', 'c', 'd']:
+        assert cache.get(key) is not None
+
+
+def test_access_time_is_committed_in_batch(tmp_path):
+    cache = PageResultCache(str(tmp_path), 1024 * 1024)
+    cache.put('a', make_result('hello'))
+    last_access = cache.conn.execute('SELECT last_access FROM page_result').fetchone()[0]
+    cache.get('a')
+    reader = sqlite3.connect(cache.db_path)
+    assert reader.execute('SELECT last_access FROM page_result').fetchone()[0] == last_access
+    cache.flush()
+    assert reader.execute('SELECT last_access FROM page_result').fetchone()[0] > last_access
+    reader.close()
+
+
+def test_analyze_reuses_cached_pages(tmp_path):
+    cache = PageResultCache(str(tmp_path), 1024 * 1024)
+    pages = [(Image.new('RGB', (32, 32), color), True, 'ch') for color in ['white', 'black', 'white']]
+    analyzed = []
+
+    def analyze_fn(images_with_extra_info, formula_enable, table_enable):
+        analyzed.append(len(images_with_extra_info))
+        return [make_result(str(index)) for index in range(len(images_with_extra_info))]
+
+    first = cache.analyze(pages, True, True, analyze_fn)
+    second = cache.analyze(pages, True, True, analyze_fn)
+    # 相同内容的页面只推理一次，第二次全部命中缓存
+    assert analyzed == [2]
+    assert first == second
+    assert first[0] == first[2] and first[0] is not first[2]
+
+
+def test_key_sensitivity(monkeypatch):
+    for env_name in ['MINERU_YOLO_BACKEND', 'MINERU_OCR_BACKEND', 'MINERU_FORMULA_PREFILTER_ENABLE']:
+        monkeypatch.delenv(env_name, raising=False)
+    page = Image.new('RGB', (32, 32), 'white')
+    key = get_page_cache_key(page, True, 'ch', True, True)
+    assert key == get_page_cache_key(Image.new('RGB', (32, 32), 'white'), True, 'ch', True, True)
+    assert key != get_page_cache_key(Image.new('RGB', (32, 32), 'black'), True, 'ch', True, True)
+    assert key != get_page_cache_key(Image.new('RGB', (32, 33), 'white'), True, 'ch', True, True)
+    assert key != get_page_cache_key(page, False, 'ch', True, True)
+    assert key != get_page_cache_key(page, True, 'en', True, True)
+    assert key != get_page_cache_key(page, True, 'ch', False, True)
+    assert key != get_page_cache_key(page, True, 'ch', True, False)
+
+    for env_name, value in [
+        ('MINERU_YOLO_BACKEND', 'onnx_int8'),
+        ('MINERU_OCR_BACKEND', 'onnx'),
+        ('MINERU_FORMULA_PREFILTER_ENABLE', 'true'),
+    ]:
+        with monkeypatch.context() as m:
+            m.setenv(env_name, value)
+            assert key != get_page_cache_key(page, True, 'ch', True, True)
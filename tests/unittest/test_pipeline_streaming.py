@@ -0,0 +1,86 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import io
+
+import pypdfium2 as pdfium
+import pytest
+
+from mineru.backend.pipeline import pipeline_analyze
+from mineru.backend.pipeline.pipeline_analyze import _take_batch_doc_states, doc_analyze, doc_analyze_streaming
+from mineru.data.data_reader_writer import FileBasedDataWriter
+
+
+@pytest.fixture
+def synthetic_env(monkeypatch):
+    # 不加载权重的合成模型，批大小取3使文档跨越多个批次
+    monkeypatch.setenv('MINERU_MODEL_PROFILE', 'synthetic')
+    monkeypatch.setenv('MINERU_SYNTHETIC_MODEL_CONFIG', '{}')
+    monkeypatch.setenv('MINERU_DEVICE_MODE', 'cpu')
+    monkeypatch.setenv('MINERU_MIN_BATCH_INFERENCE_SIZE', '3')
+    monkeypatch.delenv('MINERU_PIPELINE_DEVICES', raising=False)
+    monkeypatch.delenv('MINERU_PAGE_CACHE_DIR', raising=False)
+
+
+# pdfium无法打开没有页面的pdf，用占位的字节数据代表页码范围为空的文档
+EMPTY_PDF = b'empty'
+PdfDocument = pdfium.PdfDocument
+
+
+class EmptyPdfDocument:
+    def __len__(self):
+        return 0
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def empty_pdf_support(monkeypatch):
+    def open_pdf(pdf_bytes, *args, **kwargs):
+        if isinstance(pdf_bytes, bytes) and pdf_bytes == EMPTY_PDF:
+            return EmptyPdfDocument()
+        return PdfDocument(pdf_bytes, *args, **kwargs)
+
+    monkeypatch.setattr(pipeline_analyze.pdfium, 'PdfDocument', open_pdf)
+
+
+def make_pdf(page_num) -> bytes:
+    pdf = PdfDocument.new()
+    for _ in range(page_num):
+        pdf.new_page(300, 400)
+    buffer = io.BytesIO()
+    pdf.save(buffer)
+    pdf.close()
+    return buffer.getvalue()
+
+
+def test_take_batch_doc_states():
+    doc_states = {0: {'page_count': 2}, 1: {'page_count': 0}, 2: {'page_count': 3}}
+    # 文档0的最后一页和没有页面的文档1在本批次结束，文档2还有页面未处理
+    batch_doc_states = _take_batch_doc_states([(0, 0, None), (0, 1, None), (2, 0, None)], doc_states)
+    assert sorted(batch_doc_states) == [0, 1, 2]
+    assert sorted(doc_states) == [2]
+
+    batch_doc_states = _take_batch_doc_states([(2, 1, None), (2, 2, None)], doc_states)
+    assert sorted(batch_doc_states) == [2]
+    assert doc_states == {}
+
+
+def test_streaming_matches_doc_analyze(synthetic_env, empty_pdf_support, tmp_path):
+    page_nums = [5, 0, 2, 4]
+    pdf_bytes_list = [make_pdf(page_num) if page_num > 0 else EMPTY_PDF for page_num in page_nums]
+    lang_list = ['ch'] * len(page_nums)
+    image_writer_list = [FileBasedDataWriter(str(tmp_path / str(idx))) for idx in range(len(page_nums))]
+
+    streamed = list(doc_analyze_streaming(pdf_bytes_list, lang_list, image_writer_list, parse_method='ocr'))
+    # 按输入顺序输出，包括没有页面的文档
+    assert [pdf_idx for pdf_idx, _, _ in streamed] == list(range(len(page_nums)))
+    for (pdf_idx, model_list, middle_json), page_num in zip(streamed, page_nums):
+        assert [page['page_info']['page_no'] for page in model_list] == list(range(page_num))
+        assert len(middle_json['pdf_info']) == page_num
+
+    # 与一次性推理的doc_analyze结果一致
+    indices = [idx for idx, page_num in enumerate(page_nums) if page_num > 0]
+    infer_results = doc_analyze(
+        [pdf_bytes_list[idx] for idx in indices], [lang_list[idx] for idx in indices], parse_method='ocr'
+    )[0]
+    assert [streamed[idx][1] for idx in indices] == infer_results
@@ -0,0 +1,65 @@
+# Copyright (c) Opendatalab. All rights reserved.
+import random
+
+import pytest
+
+from mineru.model.ocr.paddleocr2pytorch.tools.infer.predict_rec import REC_WIDTH_BUCKET, TextRecognizer
+
+
+@pytest.fixture
+def recognizer():
+    # 只测试组批逻辑，不加载识别网络，参数取pytorchocr_utility中的默认值
+    recognizer = TextRecognizer.__new__(TextRecognizer)
+    recognizer.rec_image_shape = [3, 48, 320]
+    recognizer.rec_batch_num = 6
+    recognizer.rec_algorithm = 'CRNN'
+    recognizer.limited_max_width = 1280
+    recognizer.limited_min_width = 16
+    return recognizer
+
+
+def test_padded_width(recognizer):
+    # 不足imgW的行按imgW padding
+    assert recognizer.get_padded_width(1.0) == 320
+    assert recognizer.get_padded_width(10.0) == 480
+    # 48 * 10.1 = 484.8，向上取整到REC_WIDTH_BUCKET的倍数
+    assert recognizer.get_padded_width(10.1) == 512
+    assert recognizer.get_padded_width(100.0) == 1280
+
+
+def test_narrow_lines_share_width_budget(recognizer):
+    # 宽度预算为6 * 1280，padding宽度320的窄行每批可以放24行
+    batches = recognizer.get_rec_batches([2.0] * 50)
+    assert batches == [(0, 24, 320), (24, 48, 320), (48, 50, 320)]
+
+
+def test_wide_lines_fall_back_to_rec_batch_num(recognizer):
+    batches = recognizer.get_rec_batches([30.0] * 13)
+    assert batches == [(0, 6, 1280), (6, 12, 1280), (12, 13, 1280)]
+
+
+def test_batches_cover_sorted_lines_within_budget(recognizer):
+    rng = random.Random(0)
+    wh_ratios = sorted(rng.uniform(0.5, 40.0) for _ in range(500))
+    batches = recognizer.get_rec_batches(wh_ratios)
+    width_budget = recognizer.rec_batch_num * recognizer.limited_max_width
+
+    assert batches[0][0] == 0
+    assert batches[-1][1] == len(wh_ratios)
+    for (_, end, _), (beg, _, _) in zip(batches, batches[1:]):
+        assert end == beg
+    for beg, end, padded_width in batches:
+        assert end > beg
+        assert padded_width % REC_WIDTH_BUCKET == 0
+        # padding宽度足以容纳批内最宽的行，且批内的总宽度不超过预算
+        assert padded_width == recognizer.get_padded_width(wh_ratios[end - 1])
+        assert (end - beg) * padded_width <= width_budget
+
+
+def test_other_algorithms_use_rec_batch_num(recognizer):
+    recognizer.rec_algorithm = 'SVTR'
+    assert recognizer.get_rec_batches([2.0] * 13) == [(0, 6, None), (6, 12, None), (12, 13, None)]
+
+
+def test_empty_input(recognizer):
+    assert recognizer.get_rec_batches([]) == []
@@ -0,0 +1,45 @@
+# Copyright (c) Opendatalab. All rights reserved.
+from mineru.cli.result_cache import DocResultCache
+
+
+def test_only_requested_views_are_cached():
+    cache = DocResultCache(1024 * 1024, 3600)
+    cache.put('a', {'md_content': '# title'})
+    assert cache.get('a', ['md_content']) == {'md_content': '# title'}
+    # 缓存中没有images视图，请求images时视为未命中
+    assert cache.get('a', ['md_content', 'images']) is None
+
+    # 重新解析后的视图合并到已有条目中
+    cache.put('a', {'images': {'0.jpg': 'data:image/jpeg;base64,AAAA'}})
+    assert cache.get('a', ['md_content', 'images']) == {
+        'md_content': '# title',
+        'images': {'0.jpg': 'data:image/jpeg;base64,AAAA'},
+    }
+    assert cache.get('a', ['images']) == {'images': {'0.jpg': 'data:image/jpeg;base64,AAAA'}}
+    assert cache.stats()['hits'] == 3
+    assert cache.stats()['misses'] == 1
+
+
+def test_eviction_by_size():
+    cache = DocResultCache(20, 3600)
+    cache.put('a', {'md_content': 'x' * 10})
+    cache.put('b', {'md_content': 'y' * 10})
+    cache.put('a', {'content_list': 'z' * 5})
+    # 合并后的a超出容量，b作为最久未使用的条目被淘汰
+    assert cache.get('b', ['md_content']) is None
+    assert cache.get('a', ['md_content', 'content_list']) is not None
+
+
+def test_size_is_counted_in_utf8_bytes():
+    cache = DocResultCache(1024, 3600)
+    cache.put('a', {'md_content': '公式' * 10, 'images': {'图.jpg': 'AAAA'}})
+    assert cache.stats()['bytes'] == 60 + len('图.jpg'.encode('utf-8')) + 4
+
+
+def test_oversized_merge_keeps_existing_views():
+    cache = DocResultCache(20, 3600)
+    cache.put('a', {'md_content': 'x' * 10})
+    cache.put('a', {'middle_json': 'y' * 15})
+    # 合并后超出容量，新视图不缓存，原有视图仍然可用
+    assert cache.get('a', ['middle_json']) is None
+    assert cache.get('a', ['md_content']) == {'md_content': 'x' * 10}
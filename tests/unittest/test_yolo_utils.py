@@ -0,0 +1,42 @@
+# Copyright (c) Opendatalab. All rights reserved.
+from types import SimpleNamespace
+
+import numpy as np
+
+from mineru.utils.yolo_utils import PreparedChunk, predict_prepared
+
+
+class FakePredictor:
+    """记录postprocess时生效的predictor.args"""
+
+    def __init__(self, imgsz):
+        self.imgsz = [imgsz, imgsz]
+        self.args = SimpleNamespace(conf=0.25, iou=0.7, verbose=True)
+
+    def preprocess(self, images):
+        return images
+
+    def inference(self, im):
+        return im
+
+    def postprocess(self, preds, im, orig_imgs):
+        return [(self.args.conf, self.args.iou) for _ in orig_imgs]
+
+
+class FakeYolo:
+    def __init__(self, imgsz):
+        self.predictor = FakePredictor(imgsz)
+
+    def predict(self, images, **kwargs):
+        raise AssertionError('should use the prepared fast path')
+
+
+def test_predict_kwargs_are_applied_on_fast_path():
+    imgsz = 64
+    chunk = PreparedChunk([np.zeros((imgsz, imgsz, 3), dtype=np.uint8)] * 2, [imgsz])
+    yolo = FakeYolo(imgsz)
+
+    assert predict_prepared(yolo, chunk, [0, 1], imgsz, conf=0.3, iou=0.45, verbose=False) == [(0.3, 0.45)] * 2
+    # 同一模型以不同参数再次调用时，后处理使用本次的参数而不是上一次留下的predictor.args
+    assert predict_prepared(yolo, chunk, [0], imgsz, conf=0.5, iou=0.6, verbose=False) == [(0.5, 0.6)]
+    assert yolo.predictor.args.verbose is False